@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the affiliation file loading (``Task.load_from_csv``).
+
+Loads synthetic TSV files of various sizes into a temporary SQLite DB (or the DB given
+with ``DATABASE_URL``) and reports the load time and the loading rate. With ``--memory``
+the peak memory allocation is measured as well (it slows down the loading)::
+
+    python benchmarks/csv_loading.py --rows 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "benchmark.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orcid_hub import app  # noqa: E402
+from orcid_hub.models import AffiliationRecord, Organisation, Task, create_tables  # noqa: E402
+
+HEADER = "First name\tLast name\temail address\tOrganisation\tCampus/Department\tCity\t" \
+    "Course or Job title\tStart date\tEnd date\tStudent/Staff\tCountry\tORCID iD\n"
+
+
+def tsv(size):
+    """Create a synthetic affiliation file with *size* rows."""
+    return HEADER + ''.join(
+        f"FIRST{i}\tLAST{i}\tuser{i}@test.edu\tTHE ORGANISATION\tDEPARTMENT #{i % 100}\tWellington\t"
+        f"ROLE #{i % 10}\t{2000 + i % 18}-{1 + i % 12:02d}\t\t{'Staff' if i % 3 else 'Student'}\tNZ\t\n"
+        for i in range(size))
+
+
+def main():
+    """Run the benchmark for various file sizes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--chunk-size", type=int, help="records inserted with a single statement")
+    parser.add_argument("--memory", action="store_true", help="measure the peak memory allocation")
+    args = parser.parse_args()
+    if args.chunk_size:
+        app.config["LOAD_CHUNK_SIZE"] = args.chunk_size
+
+    create_tables()
+    org, _ = Organisation.get_or_create(name="THE ORGANISATION")
+    print(f"{'rows':>8} {'seconds':>8} {'rows/sec':>9} {'peak, MB':>9}")
+    for size in args.rows:
+        source = tsv(size)
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        task = Task.load_from_csv(source, filename=f"benchmark-{size}.tsv", org=org)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert AffiliationRecord.select().where(AffiliationRecord.task_id == task.id).count() == size
+        print(f"{size:8d} {elapsed:8.2f} {size / elapsed:9.0f} {peak / 2**20:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the ORCID API response deserialization.
+
+Compares the construction of the swagger model objects (followed by ``to_dict()`` as the views do)
+with the raw mode returning the parsed JSON on synthetic work lists of various sizes.
+The CPU time, the memory held by the result and the peak memory allocation are measured::
+
+    python benchmarks/deserialization.py --sizes 100 1000 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orcid_hub.orcid_client import OrcidApiClient  # noqa: E402
+
+
+class Response:
+    """REST response stand-in (only the data is used by the deserialization)."""
+
+    def __init__(self, data):
+        """Set up the response body."""
+        self.data = data
+
+
+def works(size):
+    """Create a synthetic work list ("/works" response) with *size* entries."""
+    return json.dumps({
+        "last-modified-date": {"value": 1514764800000},
+        "group": [{
+            "last-modified-date": {"value": 1514764800000},
+            "external-ids": {"external-id": [{
+                "external-id-type": "doi",
+                "external-id-value": f"10.1000/{put_code}",
+                "external-id-url": None,
+                "external-id-relationship": "SELF",
+            }]},
+            "work-summary": [{
+                "put-code": put_code,
+                "created-date": {"value": 1514764800000},
+                "last-modified-date": {"value": 1514764800000},
+                "source": {
+                    "source-orcid": None,
+                    "source-client-id": {
+                        "uri": "http://sandbox.orcid.org/client/APP-0000000000000000",
+                        "path": "APP-0000000000000000",
+                        "host": "sandbox.orcid.org",
+                    },
+                    "source-name": {"value": "THE ORGANISATION"},
+                },
+                "title": {"title": {"value": f"TITLE #{put_code}"}, "subtitle": None, "translated-title": None},
+                "external-ids": {"external-id": []},
+                "type": "JOURNAL_ARTICLE",
+                "publication-date": {"year": {"value": "2018"}, "month": {"value": "01"}, "day": None},
+                "visibility": "PUBLIC",
+                "path": f"/0000-0000-0000-0001/work/{put_code}",
+                "display-index": "0",
+            }],
+        } for put_code in range(size)],
+        "path": "/0000-0000-0000-0001/works",
+    })
+
+
+def measure(fn):
+    """Run the function and return its CPU time, the size of the result and the peak memory allocation (KB)."""
+    start = time.process_time()
+    fn()
+    elapsed = time.process_time() - start
+    tracemalloc.start()
+    # the result is kept referenced until the traced memory is taken, so its size is included:
+    result = fn()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, size / 1024, peak / 1024
+
+
+def main():
+    """Run the benchmark for various response sizes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    model_client, raw_client = OrcidApiClient(), OrcidApiClient(raw=True)
+    model_client.deserialize(Response(works(1)), "Works")  # import the models
+    print(f"{'entries':>8} {'mode':>6} {'CPU, s':>8} {'result, KB':>11} {'peak, KB':>10}")
+    for size in args.sizes:
+        response = Response(works(size))
+        for mode, fn in (
+            ("model", lambda: model_client.deserialize(response, "Works").to_dict()),
+            ("raw", lambda: raw_client.deserialize(response, "Works")),
+        ):
+            elapsed, size_kb, peak = measure(fn)
+            print(f"{size:8d} {mode:>6} {elapsed:8.3f} {size_kb:11.0f} {peak:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
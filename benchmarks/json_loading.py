@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the streaming loading of the work record files (``WorkRecord.load_from_json``).
+
+Synthetic JSON and YAML files of various sizes get written into a temporary directory and each one
+is loaded in a fresh interpreter into a temporary SQLite DB (or the DB given with ``DATABASE_URL``),
+so that the peak RSS of every run is reported separately along with the loading rate.
+With ``--whole`` the file is read up into a string first, as it was done before the streaming,
+and with ``--workers`` the items get validated by a process pool::
+
+    python benchmarks/json_loading.py --items 1000 10000 100000 --formats json yaml --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + {db!r})
+from orcid_hub import app
+from orcid_hub.models import Organisation, WorkRecord, create_tables
+if {chunk_size!r}:
+    app.config["LOAD_CHUNK_SIZE"] = {chunk_size!r}
+app.config["LOAD_VALIDATION_WORKERS"] = {workers!r}
+create_tables()
+org, _ = Organisation.get_or_create(name="THE ORGANISATION")
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started_at = time.perf_counter()
+with open({path!r}, encoding="utf-8") as source:
+    task = WorkRecord.load_from_json(source.read() if {whole!r} else source, filename={path!r}, org=org)
+elapsed = time.perf_counter() - started_at
+print(json.dumps(dict(
+    elapsed=elapsed,
+    count=task.record_count,
+    max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    rss_kb=rss)))
+"""
+
+
+def work(i):
+    """Create a synthetic work record entry."""
+    return {
+        "title": {"title": {"value": f"TITLE #{i}"}, "subtitle": {"value": "SUBTITLE"}},
+        "journal-title": {"value": f"JOURNAL #{i % 100}"},
+        "short-description": "DESCRIPTION " * 10,
+        "type": "JOURNAL_ARTICLE",
+        "publication-date": {"year": {"value": "2018"}, "month": {"value": "01"}, "day": None},
+        "invitees": [{
+            "identifier": f"{i:08d}",
+            "email": f"user{i}@test.edu",
+            "first-name": f"FIRST{i}",
+            "last-name": f"LAST{i}",
+            "put-code": None,
+        }],
+        "contributors": {"contributor": [{
+            "credit-name": {"value": f"CONTRIBUTOR #{i}.{n}"},
+            "contributor-attributes": {"contributor-role": "AUTHOR", "contributor-sequence": "ADDITIONAL"},
+        } for n in range(3)]},
+        "external-ids": {"external-id": [{
+            "external-id-type": "doi",
+            "external-id-value": f"10.1000/{i}",
+            "external-id-relationship": "SELF",
+        }]},
+    }
+
+
+def write(path, size, fmt):
+    """Write a synthetic file of the format with *size* entries one entry at a time."""
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "json":
+            f.write("[\n")
+            for i in range(size):
+                f.write((",\n" if i else "") + json.dumps(work(i)))
+            f.write("\n]\n")
+        else:
+            import yaml
+            for i in range(size):
+                f.write(yaml.safe_dump([work(i)], default_flow_style=False))
+
+
+def measure(path, db, chunk_size, whole, workers):
+    """Load the file in a new interpreter and return its statistics."""
+    output = subprocess.check_output([sys.executable, "-c", MEASURE.format(
+        root=ROOT, db=db, path=path, chunk_size=chunk_size, whole=whole, workers=workers)])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main():
+    """Run the benchmark for various file sizes and formats."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--formats", nargs="+", choices=["json", "yaml"], default=["json", "yaml"])
+    parser.add_argument("--chunk-size", type=int, help="records inserted with a single statement")
+    parser.add_argument("--whole", action="store_true", help="read up the whole file before loading")
+    parser.add_argument("--workers", type=int, default=0, help="processes validating the items")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db = os.path.join(directory, "benchmark.db")
+    print(f"{'items':>8} {'format':>6} {'file, MB':>9} {'seconds':>8} {'items/sec':>10} {'peak RSS, MB':>13} "
+          f"{'loading, MB':>12}")
+    for size in args.items:
+        for fmt in args.formats:
+            path = os.path.join(directory, f"works-{size}.{fmt}")
+            write(path, size, fmt)
+            stats = measure(path, db, args.chunk_size, args.whole, args.workers)
+            assert stats["count"] == size
+            print(f"{size:8d} {fmt:>6} {os.path.getsize(path) / 2**20:9.1f} {stats['elapsed']:8.2f} "
+                  f"{size / stats['elapsed']:10.0f} {stats['max_rss_kb'] / 1024:13.1f} "
+                  f"{(stats['max_rss_kb'] - stats['rss_kb']) / 1024:12.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the batch record push to ORCID (records/sec).
+
+The ORCID API gets replaced with a local mock that responds after a fixed latency
+so that the effect of the concurrent push can be measured without network access::
+
+    python benchmarks/push.py --users 200 --records 3 --latency 0.05
+"""
+
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orcid_hub import app, utils  # noqa: E402
+
+
+class MockOrganisation:
+    """Organisation stand-in (only the ORCID client ID is used by the executor)."""
+
+    def __init__(self, orcid_client_id):
+        """Set up the client ID."""
+        self.orcid_client_id = orcid_client_id
+
+
+def push(latency, record_count):
+    """Mock a user batch push: a profile read and a POST/PUT per record."""
+    for _ in range(record_count + 1):
+        time.sleep(latency)
+
+
+def run(max_workers, max_per_client, orgs, users, records, latency):
+    """Push the mock batch and return the throughput."""
+    with app.app_context(), utils.PushExecutor(
+            max_workers=max_workers, max_per_client=max_per_client) as executor:
+        for user_id in range(users):
+            org = orgs[user_id % len(orgs)]
+            executor.submit(org, user_id, partial(push, latency, records), record_count=records)
+    return executor
+
+
+def main():
+    """Run the benchmark for various numbers of workers."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orgs", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--records", type=int, default=3, help="records per user")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock API call latency in seconds")
+    parser.add_argument("--max-per-client", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    orgs = [MockOrganisation(f"APP-{i:016d}") for i in range(args.orgs)]
+    print(f"{'workers':>8} {'records':>8} {'seconds':>8} {'records/sec':>12}")
+    for max_workers in args.workers:
+        executor = run(max_workers, args.max_per_client, orgs, args.users, args.records, args.latency)
+        print(f"{max_workers:8d} {executor.record_count:8d} {executor.elapsed:8.2f} {executor.throughput:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the matching of the batch records with ORCID profile entries.
+
+Compares the indexed matcher with the linear scan of all the summaries for every record
+on synthetic profiles::
+
+    python benchmarks/put_code_matching.py --sizes 100 1000 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orcid_hub import utils  # noqa: E402
+from orcid_hub.models import AffiliationRecord, PartialDate  # noqa: E402
+
+
+def employment(put_code):
+    """Create a synthetic employment summary."""
+    return {
+        "put-code": put_code,
+        "department-name": f"DEPARTMENT #{put_code}",
+        "role-title": "ROLE",
+        "start-date": PartialDate(2000 + put_code % 20, 1 + put_code % 12, None).as_orcid_dict(),
+        "end-date": None,
+        "organization": {
+            "name": "ORGANISATION",
+            "address": {"city": "Auckland", "region": None, "country": "NZ"},
+            "disambiguated-organization": None,
+        },
+    }
+
+
+def record(no):
+    """Create a synthetic affiliation record matching the summary."""
+    return AffiliationRecord(
+        department=f"DEPARTMENT #{no}",
+        role="ROLE",
+        start_date=PartialDate(2000 + no % 20, 1 + no % 12, None),
+        organisation="ORGANISATION",
+        city="Wellington" if no % 2 else "Auckland",
+        country="NZ")
+
+
+def linear_scan(summaries, records):
+    """Match the records scanning all the summaries for each record."""
+    taken, put_codes = set(), []
+    for r in records:
+        key, fallback_keys = utils.affiliation_record_keys(r)
+        for s in summaries:
+            summary_key, summary_fallback_keys = utils.affiliation_summary_keys(s)
+            if summary_key == key:
+                put_codes.append(s["put-code"])
+                break
+            if s["put-code"] not in taken and set(fallback_keys) & set(summary_fallback_keys):
+                taken.add(s["put-code"])
+                put_codes.append(s["put-code"])
+                break
+        else:
+            put_codes.append(None)
+    return put_codes
+
+
+def indexed(summaries, records):
+    """Match the records using the indexed matcher."""
+    matcher = utils.PutCodeMatcher(summaries, utils.affiliation_summary_keys)
+    return [matcher.match(*utils.affiliation_record_keys(r))[0] for r in records]
+
+
+def main():
+    """Run the benchmark for various profile sizes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 3000])
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'linear, s':>10} {'indexed, s':>11} {'speed-up':>9}")
+    for size in args.sizes:
+        summaries = [employment(i) for i in range(size)]
+        records = [record(i) for i in reversed(range(size))]
+        start = time.perf_counter()
+        expected = linear_scan(summaries, records)
+        linear_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        put_codes = indexed(summaries, records)
+        indexed_elapsed = time.perf_counter() - start
+        assert put_codes == expected
+        print(f"{size:8d} {linear_elapsed:10.3f} {indexed_elapsed:11.3f} {linear_elapsed / indexed_elapsed:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
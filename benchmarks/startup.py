@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the cold start time and the memory footprint of loading the ORCID API client.
+
+Each measurement is taken in a fresh interpreter. The lazily loaded package (only the classes
+used by the Hub get imported) is compared with the eager loading of all the API and model classes,
+as it was before the lazy loading::
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --module orcid_hub  # the whole application
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+started_at = time.perf_counter()
+import {module}
+import orcid_api
+if {eager!r}:
+    for package in (orcid_api, orcid_api.apis, orcid_api.models):
+        for name in dir(package):
+            getattr(package, name)
+elapsed = time.perf_counter() - started_at
+print(json.dumps(dict(
+    elapsed=elapsed,
+    max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    modules=sum(m.startswith("orcid_api") for m in sys.modules))))
+"""
+
+
+def measure(module, eager):
+    """Import the module in a new interpreter and return its statistics."""
+    output = subprocess.check_output(
+        [sys.executable, "-c", MEASURE.format(root=ROOT, module=module, eager=eager)])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="orcid_api", help="the imported module (e.g., orcid_hub)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    measure(args.module, True)  # warm up the bytecode cache
+    print(f"{'loading':>8} {'time, s':>8} {'max RSS, MB':>12} {'orcid_api modules':>18}")
+    for eager in (True, False):
+        stats = [measure(args.module, eager) for _ in range(args.runs)]
+        print(f"{'eager' if eager else 'lazy':>8} {statistics.median(s['elapsed'] for s in stats):8.3f} "
+              f"{statistics.median(s['max_rss_kb'] for s in stats) / 1024:12.1f} {stats[0]['modules']:18d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,79 +13,82 @@
 
 from __future__ import absolute_import
 
-# import models into sdk package
-from .models.activities_summary import ActivitiesSummary
-from .models.address import Address
-from .models.amount import Amount
-from .models.authorization_url import AuthorizationUrl
-from .models.bulk_element import BulkElement
-from .models.citation import Citation
-from .models.contributor import Contributor
-from .models.contributor_attributes import ContributorAttributes
-from .models.contributor_email import ContributorEmail
-from .models.contributor_orcid import ContributorOrcid
-from .models.country import Country
-from .models.created_date import CreatedDate
-from .models.credit_name import CreditName
-from .models.day import Day
-from .models.disambiguated_organization import DisambiguatedOrganization
-from .models.education import Education
-from .models.education_summary import EducationSummary
-from .models.educations import Educations
-from .models.employment import Employment
-from .models.employment_summary import EmploymentSummary
-from .models.employments import Employments
-from .models.external_id import ExternalID
-from .models.external_i_ds import ExternalIDs
-from .models.funding import Funding
-from .models.funding_contributor import FundingContributor
-from .models.funding_contributor_attributes import FundingContributorAttributes
-from .models.funding_contributors import FundingContributors
-from .models.funding_group import FundingGroup
-from .models.funding_summary import FundingSummary
-from .models.funding_title import FundingTitle
-from .models.fundings import Fundings
-from .models.fuzzy_date import FuzzyDate
-from .models.group_id_record import GroupIdRecord
-from .models.group_id_records import GroupIdRecords
-from .models.item import Item
-from .models.items import Items
-from .models.keyword import Keyword
-from .models.last_modified_date import LastModifiedDate
-from .models.month import Month
-from .models.notification import Notification
-from .models.notification_permission import NotificationPermission
-from .models.organization import Organization
-from .models.organization_address import OrganizationAddress
-from .models.organization_defined_funding_sub_type import OrganizationDefinedFundingSubType
-from .models.other_name import OtherName
-from .models.peer_review import PeerReview
-from .models.peer_review_group import PeerReviewGroup
-from .models.peer_review_summary import PeerReviewSummary
-from .models.peer_reviews import PeerReviews
-from .models.person_external_identifier import PersonExternalIdentifier
-from .models.publication_date import PublicationDate
-from .models.researcher_url import ResearcherUrl
-from .models.source import Source
-from .models.source_client_id import SourceClientId
-from .models.source_name import SourceName
-from .models.source_orcid import SourceOrcid
-from .models.subtitle import Subtitle
-from .models.title import Title
-from .models.translated_title import TranslatedTitle
-from .models.url import Url
-from .models.work import Work
-from .models.work_bulk import WorkBulk
-from .models.work_contributors import WorkContributors
-from .models.work_group import WorkGroup
-from .models.work_summary import WorkSummary
-from .models.work_title import WorkTitle
-from .models.works import Works
-from .models.year import Year
+# the models and the APIs get imported on the first access
+from . import apis, models
+from .lazy import lazy_import
 
-# import apis into sdk package
-from .apis.member_apiv20_api import MemberAPIV20Api
-from .apis.member_apiv21_api import MemberAPIV21Api
+lazy_import(__name__, {
+    "ActivitiesSummary": ".models.activities_summary",
+    "Address": ".models.address",
+    "Amount": ".models.amount",
+    "AuthorizationUrl": ".models.authorization_url",
+    "BulkElement": ".models.bulk_element",
+    "Citation": ".models.citation",
+    "Contributor": ".models.contributor",
+    "ContributorAttributes": ".models.contributor_attributes",
+    "ContributorEmail": ".models.contributor_email",
+    "ContributorOrcid": ".models.contributor_orcid",
+    "Country": ".models.country",
+    "CreatedDate": ".models.created_date",
+    "CreditName": ".models.credit_name",
+    "Day": ".models.day",
+    "DisambiguatedOrganization": ".models.disambiguated_organization",
+    "Education": ".models.education",
+    "EducationSummary": ".models.education_summary",
+    "Educations": ".models.educations",
+    "Employment": ".models.employment",
+    "EmploymentSummary": ".models.employment_summary",
+    "Employments": ".models.employments",
+    "ExternalID": ".models.external_id",
+    "ExternalIDs": ".models.external_i_ds",
+    "Funding": ".models.funding",
+    "FundingContributor": ".models.funding_contributor",
+    "FundingContributorAttributes": ".models.funding_contributor_attributes",
+    "FundingContributors": ".models.funding_contributors",
+    "FundingGroup": ".models.funding_group",
+    "FundingSummary": ".models.funding_summary",
+    "FundingTitle": ".models.funding_title",
+    "Fundings": ".models.fundings",
+    "FuzzyDate": ".models.fuzzy_date",
+    "GroupIdRecord": ".models.group_id_record",
+    "GroupIdRecords": ".models.group_id_records",
+    "Item": ".models.item",
+    "Items": ".models.items",
+    "Keyword": ".models.keyword",
+    "LastModifiedDate": ".models.last_modified_date",
+    "Month": ".models.month",
+    "Notification": ".models.notification",
+    "NotificationPermission": ".models.notification_permission",
+    "Organization": ".models.organization",
+    "OrganizationAddress": ".models.organization_address",
+    "OrganizationDefinedFundingSubType": ".models.organization_defined_funding_sub_type",
+    "OtherName": ".models.other_name",
+    "PeerReview": ".models.peer_review",
+    "PeerReviewGroup": ".models.peer_review_group",
+    "PeerReviewSummary": ".models.peer_review_summary",
+    "PeerReviews": ".models.peer_reviews",
+    "PersonExternalIdentifier": ".models.person_external_identifier",
+    "PublicationDate": ".models.publication_date",
+    "ResearcherUrl": ".models.researcher_url",
+    "Source": ".models.source",
+    "SourceClientId": ".models.source_client_id",
+    "SourceName": ".models.source_name",
+    "SourceOrcid": ".models.source_orcid",
+    "Subtitle": ".models.subtitle",
+    "Title": ".models.title",
+    "TranslatedTitle": ".models.translated_title",
+    "Url": ".models.url",
+    "Work": ".models.work",
+    "WorkBulk": ".models.work_bulk",
+    "WorkContributors": ".models.work_contributors",
+    "WorkGroup": ".models.work_group",
+    "WorkSummary": ".models.work_summary",
+    "WorkTitle": ".models.work_title",
+    "Works": ".models.works",
+    "Year": ".models.year",
+    "MemberAPIV20Api": ".apis.member_apiv20_api",
+    "MemberAPIV21Api": ".apis.member_apiv21_api",
+})
 
 # import ApiClient
 from .api_client import ApiClient
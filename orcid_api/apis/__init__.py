@@ -1,5 +1,10 @@
 from __future__ import absolute_import
 
-# import apis into api package
-from .member_apiv20_api import MemberAPIV20Api
-from .member_apiv21_api import MemberAPIV21Api
+# the APIs get imported on the first access
+from ..lazy import lazy_import
+
+lazy_import(__name__, {
+    "MemberAPIV20Api": ".member_apiv20_api",
+    "MemberAPIV21Api": ".member_apiv21_api",
+    "DevelopmentMemberAPIV30Dev1Api": ".development_member_apiv30_dev1_api",
+})
@@ -0,0 +1,42 @@
+# coding: utf-8
+
+"""
+    Lazy loading of the API and model classes.
+
+    The generated package has a module per API class and per model class. Instead of importing
+    all of them eagerly, the classes get imported on the first access.
+"""
+
+from __future__ import absolute_import
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module that imports the classes from its submodules on the first access."""
+
+    def __getattr__(self, name):
+        """Import the class from its submodule and keep it in the module namespace."""
+        submodules = self.__dict__.get("_lazy_submodules", {})
+        if name not in submodules:
+            raise AttributeError("module {!r} has no attribute {!r}".format(self.__name__, name))
+        value = getattr(importlib.import_module(submodules[name], self.__name__), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        """List also the classes that have not been imported yet."""
+        return sorted(set(super(LazyModule, self).__dir__()) | set(self.__dict__.get("_lazy_submodules", {})))
+
+
+def lazy_import(module_name, submodules):
+    """Make the classes of the module to be imported on the first access.
+
+    :param module_name: the name of the module (package).
+    :param submodules: the dict mapping the class names to the relative names of their submodules.
+    """
+    module = sys.modules[module_name]
+    module._lazy_submodules = submodules
+    module.__class__ = LazyModule
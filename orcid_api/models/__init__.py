@@ -13,72 +13,76 @@
 
 from __future__ import absolute_import
 
-# import models into model package
-from .activities_summary import ActivitiesSummary
-from .address import Address
-from .amount import Amount
-from .authorization_url import AuthorizationUrl
-from .bulk_element import BulkElement
-from .citation import Citation
-from .contributor import Contributor
-from .contributor_attributes import ContributorAttributes
-from .contributor_email import ContributorEmail
-from .contributor_orcid import ContributorOrcid
-from .country import Country
-from .created_date import CreatedDate
-from .credit_name import CreditName
-from .day import Day
-from .disambiguated_organization import DisambiguatedOrganization
-from .education import Education
-from .education_summary import EducationSummary
-from .educations import Educations
-from .employment import Employment
-from .employment_summary import EmploymentSummary
-from .employments import Employments
-from .external_id import ExternalID
-from .external_i_ds import ExternalIDs
-from .funding import Funding
-from .funding_contributor import FundingContributor
-from .funding_contributor_attributes import FundingContributorAttributes
-from .funding_contributors import FundingContributors
-from .funding_group import FundingGroup
-from .funding_summary import FundingSummary
-from .funding_title import FundingTitle
-from .fundings import Fundings
-from .fuzzy_date import FuzzyDate
-from .group_id_record import GroupIdRecord
-from .group_id_records import GroupIdRecords
-from .item import Item
-from .items import Items
-from .keyword import Keyword
-from .last_modified_date import LastModifiedDate
-from .month import Month
-from .notification import Notification
-from .notification_permission import NotificationPermission
-from .organization import Organization
-from .organization_address import OrganizationAddress
-from .organization_defined_funding_sub_type import OrganizationDefinedFundingSubType
-from .other_name import OtherName
-from .peer_review import PeerReview
-from .peer_review_group import PeerReviewGroup
-from .peer_review_summary import PeerReviewSummary
-from .peer_reviews import PeerReviews
-from .person_external_identifier import PersonExternalIdentifier
-from .publication_date import PublicationDate
-from .researcher_url import ResearcherUrl
-from .source import Source
-from .source_client_id import SourceClientId
-from .source_name import SourceName
-from .source_orcid import SourceOrcid
-from .subtitle import Subtitle
-from .title import Title
-from .translated_title import TranslatedTitle
-from .url import Url
-from .work import Work
-from .work_bulk import WorkBulk
-from .work_contributors import WorkContributors
-from .work_group import WorkGroup
-from .work_summary import WorkSummary
-from .work_title import WorkTitle
-from .works import Works
-from .year import Year
+# the models get imported on the first access
+from ..lazy import lazy_import
+
+lazy_import(__name__, {
+    "ActivitiesSummary": ".activities_summary",
+    "Address": ".address",
+    "Amount": ".amount",
+    "AuthorizationUrl": ".authorization_url",
+    "BulkElement": ".bulk_element",
+    "Citation": ".citation",
+    "Contributor": ".contributor",
+    "ContributorAttributes": ".contributor_attributes",
+    "ContributorEmail": ".contributor_email",
+    "ContributorOrcid": ".contributor_orcid",
+    "Country": ".country",
+    "CreatedDate": ".created_date",
+    "CreditName": ".credit_name",
+    "Day": ".day",
+    "DisambiguatedOrganization": ".disambiguated_organization",
+    "Education": ".education",
+    "EducationSummary": ".education_summary",
+    "Educations": ".educations",
+    "Employment": ".employment",
+    "EmploymentSummary": ".employment_summary",
+    "Employments": ".employments",
+    "ExternalID": ".external_id",
+    "ExternalIDs": ".external_i_ds",
+    "Funding": ".funding",
+    "FundingContributor": ".funding_contributor",
+    "FundingContributorAttributes": ".funding_contributor_attributes",
+    "FundingContributors": ".funding_contributors",
+    "FundingGroup": ".funding_group",
+    "FundingSummary": ".funding_summary",
+    "FundingTitle": ".funding_title",
+    "Fundings": ".fundings",
+    "FuzzyDate": ".fuzzy_date",
+    "GroupIdRecord": ".group_id_record",
+    "GroupIdRecords": ".group_id_records",
+    "Item": ".item",
+    "Items": ".items",
+    "Keyword": ".keyword",
+    "LastModifiedDate": ".last_modified_date",
+    "Month": ".month",
+    "Notification": ".notification",
+    "NotificationPermission": ".notification_permission",
+    "Organization": ".organization",
+    "OrganizationAddress": ".organization_address",
+    "OrganizationDefinedFundingSubType": ".organization_defined_funding_sub_type",
+    "OtherName": ".other_name",
+    "PeerReview": ".peer_review",
+    "PeerReviewGroup": ".peer_review_group",
+    "PeerReviewSummary": ".peer_review_summary",
+    "PeerReviews": ".peer_reviews",
+    "PersonExternalIdentifier": ".person_external_identifier",
+    "PublicationDate": ".publication_date",
+    "ResearcherUrl": ".researcher_url",
+    "Source": ".source",
+    "SourceClientId": ".source_client_id",
+    "SourceName": ".source_name",
+    "SourceOrcid": ".source_orcid",
+    "Subtitle": ".subtitle",
+    "Title": ".title",
+    "TranslatedTitle": ".translated_title",
+    "Url": ".url",
+    "Work": ".work",
+    "WorkBulk": ".work_bulk",
+    "WorkContributors": ".work_contributors",
+    "WorkGroup": ".work_group",
+    "WorkSummary": ".work_summary",
+    "WorkTitle": ".work_title",
+    "Works": ".works",
+    "Year": ".year",
+})
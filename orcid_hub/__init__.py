@@ -178,7 +178,7 @@ from .oauth import *  # noqa: F401,F403
 from .reports import *  # noqa: F401,F403
 
 
-from .utils import process_records  # noqa: E402
+from .utils import batch_queue_depth, drain_records, process_records  # noqa: E402
 if app.testing:
     from .mocks import mocks
     app.register_blueprint(mocks)
@@ -291,15 +291,51 @@ def load(verbose):
 @click.argument('input', type=click.File('r'), required=True)
 def org_info(input):
     """Pre-loads organisation data."""
-    row_count = models.OrgInfo.load_from_csv(input)
-    click.echo(f"Loaded {row_count} records")
+    stats = models.OrgInfo.load_from_csv(input)
+    click.echo(f"Loaded {stats.row_count} records: {stats.inserted} inserted, {stats.updated} updated, "
+               f"{stats.unchanged} unchanged")
 
 
 @app.cli.command()
 @click.option("-n", default=20, help="Max number of rows to process.")
-def process(n):
+@click.option("-d", "--drain", is_flag=True, help="Keep processing records until interrupted.")
+def process(n, drain=False):
     """Process uploaded records."""
-    process_records(n)
+    if drain:
+        drain_records(n)
+    else:
+        process_records(n)
+
+
+@app.cli.command("reconcile-counts")
+@click.option("-t", "--task-id", type=int, multiple=True, help="The task ID (by default all tasks).")
+def reconcile_counts(task_id):
+    """Repair the task progress counters recalculating them from the task records."""
+    tasks = models.Task.select()
+    if task_id:
+        tasks = tasks.where(models.Task.id << task_id)
+    for task in tasks:
+        for name, (old, new) in task.reconcile_counts().items():
+            click.echo(f"Task #{task.id} {name}: {old} -> {new}")
+
+
+@app.cli.command("queue-depth")
+def queue_depth():
+    """Show the number of the batch records ready for processing by organisation."""
+    org_names = dict(models.Organisation.select(models.Organisation.id, models.Organisation.name).tuples())
+    for org_id, depths in batch_queue_depth().items():
+        click.echo(f"{org_names.get(org_id)}: " + ", ".join(f"{k}: {v}" for k, v in depths.items()))
+
+
+@app.cli.command("profile-cache")
+@click.option("-c", "--clear", is_flag=True, help="Invalidate all the cached profile summaries.")
+def profile_cache(clear=False):
+    """Show ORCID profile summary cache hit and miss counts."""
+    if clear:
+        count = models.ProfileCache.update(summary=None, fetched_at=None).execute()
+        click.echo(f"Invalidated {count} entries.")
+    stats = models.ProfileCache.stats()
+    click.echo(", ".join(f"{k}: {v}" for k, v in stats.items()))
 
 
 if os.environ.get("ENV") == "dev0":
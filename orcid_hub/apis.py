@@ -16,12 +16,12 @@ from flask_swagger import swagger
 from yaml.dumper import Dumper
 from yaml.representer import SafeRepresenter
 
-from . import api, app, db, models, oauth
+from . import api, app, db, models, oauth, orcid_client
 from .login_provider import roles_required
-from .models import (ORCID_ID_REGEX, AffiliationRecord, Client, OrcidToken, PartialDate, Role,
-                     Task, TaskType, User, UserOrg, validate_orcid_id)
+from .models import (ORCID_ID_REGEX, AffiliationFingerprint, AffiliationRecord, Client, LoadStatus, OrcidToken,
+                     PartialDate, Role, Task, TaskType, User, UserOrg, validate_orcid_id)
 from .schemas import affiliation_task_schema
-from .utils import is_valid_url, register_orcid_webhook
+from .utils import get_load_progress, is_valid_url, queue_upload, register_orcid_webhook
 
 
 def prefers_yaml():
@@ -156,8 +156,8 @@ class TaskResource(AppResource):
         self.task_type = None if task_type is None else TaskType[task_type]
         return super().dispatch_request(*args, **kwargs)
 
-    def jsonify_task(self, task):
-        """Create JSON response with the task payload."""
+    def jsonify_task(self, task, with_records=True):
+        """Create JSON response with the task payload and the progress of the loading of its upload."""
         if isinstance(task, int):
             login_user(request.oauth.user)
             try:
@@ -172,15 +172,17 @@ class TaskResource(AppResource):
                 to_dashes=True,
                 exclude=[Task.created_by, Task.updated_by, Task.org, Task.task_type])
             task_dict["task-type"] = TaskType(task.task_type).name
-            if TaskType(task.task_type) == TaskType.AFFILIATION:
-                # import pdb; pdb.set_trace()
-                records = task.affiliation_records
-            else:
-                records = task.funding_records
-            task_dict["records"] = [
-                r.to_dict(to_dashes=True, recurse=False, exclude=[AffiliationRecord.task])
-                for r in records
-            ]
+            task_dict.update((k.replace('_', '-'), v) for k, v in get_load_progress(task).items())
+            if with_records:
+                if TaskType(task.task_type) == TaskType.AFFILIATION:
+                    # import pdb; pdb.set_trace()
+                    records = task.affiliation_records
+                else:
+                    records = task.funding_records
+                task_dict["records"] = [
+                    r.to_dict(to_dashes=True, recurse=False, exclude=[AffiliationRecord.task])
+                    for r in records
+                ]
             resp = jsonify(task_dict)
         else:
             resp = jsonify({"updated-at": task.updated_at})
@@ -203,6 +205,21 @@ class TaskResource(AppResource):
         task.delete_instance()
         return {"message": "The task was successfully deletd."}
 
+    def queue_affiliation_task(self, filename, data, suffix):
+        """Create an affiliation task and queue the loading of the uploaded data into it.
+
+        :return: the task response with the status 202 if the loading was queued.
+        """
+        task = Task.create(
+            filename=filename or datetime.utcnow().isoformat(timespec="seconds"),
+            org=current_user.organisation,
+            load_status=LoadStatus.QUEUED)
+        queue_upload(task, data, suffix=suffix)
+        task = Task.get(id=task.id)
+        if task.load_status == LoadStatus.LOADED:
+            return self.jsonify_task(task)
+        return self.jsonify_task(task, with_records=False), 202
+
     def handle_affiliation_task(self, task_id=None):
         """Handle PUT, POST, or PATCH request. Request body expected to be encoded in JSON."""
         login_user(request.oauth.user)
@@ -230,6 +247,11 @@ class TaskResource(AppResource):
         if "records" not in data:
             return jsonify({"error": "Validation error.", "message": "Missing affiliation records."}), 422
 
+        if not task_id:
+            # the records of a new task get loaded in the background as the CSV/TSV files do:
+            return self.queue_affiliation_task(
+                data.get("filename") or self.filename, request.data, ".yaml" if self.is_yaml_request else ".json")
+
         with db.atomic():
             try:
                 filename = (data.get("filename") or self.filename or datetime.utcnow().isoformat(timespec="seconds"))
@@ -247,13 +269,15 @@ class TaskResource(AppResource):
                     AffiliationRecord.delete().where(AffiliationRecord.task_id == task_id).execute()
 
                 record_fields = AffiliationRecord._meta.fields.keys()
+                new_records = []
                 for row in data["records"]:
-                    if "id" in row and request.method in ["PUT", "PATCH"]:
-                        rec = AffiliationRecord.get(id=row["id"])
-                    else:
+                    is_new = not ("id" in row and request.method in ["PUT", "PATCH"])
+                    if is_new:
                         rec = AffiliationRecord(task=task)
+                        new_records.append(rec)
+                    else:
+                        rec = AffiliationRecord.get(id=row["id"])
 
-                    # import pdb; pdb.set_trace()
                     for k, v in row.items():
                         if k == "id":
                             continue
@@ -261,9 +285,22 @@ class TaskResource(AppResource):
                         if k in record_fields and rec._data.get(k) != v:
                             rec._data[k] = PartialDate.create(v) if k.endswith("date") else v
                             rec._dirty.add(k)
-                    if rec.is_dirty():
+                    if not is_new and rec.is_dirty():
                         rec.save()
 
+                # the new records matching the already pushed ones don't get pushed again:
+                unchanged = {
+                    id(r) for r in AffiliationFingerprint.mark_unchanged(task.org_id, [r._data for r in new_records])
+                }
+                for rec in new_records:
+                    rec.save()
+                if unchanged:
+                    AffiliationFingerprint.log_unchanged(task, [r.id for r in new_records if id(r._data) in unchanged])
+                task.reconcile_counts()
+                if unchanged and not task.completed_at and task.processed_count == task.total_count:
+                    task.completed_at = datetime.utcnow()
+                    task.save()
+
             except Exception as ex:
                 db.rollback()
                 app.logger.exception("Failed to hadle affiliation API request.")
@@ -344,6 +381,69 @@ class TaskList(TaskResource, AppResourceList):
             exclude=[Task.created_by, Task.updated_by, Task.org])
 
 
+class TaskAPI(TaskResource):
+    """Task services."""
+
+    def get(self, task_id):
+        """
+        Retrieve the specified task with the progress of the loading of its upload.
+
+        ---
+        tags:
+          - "tasks"
+        summary: "Retrieve the specified task."
+        description: "Retrieve the specified task with the status and the counters of the loading of the upload
+          (the numbers of the parsed, inserted and rejected rows)."
+        produces:
+          - "application/json"
+        definitions:
+        - schema:
+            id: TaskProgress
+            properties:
+              id:
+                type: integer
+                format: int64
+              filename:
+                type: string
+              task-type:
+                type: string
+              load-status:
+                type: string
+                enum:
+                - QUEUED
+                - LOADING
+                - LOADED
+                - FAILED
+              parsed-count:
+                type: integer
+                description: "The number of the parsed rows"
+              total-count:
+                type: integer
+                description: "The number of the inserted records"
+              rejected-count:
+                type: integer
+                description: "The number of the invalid rows"
+              load-error:
+                type: string
+        parameters:
+          - name: "task_id"
+            in: "path"
+            description: "Task ID."
+            required: true
+            type: "integer"
+        responses:
+          200:
+            description: "successful operation"
+            schema:
+              $ref: "#/definitions/TaskProgress"
+          403:
+            description: "Access Denied"
+          404:
+            description: "The task doesn't exist"
+        """
+        return self.jsonify_task(task_id, with_records=False)
+
+
 class AffiliationListAPI(TaskResource):
     """Affiliation list API."""
 
@@ -464,13 +564,16 @@ class AffiliationListAPI(TaskResource):
             description: "successful operation"
             schema:
               $ref: "#/definitions/AffiliationTask"
+          202:
+            description: "The task was queued for loading (see /api/v1.0/tasks/{id} for the progress)"
+            schema:
+              $ref: "#/definitions/TaskProgress"
           403:
             description: "Access Denied"
         """
         login_user(request.oauth.user)
         if request.content_type in ["text/csv", "text/tsv"]:
-            task = Task.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
-            return self.jsonify_task(task)
+            return self.queue_affiliation_task(self.filename, request.data, ".csv")
         return self.handle_affiliation_task()
 
 
@@ -657,6 +760,7 @@ class AffiliationAPI(TaskResource):
 
 
 api.add_resource(TaskList, "/api/v1.0/tasks")
+api.add_resource(TaskAPI, "/api/v1.0/tasks/<int:task_id>")
 api.add_resource(AffiliationListAPI, "/api/v1.0/affiliations")
 api.add_resource(AffiliationAPI, "/api/v1.0/affiliations/<int:task_id>")
 
@@ -1037,9 +1141,7 @@ def orcid_proxy(path=None):
         url += '/' + '/'.join(rest)
 
     proxy_req = requests.Request(request.method, url, data=request.stream, headers=headers).prepare()
-    session = requests.Session()
-    # TODO: add timemout
-    resp = session.send(proxy_req, stream=True)
+    resp = orcid_client.http_pool.send(proxy_req, stream=True)
 
     def generate():
         # for chunk in resp.raw.stream(decode_content=False, amt=CHUNK_SIZE):
@@ -544,6 +544,8 @@ def profile():
         flash("Unhandled Exception occured: %s" % ex, "danger")
         return redirect(url_for("index"))
     else:
+        # The profile itself isn't rendered from the cached summary, and this is where
+        # a revoked token gets detected, so the person details get always fetched:
         client = OAuth2Session(
             user.organisation.orcid_client_id, token={
                 "access_token": orcid_token.access_token
@@ -664,7 +666,7 @@ def onboard_org():
             ('grant_type', 'client_credentials'),
         ]
 
-        response = requests.post(TOKEN_URL, headers=headers, data=data)
+        response = orcid_client.http_pool.post(TOKEN_URL, headers=headers, data=data)
         if response.status_code == 401:
             flash("Something is wrong! The Client id and Client Secret are not valid!\n"
                   "Please recheck and contact Hub support if this error continues", "danger")
@@ -982,8 +984,7 @@ def orcid_login_callback(request):
                 app.logger.error(f"Missing access token: {token}")
                 abort(401, "Missing ORCID API access token.")
 
-            orcid_client.configuration.access_token = access_token
-            api_instance = orcid_client.MemberAPIV20Api()
+            api_instance = orcid_client.MemberAPIV20Api(orcid_client.OrcidApiClient(access_token))
             try:
                 # NB! need to add _preload_content=False to get raw response
                 api_response = api_instance.view_emails(user.orcid, _preload_content=False)
@@ -144,6 +144,60 @@ RQ_QUEUE_CLASS = "orcid_hub.queuing.ThrottledQueue"
 RQ_POLL_INTERVAL = 5000  #: Web interface poll period for updates in ms
 WEB_BACKGROUND = "gray"
 
+# Batch file loading:
+LOAD_CHUNK_SIZE = int(getenv("LOAD_CHUNK_SIZE", 500))  #: Max number of records inserted with a single statement
+LOAD_VALIDATION_WORKERS = int(getenv("LOAD_VALIDATION_WORKERS", 0))  #: Processes validating uploads (0 - no pool)
+#: Directory of the uploads waiting to be loaded (shared by the web app and the RQ workers)
+UPLOAD_FOLDER = getenv("UPLOAD_FOLDER", path.join(path.dirname(path.dirname(path.abspath(__file__))), "upload"))
+#: Days a re-uploaded affiliation matching the last pushed one is marked unchanged w/o pushing (0 - disabled)
+AFFILIATION_FINGERPRINT_TTL = int(getenv("AFFILIATION_FINGERPRINT_TTL", 30))
+#: Seconds after a push within which an ORCID profile update notification is attributed to the push itself
+AFFILIATION_FINGERPRINT_WEBHOOK_DELAY = int(getenv("AFFILIATION_FINGERPRINT_WEBHOOK_DELAY", 300))
+
+# Batch record push to ORCID:
+ORCID_PUSH_MAX_WORKERS = int(getenv("ORCID_PUSH_MAX_WORKERS", 8))  #: Max number of concurrent pushes (1 - serial)
+ORCID_PUSH_MAX_PER_CLIENT = int(getenv("ORCID_PUSH_MAX_PER_CLIENT", 4))  #: Max concurrent pushes per ORCID client ID
+BATCH_LEASE_SECONDS = int(getenv("BATCH_LEASE_SECONDS", 600))  #: Record claim expiration time of a batch worker
+BATCH_IDLE_SLEEP_MIN = float(getenv("BATCH_IDLE_SLEEP_MIN", 1))  #: Batch worker idle polling period in seconds
+BATCH_IDLE_SLEEP_MAX = float(getenv("BATCH_IDLE_SLEEP_MAX", 60))  #: Max idle polling period (with the back-off)
+
+# ORCID profile (activities summary) cache:
+ORCID_PROFILE_CACHE_TTL = int(getenv("ORCID_PROFILE_CACHE_TTL", 3600))  #: Entry expiration in sec. (0 - disabled)
+
+# ORCID API rate limits (shared by all processes via Redis):
+ORCID_API_GLOBAL_RATE = float(getenv("ORCID_API_GLOBAL_RATE", 24))  #: Max number of calls per sec. (0 - no limit)
+ORCID_API_GLOBAL_BURST = int(getenv("ORCID_API_GLOBAL_BURST", 40))  #: Max number of calls at once
+ORCID_API_CLIENT_RATE = float(getenv("ORCID_API_CLIENT_RATE", 12))  #: Max calls per sec. per ORCID client ID
+ORCID_API_CLIENT_BURST = int(getenv("ORCID_API_CLIENT_BURST", 20))  #: Max calls at once per ORCID client ID
+ORCID_API_RATE_MAX_WAIT = float(getenv("ORCID_API_RATE_MAX_WAIT", 30))  #: Max time in sec. a call waits for a token
+ORCID_API_MAX_429_RETRIES = int(getenv("ORCID_API_MAX_429_RETRIES", 3))  #: Retries after "429 Too Many Requests"
+
+# Outbound HTTP connection pool (shared by all ORCID API and webhook calls of a process):
+ORCID_HTTP_POOL_CONNECTIONS = int(getenv("ORCID_HTTP_POOL_CONNECTIONS", 10))  #: Number of hosts to keep connections to
+ORCID_HTTP_POOL_MAXSIZE = int(getenv("ORCID_HTTP_POOL_MAXSIZE", 10))  #: Max number of kept connections per host
+ORCID_HTTP_POOL_BLOCK = bool(getenv("ORCID_HTTP_POOL_BLOCK"))  #: Wait for a free connection instead of opening one
+ORCID_HTTP_POOL_TIMEOUT = float(getenv("ORCID_HTTP_POOL_TIMEOUT", 30))  #: Max wait for a free connection in sec.
+ORCID_API_CONNECT_TIMEOUT = float(getenv("ORCID_API_CONNECT_TIMEOUT", 10))  #: Connection timeout in sec.
+ORCID_API_READ_TIMEOUT = float(getenv("ORCID_API_READ_TIMEOUT", 60))  #: Response read timeout in sec.
+
+# ORCID API bulk calls:
+ORCID_API_BULK_VERSION = getenv("ORCID_API_BULK_VERSION", "v2.1")  #: API version of the bulk endpoints
+ORCID_API_BULK_SIZE = int(getenv("ORCID_API_BULK_SIZE", 100))  #: Works per bulk call (max 100, 0 - no bulk calls)
+
+# ORCID API call retries and circuit breaker:
+ORCID_API_MAX_RETRIES = int(getenv("ORCID_API_MAX_RETRIES", 3))  #: Retries after 5xx responses and timeouts
+ORCID_API_RETRY_BACKOFF = float(getenv("ORCID_API_RETRY_BACKOFF", 0.5))  #: Initial retry delay in sec.
+ORCID_API_RETRY_MAX_DELAY = float(getenv("ORCID_API_RETRY_MAX_DELAY", 10))  #: Max retry delay in sec.
+ORCID_API_BREAKER_THRESHOLD = int(getenv("ORCID_API_BREAKER_THRESHOLD", 5))  #: Failures in a row opening the breaker
+ORCID_API_BREAKER_RESET_TIMEOUT = float(getenv("ORCID_API_BREAKER_RESET_TIMEOUT", 60))  #: Open breaker period in sec.
+
+# ORCID API call log:
+ORCID_API_CALL_LOG_BUFFER_SIZE = int(getenv("ORCID_API_CALL_LOG_BUFFER_SIZE", 100))  #: Entries per insert (1 - direct)
+ORCID_API_CALL_LOG_FLUSH_INTERVAL = float(getenv("ORCID_API_CALL_LOG_FLUSH_INTERVAL", 5))  #: Max buffering time in sec.
+ORCID_API_CALL_LOG_MAX_BODY_SIZE = int(getenv("ORCID_API_CALL_LOG_MAX_BODY_SIZE", 0))  #: Max logged body size (0 - any)
+ORCID_API_CALL_LOG_COMPRESS = bool(getenv("ORCID_API_CALL_LOG_COMPRESS"))  #: Compress large bodies (no truncation)
+ORCID_API_CALL_LOG_SAMPLE_RATE = float(getenv("ORCID_API_CALL_LOG_SAMPLE_RATE", 1))  #: Logged share of successful calls
+
 # Celery
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
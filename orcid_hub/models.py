@@ -1,32 +1,36 @@
 # -*- coding: utf-8 -*-
 """Application models."""
 
-import copy
 import csv
 import json
+import multiprocessing
 import os
 import random
 import re
 import secrets
 import string
+import threading
 import uuid
 import validators
-from collections import namedtuple
-from datetime import datetime
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from enum import IntEnum
+from functools import lru_cache, partial
 from hashlib import md5
 from io import StringIO
-from itertools import zip_longest
+from itertools import islice, zip_longest
 from urllib.parse import urlencode
 
 import yaml
 from flask_login import UserMixin, current_user
 from peewee import BooleanField as BooleanField_
 from peewee import (JOIN, BlobField, CharField, DateTimeField, DeferredRelation, Field,
-                    FixedCharField, ForeignKeyField, IntegerField, Model, OperationalError,
+                    FixedCharField, ForeignKeyField, IntegerField, IntegrityError, Model, OperationalError,
                     PostgresqlDatabase, ProgrammingError, SmallIntegerField, TextField, fn)
 from playhouse.shortcuts import model_to_dict
 from pycountry import countries
 from pykwalify.core import Core
+from pykwalify.rule import Rule
 from pykwalify.errors import SchemaError
 from peewee_validates import ModelValidator
 
@@ -422,6 +426,8 @@ class Organisation(BaseModel, AuditMixin):
     webhook_enabled = BooleanField(default=False, null=True)
     email_notifications_enabled = BooleanField(default=False, null=True)
     webhook_url = CharField(max_length=100, null=True)
+    batch_weight = SmallIntegerField(
+        default=1, null=True, help_text="The share of the batch processing capacity relative to other organisations.")
 
     @property
     def invitation_sent_to(self):
@@ -484,6 +490,9 @@ class Organisation(BaseModel, AuditMixin):
         super().save(*args, **kwargs)
 
 
+LoadStats = namedtuple("LoadStats", ["row_count", "inserted", "updated", "unchanged"])
+
+
 class OrgInfo(BaseModel):
     """Preloaded organisation data."""
 
@@ -512,7 +521,13 @@ class OrgInfo(BaseModel):
 
     @classmethod
     def load_from_csv(cls, source):
-        """Load data from CSV file or a string."""
+        """Load data from CSV file or a string.
+
+        The rows get deduplicated by the organisation name (the last one wins) and only the new and
+        the changed entries get written with chunked bulk upserts.
+
+        :return: the number of the read rows and the numbers of the inserted, updated, and unchanged entries.
+        """
         if isinstance(source, str):
             if '\n' in source:
                 source = StringIO(source)
@@ -550,30 +565,56 @@ class OrgInfo(BaseModel):
                 v = row[idxs[i]].strip()
                 return None if v == '' else v
 
+        entries = {}
+        row_count = 0
         for row in reader:
             # skip empty lines:
-            if row is None or (len(row) == 1 and row[0].strip() == ''):
+            if not row or (len(row) == 1 and row[0].strip() == ''):
                 continue
-
+            row_count += 1
             name = val(row, 0)
-            oi, _ = cls.get_or_create(name=name)
-
-            oi.title = val(row, 1)
-            oi.first_name = val(row, 2)
-            oi.last_name = val(row, 3)
-            oi.role = val(row, 4)
-            oi.email = val(row, 5)
-            oi.phone = val(row, 6)
-            oi.is_public = val(row, 7) and val(row, 7).upper() == "YES"
-            oi.country = val(row, 8) or DEFAULT_COUNTRY
-            oi.city = val(row, 9)
-            oi.disambiguated_id = val(row, 10)
-            oi.disambiguation_source = val(row, 11)
-            oi.tuakiri_name = val(row, 12)
-
-            oi.save()
+            if not name:
+                continue
+            entries[name] = dict(
+                name=name,
+                title=val(row, 1),
+                first_name=val(row, 2),
+                last_name=val(row, 3),
+                role=val(row, 4),
+                email=val(row, 5),
+                phone=val(row, 6),
+                is_public=val(row, 7) and val(row, 7).upper() == "YES",
+                country=val(row, 8) or DEFAULT_COUNTRY,
+                city=val(row, 9),
+                disambiguated_id=val(row, 10),
+                disambiguation_source=val(row, 11),
+                tuakiri_name=val(row, 12))
+
+        new, changed = [], []
+        names = list(entries)
+        for chunk in chunked(names, 500):
+            existing = {r["name"]: r for r in cls.select().where(cls.name << chunk).dicts()}
+            for name in chunk:
+                entry = entries[name]
+                if name not in existing:
+                    new.append(entry)
+                elif any(existing[name][k] != v for k, v in entry.items()):
+                    changed.append(entry)
+
+        database = cls._meta.database
+        with database.atomic():
+            if isinstance(database, PostgresqlDatabase):
+                for chunk in chunked(new + changed, app.config.get("LOAD_CHUNK_SIZE") or 500):
+                    upsert_many(cls, chunk, cls.name)
+            else:
+                inserter = BulkInserter(cls)
+                for entry in new:
+                    inserter.add(entry)
+                inserter.flush()
+                for entry in changed:
+                    cls.update(**entry).where(cls.name == entry["name"]).execute()
 
-        return reader.line_num - 1
+        return LoadStats(row_count, len(new), len(changed), len(entries) - len(new) - len(changed))
 
 
 class User(BaseModel, UserMixin, AuditMixin):
@@ -862,6 +903,71 @@ class OrcidApiCall(BaseModel):
         db_table = "orcid_api_call"
 
 
+class ProfileCache(BaseModel):
+    """Cached ORCID activities summary of a user retrieved on behalf of an organisation."""
+
+    user = ForeignKeyField(User, on_delete="CASCADE", related_name="profile_cache")
+    org = ForeignKeyField(Organisation, on_delete="CASCADE", related_name="profile_cache")
+    summary = TextField(null=True, help_text="ORCID activities summary (JSON).")
+    fetched_at = DateTimeField(null=True, help_text="The time the summary was retrieved from ORCID.")
+    hit_count = IntegerField(default=0)
+    miss_count = IntegerField(default=0)
+
+    @classmethod
+    def get_summary(cls, user_id, org_id, ttl):
+        """Get the cached summary if it isn't older than ``ttl`` seconds counting the cache hits and misses.
+
+        :return: the activities summary or ``None`` if there is no fresh entry.
+        """
+        entry = cls.select().where(cls.user_id == user_id, cls.org_id == org_id).first()
+        if entry is None:
+            try:
+                with cls._meta.database.atomic():
+                    cls.create(user_id=user_id, org_id=org_id, miss_count=1)
+                return None
+            except IntegrityError:  # created concurrently
+                entry = cls.get(user_id=user_id, org_id=org_id)
+        if entry.summary and entry.fetched_at and entry.fetched_at > datetime.utcnow() - timedelta(seconds=ttl):
+            cls.update(hit_count=cls.hit_count + 1).where(cls.id == entry.id).execute()
+            return json.loads(entry.summary)
+        cls.update(miss_count=cls.miss_count + 1).where(cls.id == entry.id).execute()
+        return None
+
+    @classmethod
+    def set_summary(cls, user_id, org_id, summary):
+        """Store the activities summary retrieved from ORCID."""
+        data = dict(summary=json.dumps(summary), fetched_at=datetime.utcnow())
+        if not cls.update(**data).where(cls.user_id == user_id, cls.org_id == org_id).execute():
+            cls.create(user_id=user_id, org_id=org_id, **data)
+
+    @classmethod
+    def invalidate(cls, user_id, org_id=None):
+        """Invalidate the cached summaries of the user (by default, retrieved by all organisations).
+
+        :return: the number of the invalidated entries.
+        """
+        query = cls.update(summary=None, fetched_at=None).where(cls.user_id == user_id, cls.summary.is_null(False))
+        if org_id is not None:
+            query = query.where(cls.org_id == org_id)
+        return query.execute()
+
+    @classmethod
+    def stats(cls):
+        """Get the cache entry count and the hit and miss counts and rate."""
+        entries, hits, misses = cls.select(
+            fn.COUNT(cls.summary), fn.SUM(cls.hit_count), fn.SUM(cls.miss_count)).scalar(as_tuple=True)
+        hits, misses = hits or 0, misses or 0
+        return dict(
+            entries=entries or 0,
+            hits=hits,
+            misses=misses,
+            hit_rate=round(hits / (hits + misses), 4) if hits + misses else None)
+
+    class Meta:  # noqa: D101,D106
+        db_table = "profile_cache"
+        indexes = ((("user", "org"), True), )
+
+
 class OrcidAuthorizeCall(BaseModel):
     """ORCID Authorize call audit entry."""
 
@@ -877,6 +983,18 @@ class OrcidAuthorizeCall(BaseModel):
         db_table = "orcid_authorize_call"
 
 
+class LoadStatus(IntEnum):
+    """Enum used to represent the status of the loading of the uploaded file of a task."""
+
+    LOADED = 0  # Loaded (or the task was created without an upload)
+    QUEUED = 1  # The upload is waiting to be loaded in the background
+    LOADING = 2  # The upload is being loaded
+    FAILED = 3  # Loading failed
+
+    def __str__(self):
+        return self.name.capitalize()
+
+
 class Task(BaseModel, AuditMixin):
     """Batch processing task created form CSV/TSV file."""
 
@@ -891,6 +1009,15 @@ class Task(BaseModel, AuditMixin):
     task_type = SmallIntegerField(default=0)
     expires_at = DateTimeField(null=True)
     expiry_email_sent_at = DateTimeField(null=True)
+    total_count = IntegerField(default=0, help_text="The number of the task records.")
+    processed_count = IntegerField(default=0, help_text="The number of the processed records.")
+    failed_count = IntegerField(default=0, help_text="The number of the records processed with errors.")
+    invited_count = IntegerField(default=0, help_text="The number of the invitations sent.")
+    pushed_count = IntegerField(default=0, help_text="The number of the records (or invitees) pushed to ORCID.")
+    load_status = SmallIntegerField(default=LoadStatus.LOADED, help_text="The status of the loading of the upload.")
+    parsed_count = IntegerField(default=0, help_text="The number of the parsed rows (items) of the upload.")
+    rejected_count = IntegerField(default=0, help_text="The number of the invalid rows (items) of the upload.")
+    load_error = TextField(null=True, help_text="The reason why the loading of the upload failed.")
 
     def __repr__(self):
         return self.filename or f"{TaskType(self.task_type).name.capitalize()} record processing task #{self.id}"
@@ -900,10 +1027,47 @@ class Task(BaseModel, AuditMixin):
         """Test if the expiry email is sent ot not."""
         return bool(self.expiry_email_sent_at)
 
-    @lazy_property
+    @property
     def record_count(self):
         """Get count of the loaded recoreds."""
-        return self.records.count()
+        return self.total_count
+
+    @classmethod
+    def update_counts(cls, task_id, **counts):
+        """Increment (or decrement if the values are negative) the task counters in a single statement.
+
+        E.g., ``Task.update_counts(task.id, processed_count=10, failed_count=1)``.
+        """
+        counts = {k: v for k, v in counts.items() if v}
+        if counts:
+            cls.update(**{k: getattr(cls, k) + v for k, v in counts.items()}).where(cls.id == task_id).execute()
+
+    def reconcile_counts(self):
+        """Recalculate the counters from the task records repairing any drift.
+
+        :return: the dict of the counters which values were changed mapped to the pairs of the old and new values.
+        """
+        Record = self.record_model  # noqa: N806
+        counts = dict(
+            total_count=self.records.count(),
+            processed_count=self.records.where(Record.processed_at.is_null(False)).count(),
+            failed_count=self.records.where(Record.status_code == RecordStatus.ERROR).count(),
+            invited_count=UserInvitation.select().where(UserInvitation.task_id == self.id).count())
+        if Record is AffiliationRecord:
+            counts["pushed_count"] = self.records.where(Record.put_code.is_null(False)).count()
+        else:
+            Invitee = {  # noqa: N806
+                FundingRecord: FundingInvitees,
+                WorkRecord: WorkInvitees,
+                PeerReviewRecord: PeerReviewInvitee
+            }[Record]
+            counts["pushed_count"] = Invitee.select().join(Record).where(
+                Record.task_id == self.id, Invitee.put_code.is_null(False)).count()
+        changes = {k: (getattr(self, k), v) for k, v in counts.items() if getattr(self, k) != v}
+        if changes:
+            Task.update(**counts).where(Task.id == self.id).execute()
+            self._data.update(counts)
+        return changes
 
     @property
     def record_model(self):
@@ -920,14 +1084,15 @@ class Task(BaseModel, AuditMixin):
     @property
     def error_count(self):
         """Get error count encountered during processing batch task."""
-        q = self.records
-        _, models = q.get_query_meta()
-        model, = models.keys()
-        return self.records.where(self.record_model.status ** "%error%").count()
+        return self.failed_count
 
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
-        """Load affiliation record data from CSV/TSV file or a string."""
+    def load_from_csv(cls, source, filename=None, org=None, task=None, progress=None):
+        """Load affiliation record data from CSV/TSV file or a string.
+
+        :param task: the task to load the records into (e.g., created when the upload was queued).
+        :param progress: the function called with the current counters after each chunk of the rows.
+        """
         if isinstance(source, str):
             source = StringIO(source)
         reader = csv.reader(source)
@@ -975,90 +1140,192 @@ class Task(BaseModel, AuditMixin):
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-                return default if v == '' else v
-
-        with db.atomic():
+        def rows():
+            """Iterate over the numbered non-empty rows."""
+            for row_no, row in enumerate(reader):
+                # skip empty lines:
+                if len(row) == 0:
+                    continue
+                if len(row) == 1 and row[0].strip() == '':
+                    continue
+                yield row_no, row
+
+        errors = []
+        parsed_count = 0
+        database = cls._meta.database
+        with database.atomic():
             try:
-                task = cls.create(org=org, filename=filename)
-                for row_no, row in enumerate(reader):
-                    # skip empty lines:
-                    if len(row) == 0:
-                        continue
-                    if len(row) == 1 and row[0].strip() == '':
-                        continue
-
-                    email = val(row, 2, "").lower()
-                    orcid = val(row, 15)
-                    external_id = val(row, 16)
-
-                    if not email and not orcid and external_id and validators.email(external_id):
-                        # if email is missing and exernal ID is given as a valid email, use it:
-                        email = external_id
-
-                    # The uploaded country must be from ISO 3166-1 alpha-2
-                    country = val(row, 11)
-
-                    if country:
-                        try:
-                            country = countries.lookup(country).alpha_2
-                        except Exception:
-                            raise ModelException(
-                                f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
-                                f"#{row_no+2}: {row}. Header: {header}")
-
-                    if not (email or orcid):
-                        raise ModelException(
-                            f"Missing user identifier (email address or ORCID iD) in the row "
-                            f"#{row_no+2}: {row}. Header: {header}")
-
-                    if orcid:
-                        validate_orcid_id(orcid)
-
-                    if not email or not validators.email(email):
-                        raise ValueError(
-                            f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
-
-                    affiliation_type = val(row, 10, "").lower()
-                    if not affiliation_type or affiliation_type not in AFFILIATION_TYPES:
-                        raise ValueError(
-                            f"Invalid affiliation type '{affiliation_type}' in the row #{row_no+2}: {row}. "
-                            f"Expected values: {', '.join(at for at in AFFILIATION_TYPES)}.")
-
-                    af = AffiliationRecord(
-                        task=task,
-                        first_name=val(row, 0),
-                        last_name=val(row, 1),
-                        email=email,
-                        organisation=val(row, 3),
-                        department=val(row, 4),
-                        city=val(row, 5),
-                        region=val(row, 6),
-                        role=val(row, 7),
-                        start_date=PartialDate.create(val(row, 8)),
-                        end_date=PartialDate.create(val(row, 9)),
-                        affiliation_type=affiliation_type,
-                        country=country,
-                        disambiguated_id=val(row, 12),
-                        disambiguation_source=val(row, 13),
-                        put_code=val(row, 14),
-                        orcid=orcid,
-                        external_id=external_id)
-                    validator = ModelValidator(af)
-                    if not validator.validate():
-                        raise ModelException(f"Invalid record: {validator.errors}")
-                    af.save()
+                if task is None:
+                    task = cls.create(org=org, filename=filename)
+                unchanged = []
+
+                def mark_unchanged(rows):
+                    """Mark the rows matching the fingerprints of the already pushed records processed."""
+                    unchanged.extend(AffiliationFingerprint.mark_unchanged(task.org_id, rows))
+
+                inserter = BulkInserter(AffiliationRecord, before_flush=mark_unchanged)
+                validate = partial(validate_affiliation_rows, task.id, header, idxs)
+                for results in validate_in_chunks(validate, chunked_iter(rows(), inserter.chunk_size)):
+                    for result in results:
+                        parsed_count += 1
+                        if isinstance(result, str):
+                            errors.append(result)
+                        elif not errors:
+                            inserter.add(result)
+                    # the progress gets reported once per chunk with all the rows of the chunk inserted:
+                    if not errors:
+                        inserter.flush()
+                    if progress:
+                        progress(parsed_count=parsed_count, total_count=inserter.count, rejected_count=len(errors))
+                if errors:
+                    raise ModelException(
+                        f"{len(errors)} invalid row(s): " + "; ".join(errors[:10]) +
+                        (f"; ... and {len(errors) - 10} more" if len(errors) > 10 else ''))
+                task.set_load_counts(parsed_count, inserter.count, unchanged)
             except Exception:
-                db.rollback()
+                database.rollback()
                 app.logger.exception("Failed to load affiliation file.")
                 raise
 
         return task
 
+    @classmethod
+    def load_from_json(cls, source, filename=None, org=None, task=None, progress=None):
+        """Load affiliation records from the JSON or YAML affiliation task (validated by the affiliation API).
+
+        :param task: the task to load the records into (e.g., created when the upload was queued).
+        :param progress: the function called with the current counters after each chunk of the records.
+        """
+        if isinstance(source, str):
+            source = StringIO(source)
+        data = yaml.safe_load(source)
+        if filename is None:
+            filename = data.get("filename") or datetime.utcnow().isoformat(timespec="seconds")
+        if org is None:
+            org = current_user.organisation if current_user else None
+
+        record_fields = AffiliationRecord._meta.fields.keys()
+        parsed_count = 0
+        database = cls._meta.database
+        with database.atomic():
+            try:
+                if task is None:
+                    task = cls.create(org=org, filename=filename)
+                unchanged = []
+
+                def mark_unchanged(rows):
+                    """Mark the rows matching the fingerprints of the already pushed records processed."""
+                    unchanged.extend(AffiliationFingerprint.mark_unchanged(task.org_id, rows))
+
+                inserter = BulkInserter(AffiliationRecord, before_flush=mark_unchanged)
+                for chunk in chunked_iter(data["records"], inserter.chunk_size):
+                    for row in chunk:
+                        record = AffiliationRecord(task=task)
+                        for k, v in row.items():
+                            k = k.replace('-', '_')
+                            if k != "id" and k in record_fields:
+                                record._data[k] = PartialDate.create(v) if k.endswith("date") else v
+                        inserter.add(record._data)
+                    inserter.flush()
+                    parsed_count += len(chunk)
+                    if progress:
+                        progress(parsed_count=parsed_count, total_count=inserter.count, rejected_count=0)
+                task.set_load_counts(parsed_count, inserter.count, unchanged)
+            except Exception:
+                database.rollback()
+                app.logger.exception("Failed to load affiliation task.")
+                raise
+
+        return task
+
+    def set_load_counts(self, parsed_count, total_count, unchanged):
+        """Store the counters of the loaded records marking the task completed if all of them were unchanged.
+
+        :param unchanged: the rows marked unchanged by :py:meth:`AffiliationFingerprint.mark_unchanged`.
+        """
+        self.total_count = total_count
+        self.parsed_count = parsed_count
+        if unchanged:
+            AffiliationFingerprint.log_unchanged(self)
+            self.processed_count = self.pushed_count = len(unchanged)
+            if len(unchanged) == self.total_count:
+                self.completed_at = datetime.utcnow()
+        self.save()
+
+    @staticmethod
+    def affiliation_record_from_row(task, row, row_no, header, val, country_codes):
+        """Create and validate an affiliation record (not saved) from a CSV/TSV row.
+
+        :param task: the task or its ID.
+        :param val: the function getting a value of the row by the column index.
+        :param country_codes: the cache of the looked up country codes.
+        """
+        email = val(row, 2, "").lower()
+        orcid = val(row, 15)
+        external_id = val(row, 16)
+
+        if not email and not orcid and external_id and validators.email(external_id):
+            # if email is missing and exernal ID is given as a valid email, use it:
+            email = external_id
+
+        # The uploaded country must be from ISO 3166-1 alpha-2
+        country = val(row, 11)
+
+        if country:
+            if country not in country_codes:
+                try:
+                    country_codes[country] = countries.lookup(country).alpha_2
+                except Exception:
+                    country_codes[country] = None
+            if country_codes[country] is None:
+                raise ModelException(
+                    f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
+                    f"#{row_no+2}: {row}. Header: {header}")
+            country = country_codes[country]
+
+        if not (email or orcid):
+            raise ModelException(
+                f"Missing user identifier (email address or ORCID iD) in the row "
+                f"#{row_no+2}: {row}. Header: {header}")
+
+        if orcid:
+            validate_orcid_id(orcid)
+
+        if not email or not validators.email(email):
+            raise ValueError(
+                f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
+
+        affiliation_type = val(row, 10, "").lower()
+        if not affiliation_type or affiliation_type not in AFFILIATION_TYPES:
+            raise ValueError(
+                f"Invalid affiliation type '{affiliation_type}' in the row #{row_no+2}: {row}. "
+                f"Expected values: {', '.join(at for at in AFFILIATION_TYPES)}.")
+
+        af = AffiliationRecord(
+            task=task,
+            first_name=val(row, 0),
+            last_name=val(row, 1),
+            email=email,
+            organisation=val(row, 3),
+            department=val(row, 4),
+            city=val(row, 5),
+            region=val(row, 6),
+            role=val(row, 7),
+            start_date=PartialDate.create(val(row, 8)),
+            end_date=PartialDate.create(val(row, 9)),
+            affiliation_type=affiliation_type,
+            country=country,
+            disambiguated_id=val(row, 12),
+            disambiguation_source=val(row, 13),
+            put_code=val(row, 14),
+            orcid=orcid,
+            external_id=external_id)
+        validator = ModelValidator(af)
+        # the task is not looked up, so the rows can be validated without the DB access:
+        if not validator.validate(exclude=("task", )):
+            raise ModelException(f"Invalid record in the row #{row_no+2}: {validator.errors}")
+        return af
+
     class Meta:  # noqa: D101,D106
         table_alias = "t"
 
@@ -1102,7 +1369,236 @@ class UserInvitation(BaseModel, AuditMixin):
         db_table = "user_invitation"
 
 
-class RecordModel(BaseModel):
+class RecordStatus(IntEnum):
+    """Enum used to represent the current processing status of a batch record."""
+
+    NEW = 0  # Not processed yet
+    SENT = 1  # The invitation was sent
+    RESET = 2  # Reset for reprocessing
+    CREATED = 3  # The ORCID entry was created
+    UPDATED = 4  # The ORCID entry was updated
+    UNCHANGED = 5  # The ORCID entry was already up to date
+    PROCESSED = 6  # Processed (all the invitees of the record)
+    ERROR = 7  # Processing failed
+
+    def __str__(self):
+        return self.name.capitalize()
+
+
+class RecordEvent(BaseModel):
+    """Append-only log of the batch record processing status changes."""
+
+    record_type = CharField(max_length=40, help_text="The table name of the record.")
+    record_id = IntegerField()
+    status_code = SmallIntegerField(null=True)
+    message = TextField(null=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    @classmethod
+    def log(cls, model, ids, status_code=None, message=None, created_at=None):
+        """Log the same event for all the given records of the model with bulk inserts."""
+        if created_at is None:
+            created_at = datetime.utcnow()
+        rows = [
+            dict(
+                record_type=model._meta.db_table,
+                record_id=record_id,
+                status_code=status_code,
+                message=message,
+                created_at=created_at) for record_id in ids
+        ]
+        for chunk in chunked(rows, 100):
+            cls.insert_many(chunk).execute()
+
+    @classmethod
+    def history(cls, record):
+        """Get the events of the record in the order they were logged."""
+        return cls.select().where(cls.record_type == record._meta.db_table,
+                                  cls.record_id == record.id).order_by(cls.id)
+
+    class Meta:  # noqa: D101,D106
+        db_table = "record_event"
+        indexes = ((("record_type", "record_id"), False), )
+
+
+def chunked(items, size):
+    """Split the list into the chunks of the given size."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def chunked_iter(items, size):
+    """Split the iterable into the lists of the given size (consuming it lazily)."""
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), [])
+
+
+def validate_in_chunks(validate, chunks, workers=None):
+    """Validate the chunks of the uploaded rows (items) and yield the results in the order of the chunks.
+
+    With more than one worker (by default ``LOAD_VALIDATION_WORKERS``) the chunks get validated by
+    a process pool ahead of the consumer, at most two chunks per worker, so the source is still read
+    lazily. The validation function and the results should be picklable.
+    """
+    if workers is None:
+        workers = app.config.get("LOAD_VALIDATION_WORKERS") or 0
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate(chunk)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(validate, (chunk, )))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def validate_affiliation_rows(task_id, header, idxs, rows):
+    """Validate the chunk of the rows of an affiliation file (run by a process pool worker in parallel mode).
+
+    :param idxs: the indexes of the columns mapped to the record fields.
+    :param rows: the list of the pairs of the row numbers and the rows.
+    :return: the list of the record field values (dicts) or the error messages in the order of the rows.
+    """
+    def val(row, i, default=None):
+        if idxs[i] is None or idxs[i] >= len(row):
+            return default
+        else:
+            v = row[idxs[i]].strip()
+            return default if v == '' else v
+
+    country_codes = {}
+    results = []
+    for row_no, row in rows:
+        try:
+            af = Task.affiliation_record_from_row(task_id, row, row_no, header, val, country_codes)
+        except (ModelException, ValueError) as ex:
+            results.append(str(ex))
+        else:
+            results.append(af._data)
+    return results
+
+
+def upsert_many(model, rows, conflict_field):
+    """Insert the rows (dicts of the same field values) with a single ``INSERT ... ON CONFLICT DO UPDATE``.
+
+    The existing rows with the same value of the unique field get updated instead (PostgreSQL only).
+    """
+    database = model._meta.database
+    q, p = database.quote_char, database.interpolation
+    fields = [model._meta.fields[name] for name in rows[0]]
+    columns = ", ".join(f"{q}{f.db_column}{q}" for f in fields)
+    values = ", ".join(["(" + ", ".join([p] * len(fields)) + ")"] * len(rows))
+    updates = ", ".join(
+        f"{q}{f.db_column}{q} = EXCLUDED.{q}{f.db_column}{q}" for f in fields if f.name != conflict_field.name)
+    database.execute_sql(
+        f"INSERT INTO {q}{model._meta.db_table}{q} ({columns}) VALUES {values} "
+        f"ON CONFLICT ({q}{conflict_field.db_column}{q}) DO UPDATE SET {updates}",
+        [f.db_value(r[f.name]) for r in rows for f in fields])
+
+
+class BulkInserter:
+    """Buffer the new rows of a model and insert them in chunks (a single statement per chunk).
+
+    Usage::
+
+        inserter = BulkInserter(AffiliationRecord)
+        for row in rows:
+            inserter.add(row)
+        inserter.flush()
+    """
+
+    def __init__(self, model, chunk_size=None, before_flush=None):
+        """Set up the inserter of the model rows (dicts of the field values).
+
+        The default chunk size is ``LOAD_CHUNK_SIZE`` limited by the max number of
+        the query parameters with SQLite (999).
+
+        :param before_flush: the function called with the list of the buffered rows before they get inserted.
+        """
+        self.model = model
+        self.before_flush = before_flush
+        if chunk_size is None:
+            chunk_size = app.config.get("LOAD_CHUNK_SIZE") or 500
+            if not isinstance(model._meta.database, PostgresqlDatabase):
+                chunk_size = min(chunk_size, 999 // len(model._meta.fields))
+        self.chunk_size = max(1, chunk_size)
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        """Add a row inserting the buffered rows if the chunk is full."""
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Insert all the buffered rows."""
+        if self.rows:
+            if self.before_flush:
+                self.before_flush(self.rows)
+            # all the rows of a multi-row insert need the same fields:
+            fields = set().union(*self.rows)
+            rows = [r if len(r) == len(fields) else dict(dict.fromkeys(fields), **r) for r in self.rows]
+            self.model.insert_many(rows).execute()
+            self.count += len(self.rows)
+            self.rows = []
+
+
+class StatusMixin(Model):
+    """Mixin of the batch records maintaining the current processing status and the event log."""
+
+    status_code = SmallIntegerField(
+        null=True,
+        index=True,
+        choices=[(s.value, str(s)) for s in RecordStatus],
+        help_text="The current processing status.")
+
+    def add_status_line(self, line, status_code=None):
+        """Set the current processing status and queue the event to be logged when the record gets saved."""
+        ts = datetime.utcnow()
+        self.status = ts.isoformat(timespec="seconds") + ": " + line
+        if status_code is not None:
+            self.status_code = status_code
+        if not hasattr(self, "_events"):
+            self._events = []
+        self._events.append((self.status_code, line, ts))
+
+    def save(self, *args, **kwargs):
+        """Save the record and log all the queued status events with a single insert."""
+        rv = super().save(*args, **kwargs)
+        events = getattr(self, "_events", None)
+        if events:
+            RecordEvent.insert_many([
+                dict(
+                    record_type=self._meta.db_table,
+                    record_id=self.id,
+                    status_code=status_code,
+                    message=message,
+                    created_at=created_at) for status_code, message, created_at in events
+            ]).execute()
+            self._events = []
+        return rv
+
+    @classmethod
+    def update_status(cls, message, status_code, *where, **fields):
+        """Set the status of all the records matching the condition and log the event for each of them.
+
+        :return: the number of the updated records.
+        """
+        ids = [r[0] for r in cls.select(cls.id).where(*where).tuples()]
+        ts = datetime.utcnow()
+        status = ts.isoformat(timespec="seconds") + ": " + message
+        for chunk in chunked(ids, 500):
+            cls.update(status=status, status_code=status_code, **fields).where(cls.id << chunk).execute()
+        RecordEvent.log(cls, ids, status_code, message, created_at=ts)
+        return len(ids)
+
+
+class RecordModel(BaseModel, StatusMixin):
     """Commond model bits of the task records."""
 
     def save(self, *args, **kwargs):
@@ -1112,11 +1608,6 @@ class RecordModel(BaseModel):
             self.task.save()
         return super().save(*args, **kwargs)
 
-    def add_status_line(self, line):
-        """Add a text line to the status for logging processing progress."""
-        ts = datetime.utcnow().isoformat(timespec="seconds")
-        self.status = (self.status + "\n" if self.status else '') + ts + ": " + line
-
 
 class GroupIdRecord(RecordModel):
     """GroupID records."""
@@ -1183,12 +1674,142 @@ class AffiliationRecord(RecordModel):
         null=True, max_length=20, verbose_name="Disambiguated Organization Identifier")
     disambiguation_source = CharField(
         null=True, max_length=100, verbose_name="Disambiguation Source")
+    lease_token = CharField(null=True, max_length=32, help_text="The batch worker claim token.")
+    leased_until = DateTimeField(null=True, help_text="The batch worker claim expiration time.")
 
     class Meta:  # noqa: D101,D106
         db_table = "affiliation_record"
         table_alias = "ar"
 
 
+class AffiliationFingerprint(BaseModel):
+    """Fingerprint of the affiliation record content last pushed to ORCID on behalf of an organisation.
+
+    The re-uploaded records matching a fresh fingerprint get marked unchanged without any ORCID API call.
+    """
+
+    #: The record fields the fingerprint is calculated from (the names and the put-code are excluded)
+    CONTENT_FIELDS = ("email", "affiliation_type", "organisation", "department", "role", "start_date", "end_date",
+                      "city", "state", "country", "disambiguated_id", "disambiguation_source", "external_id")
+    UNCHANGED_MESSAGE = "Affiliation record unchanged since the last upload."
+
+    org = ForeignKeyField(Organisation, on_delete="CASCADE", related_name="affiliation_fingerprints")
+    content_hash = FixedCharField(max_length=32, help_text="MD5 digest of the normalised record content.")
+    put_code = IntegerField()
+    orcid = OrcidIdField(null=True, index=True)
+    pushed_at = DateTimeField(default=datetime.utcnow, help_text="The time the record was last pushed to ORCID.")
+
+    @classmethod
+    def content_hash_of(cls, data):
+        """Calculate the fingerprint of the normalised record field values (a dict)."""
+        values = []
+        for name in cls.CONTENT_FIELDS:
+            value = data.get(name)
+            if isinstance(value, PartialDate):
+                value = str(value) or None
+            elif isinstance(value, str):
+                value = " ".join(value.split()).lower() or None
+            values.append(value)
+        return md5(json.dumps(values).encode()).hexdigest()
+
+    @classmethod
+    def mark_unchanged(cls, org_id, rows, ttl=None):
+        """Mark the new record rows (dicts of the field values) matching the fresh fingerprints processed.
+
+        The fingerprints are looked up with a single query. A matching row gets the put-code and ORCID iD of
+        the last push unless it has a different put-code or ORCID iD given.
+
+        :param ttl: the fingerprint expiration in days (by default ``AFFILIATION_FINGERPRINT_TTL``, 0 - disabled).
+        :return: the list of the marked rows.
+        """
+        if ttl is None:
+            ttl = app.config.get("AFFILIATION_FINGERPRINT_TTL")
+        if not ttl or not rows:
+            return []
+        hashes = {}
+        for row in rows:
+            hashes.setdefault(cls.content_hash_of(row), []).append(row)
+        fingerprints = cls.select(cls.content_hash, cls.put_code, cls.orcid).where(
+            cls.org_id == org_id, cls.content_hash << list(hashes),
+            cls.pushed_at > datetime.utcnow() - timedelta(days=ttl))
+        now = datetime.utcnow()
+        status = now.isoformat(timespec="seconds") + ": " + cls.UNCHANGED_MESSAGE
+        marked = []
+        for content_hash, put_code, orcid in fingerprints.tuples():
+            for row in hashes[content_hash]:
+                if row.get("put_code") and str(row["put_code"]) != str(put_code):
+                    continue
+                if row.get("orcid") and orcid and row["orcid"] != orcid:
+                    continue
+                row.update(
+                    put_code=put_code,
+                    orcid=row.get("orcid") or orcid,
+                    is_active=False,
+                    processed_at=now,
+                    status=status,
+                    status_code=RecordStatus.UNCHANGED)
+                marked.append(row)
+        return marked
+
+    @classmethod
+    def store(cls, org_id, records, orcid=None):
+        """Store (or replace) the fingerprints of the affiliation records successfully pushed to ORCID.
+
+        :param orcid: the ORCID iD of the user the records were pushed to (if the records miss it).
+        """
+        now = datetime.utcnow()
+        rows = {}
+        for r in records:
+            if r.put_code and r.status_code in (RecordStatus.CREATED, RecordStatus.UPDATED, RecordStatus.UNCHANGED):
+                content_hash = cls.content_hash_of(r._data)
+                rows[content_hash] = dict(
+                    org=org_id, content_hash=content_hash, put_code=r.put_code, orcid=r.orcid or orcid, pushed_at=now)
+        if not rows:
+            return 0
+        try:
+            with cls._meta.database.atomic():
+                cls.delete().where(cls.org_id == org_id, cls.content_hash << list(rows)).execute()
+                cls.insert_many(list(rows.values())).execute()
+        except IntegrityError:  # stored concurrently
+            app.logger.exception("Failed to store the affiliation fingerprints.")
+            return 0
+        return len(rows)
+
+    @classmethod
+    def log_unchanged(cls, task, ids=None):
+        """Log the status event of the task records marked unchanged (by default, all of them).
+
+        :return: the number of the logged events.
+        """
+        if ids is None:
+            ids = [r[0] for r in AffiliationRecord.select(AffiliationRecord.id).where(
+                AffiliationRecord.task_id == task.id,
+                AffiliationRecord.status_code == RecordStatus.UNCHANGED).tuples()]
+        RecordEvent.log(AffiliationRecord, ids, RecordStatus.UNCHANGED, cls.UNCHANGED_MESSAGE)
+        return len(ids)
+
+    @classmethod
+    def invalidate(cls, orcid, updated_at=None):
+        """Invalidate all the fingerprints of the user's records (e.g., the ORCID profile was updated).
+
+        :param updated_at: the time the profile was updated at. The fingerprints pushed less than
+            ``AFFILIATION_FINGERPRINT_WEBHOOK_DELAY`` seconds before it are kept, as the update
+            was most likely caused by the push itself.
+        :return: the number of the invalidated fingerprints.
+        """
+        if not orcid:
+            return 0
+        query = cls.delete().where(cls.orcid == orcid)
+        if updated_at:
+            delay = app.config.get("AFFILIATION_FINGERPRINT_WEBHOOK_DELAY") or 0
+            query = query.where(cls.pushed_at < updated_at - timedelta(seconds=delay))
+        return query.execute()
+
+    class Meta:  # noqa: D101,D106
+        db_table = "affiliation_fingerprint"
+        indexes = ((("org", "content_hash"), True), )
+
+
 class TaskType(IntFlag):
     """Enum used to represent Task type."""
 
@@ -1234,27 +1855,22 @@ class FundingRecord(RecordModel):
     status = TextField(null=True, help_text="Record processing status.")
 
     @classmethod
-    def load_from_json(cls, source, filename=None, org=None):
-        """Load data from json file or a string."""
-        if isinstance(source, str):
-            # import data from file based on its extension; either it is yaml or json
-            funding_data_list = load_yaml_json(filename=filename, source=source)
-
-            for funding_data in funding_data_list:
-                validation_source_data = copy.deepcopy(funding_data)
-                validation_source_data = del_none(validation_source_data)
+    def load_from_json(cls, source, filename=None, org=None, task=None, progress=None):
+        """Load data from JSON or YAML file (a text stream) or a string.
 
-                # Adding schema valdation for funding
-                validator = Core(
-                    source_data=validation_source_data, schema_files=["funding_schema.yaml"])
-                validator.validate(raise_exception=True)
-
-            try:
-                if org is None:
-                    org = current_user.organisation if current_user else None
-                task = Task.create(org=org, filename=filename, task_type=TaskType.FUNDING)
+        :param task: the task to load the records into (e.g., created when the upload was queued).
+        :param progress: the function called with the current counters after each chunk of the items.
+        """
+        database = cls._meta.database
+        try:
+            with database.atomic():
+                if task is None:
+                    if org is None:
+                        org = current_user.organisation if current_user else None
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.FUNDING)
 
-                for funding_data in funding_data_list:
+                loader = RecordLoader(cls, task, "funding_schema.yaml", progress=progress)
+                for funding_data in loader.items(iter_yaml_json(filename, source)):
 
                     title = get_val(funding_data, "title", "title", "value")
                     translated_title = get_val(funding_data, "title", "translated-title", "value")
@@ -1275,8 +1891,7 @@ class FundingRecord(RecordModel):
                     disambiguation_source = get_val(funding_data, "organization", "disambiguated-organization",
                                                     "disambiguation-source")
 
-                    funding_record = FundingRecord.create(
-                        task=task,
+                    funding_record = loader.add(
                         title=title,
                         translated_title=translated_title,
                         translated_title_language_code=translated_title_language_code,
@@ -1305,8 +1920,8 @@ class FundingRecord(RecordModel):
                             put_code = invitee.get("put-code")
                             visibility = invitee.get("visibility")
 
-                            FundingInvitees.create(
-                                funding_record=funding_record,
+                            loader.add_related(
+                                FundingInvitees, funding_record,
                                 identifier=identifier,
                                 email=email.lower(),
                                 first_name=first_name,
@@ -1327,8 +1942,8 @@ class FundingRecord(RecordModel):
                             email = get_val(contributor, "contributor-email", "value")
                             role = get_val(contributor, "contributor-attributes", "contributor-role")
 
-                            FundingContributor.create(
-                                funding_record=funding_record,
+                            loader.add_related(
+                                FundingContributor, funding_record,
                                 orcid=orcid_id,
                                 name=name,
                                 email=email,
@@ -1342,20 +1957,22 @@ class FundingRecord(RecordModel):
                             value = external_id.get("external-id-value")
                             url = get_val(external_id, "external-id-url", "value")
                             relationship = external_id.get("external-id-relationship")
-                            ExternalId.create(
-                                funding_record=funding_record,
+                            loader.add_related(
+                                ExternalId, funding_record,
                                 type=type,
                                 value=value,
                                 url=url,
                                 relationship=relationship)
                     else:
                         raise SchemaError(u"Schema validation failed:\n - An external identifier is required")
+                task.total_count = loader.count
+                task.parsed_count = loader.parsed_count
+                task.save()
                 return task
 
-            except Exception:
-                db.rollback()
-                app.logger.exception("Failed to load funding file.")
-                raise
+        except Exception:
+            app.logger.exception("Failed to load funding file.")
+            raise
 
     class Meta:  # noqa: D101,D106
         db_table = "funding_record"
@@ -1394,25 +2011,22 @@ class PeerReviewRecord(RecordModel):
     status = TextField(null=True, help_text="Record processing status.")
 
     @classmethod
-    def load_from_json(cls, source, filename=None, org=None):
-        """Load data from JSON file or a string."""
-        if isinstance(source, str):
-            # import data from file based on its extension; either it is yaml or json
-            peer_review_data_list = load_yaml_json(filename=filename, source=source)
+    def load_from_json(cls, source, filename=None, org=None, task=None, progress=None):
+        """Load data from JSON or YAML file (a text stream) or a string.
 
-            for peer_review_data in peer_review_data_list:
-                validation_source_data = copy.deepcopy(peer_review_data)
-                validation_source_data = del_none(validation_source_data)
-
-                validator = Core(source_data=validation_source_data, schema_files=["peer_review_schema.yaml"])
-                validator.validate(raise_exception=True)
-
-            try:
-                if org is None:
-                    org = current_user.organisation if current_user else None
-                task = Task.create(org=org, filename=filename, task_type=TaskType.PEER_REVIEW)
+        :param task: the task to load the records into (e.g., created when the upload was queued).
+        :param progress: the function called with the current counters after each chunk of the items.
+        """
+        database = cls._meta.database
+        try:
+            with database.atomic():
+                if task is None:
+                    if org is None:
+                        org = current_user.organisation if current_user else None
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.PEER_REVIEW)
 
-                for peer_review_data in peer_review_data_list:
+                loader = RecordLoader(cls, task, "peer_review_schema.yaml", progress=progress)
+                for peer_review_data in loader.items(iter_yaml_json(filename, source)):
 
                     review_group_id = peer_review_data.get("review-group-id") if peer_review_data.get(
                         "review-group-id") else None
@@ -1500,8 +2114,7 @@ class PeerReviewRecord(RecordModel):
                         "convening-organization") and peer_review_data.get("convening-organization").get(
                         "disambiguated-organization") else None
 
-                    peer_review_record = PeerReviewRecord.create(
-                        task=task,
+                    peer_review_record = loader.add(
                         review_group_id=review_group_id,
                         reviewer_role=reviewer_role,
                         review_url=review_url,
@@ -1537,8 +2150,8 @@ class PeerReviewRecord(RecordModel):
                             put_code = invitee.get("put-code") if invitee.get("put-code") else None
                             visibility = get_val(invitee, "visibility")
 
-                            PeerReviewInvitee.create(
-                                peer_review_record=peer_review_record,
+                            loader.add_related(
+                                PeerReviewInvitee, peer_review_record,
                                 identifier=identifier,
                                 email=email.lower(),
                                 first_name=first_name,
@@ -1559,8 +2172,8 @@ class PeerReviewRecord(RecordModel):
                             url = external_id.get("external-id-url").get("value") if \
                                 external_id.get("external-id-url") else None
                             relationship = external_id.get("external-id-relationship")
-                            PeerReviewExternalId.create(
-                                peer_review_record=peer_review_record,
+                            loader.add_related(
+                                PeerReviewExternalId, peer_review_record,
                                 type=type,
                                 value=value,
                                 url=url,
@@ -1568,11 +2181,13 @@ class PeerReviewRecord(RecordModel):
                     else:
                         raise SchemaError(u"Schema validation failed:\n - An external identifier is required")
 
+                task.total_count = loader.count
+                task.parsed_count = loader.parsed_count
+                task.save()
                 return task
-            except Exception:
-                db.rollback()
-                app.logger.exception("Failed to load peer review file.")
-                raise
+        except Exception:
+            app.logger.exception("Failed to load peer review file.")
+            raise
 
     class Meta:  # noqa: D101,D106
         db_table = "peer_review_record"
@@ -1604,28 +2219,22 @@ class WorkRecord(RecordModel):
     status = TextField(null=True, help_text="Record processing status.")
 
     @classmethod
-    def load_from_json(cls, source, filename=None, org=None):
-        """Load data from JSON file or a string."""
-        if isinstance(source, str):
-            # import data from file based on its extension; either it is yaml or json
-            work_data_list = load_yaml_json(filename=filename, source=source)
-
-            # TODO: validation of uploaded work file
-            for work_data in work_data_list:
-                validation_source_data = copy.deepcopy(work_data)
-                validation_source_data = del_none(validation_source_data)
+    def load_from_json(cls, source, filename=None, org=None, task=None, progress=None):
+        """Load data from JSON or YAML file (a text stream) or a string.
 
-                # Adding schema valdation for Work
-                validator = Core(
-                    source_data=validation_source_data, schema_files=["work_schema.yaml"])
-                validator.validate(raise_exception=True)
-
-            try:
-                if org is None:
-                    org = current_user.organisation if current_user else None
-                task = Task.create(org=org, filename=filename, task_type=TaskType.WORK)
+        :param task: the task to load the records into (e.g., created when the upload was queued).
+        :param progress: the function called with the current counters after each chunk of the items.
+        """
+        database = cls._meta.database
+        try:
+            with database.atomic():
+                if task is None:
+                    if org is None:
+                        org = current_user.organisation if current_user else None
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.WORK)
 
-                for work_data in work_data_list:
+                loader = RecordLoader(cls, task, "work_schema.yaml", progress=progress)
+                for work_data in loader.items(iter_yaml_json(filename, source)):
 
                     title = get_val(work_data, "title", "title", "value")
                     sub_title = get_val(work_data, "title", "subtitle", "value")
@@ -1646,8 +2255,7 @@ class WorkRecord(RecordModel):
                         {date_key: work_data.get("publication-date")[date_key] for date_key in
                          ('day', 'month', 'year')}) if work_data.get("publication-date") else None
 
-                    work_record = WorkRecord.create(
-                        task=task,
+                    work_record = loader.add(
                         title=title,
                         sub_title=sub_title,
                         translated_title=translated_title,
@@ -1675,8 +2283,8 @@ class WorkRecord(RecordModel):
                             put_code = invitee.get("put-code")
                             visibility = get_val(invitee, "visibility")
 
-                            WorkInvitees.create(
-                                work_record=work_record,
+                            loader.add_related(
+                                WorkInvitees, work_record,
                                 identifier=identifier,
                                 email=email.lower(),
                                 first_name=first_name,
@@ -1700,8 +2308,8 @@ class WorkRecord(RecordModel):
                             contributor_sequence = get_val(contributor, "contributor-attributes",
                                                            "contributor-sequence")
 
-                            WorkContributor.create(
-                                work_record=work_record,
+                            loader.add_related(
+                                WorkContributor, work_record,
                                 orcid=orcid_id,
                                 name=name,
                                 email=email,
@@ -1716,8 +2324,8 @@ class WorkRecord(RecordModel):
                             value = external_id.get("external-id-value")
                             url = get_val(external_id, "external-id-url", "value")
                             relationship = external_id.get("external-id-relationship")
-                            WorkExternalId.create(
-                                work_record=work_record,
+                            loader.add_related(
+                                WorkExternalId, work_record,
                                 type=type,
                                 value=value,
                                 url=url,
@@ -1725,11 +2333,13 @@ class WorkRecord(RecordModel):
                     else:
                         raise SchemaError(u"Schema validation failed:\n - An external identifier is required")
 
+                task.total_count = loader.count
+                task.parsed_count = loader.parsed_count
+                task.save()
                 return task
-            except Exception:
-                db.rollback()
-                app.logger.exception("Failed to load work record file.")
-                raise
+        except Exception:
+            app.logger.exception("Failed to load work record file.")
+            raise
 
     class Meta:  # noqa: D101,D106
         db_table = "work_record"
@@ -1768,7 +2378,7 @@ class FundingContributor(ContributorModel):
         table_alias = "fc"
 
 
-class InviteesModel(BaseModel):
+class InviteesModel(BaseModel, StatusMixin):
     """Common model bits of the invitees records."""
 
     identifier = CharField(max_length=120, null=True)
@@ -1780,11 +2390,8 @@ class InviteesModel(BaseModel):
     visibility = CharField(null=True, max_length=100)
     status = TextField(null=True, help_text="Record processing status.")
     processed_at = DateTimeField(null=True)
-
-    def add_status_line(self, line):
-        """Add a text line to the status for logging processing progress."""
-        ts = datetime.utcnow().isoformat(timespec="seconds")
-        self.status = (self.status + "\n" if self.status else '') + ts + ": " + line
+    lease_token = CharField(null=True, max_length=32, help_text="The batch worker claim token.")
+    leased_until = DateTimeField(null=True, help_text="The batch worker claim expiration time.")
 
 
 class PeerReviewInvitee(InviteesModel):
@@ -2066,6 +2673,7 @@ def create_tables():
             OrcidAuthorizeCall,
             Task,
             AffiliationRecord,
+            AffiliationFingerprint,
             GroupIdRecord,
             OrgInvitation,
             Url,
@@ -2084,6 +2692,8 @@ def create_tables():
             Client,
             Grant,
             Token,
+            RecordEvent,
+            ProfileCache,
     ]:
 
         try:
@@ -2094,6 +2704,43 @@ def create_tables():
             else:
                 raise ex
 
+    backfill_status_codes()
+    backfill_task_counts()
+
+
+def backfill_status_codes():
+    """Set the status codes of the records processed before the codes were introduced.
+
+    The code is derived from the last line of the free-text status.
+    """
+    keywords = (("error", RecordStatus.ERROR), ("exception", RecordStatus.ERROR), ("failed", RecordStatus.ERROR),
+                ("reset", RecordStatus.RESET), ("sent", RecordStatus.SENT),
+                ("unchanged", RecordStatus.UNCHANGED), ("created", RecordStatus.CREATED),
+                ("updated", RecordStatus.UPDATED), ("processed", RecordStatus.PROCESSED))
+    for model in (AffiliationRecord, FundingRecord, WorkRecord, PeerReviewRecord, FundingInvitees,
+                  WorkInvitees, PeerReviewInvitee):
+        ids = {}
+        for record_id, status in model.select(model.id, model.status).where(
+                model.status_code.is_null(), model.status.is_null(False)).tuples():
+            line = status.strip().split("\n")[-1].lower()
+            status_code = next((c for k, c in keywords if k in line), RecordStatus.NEW)
+            ids.setdefault(status_code, []).append(record_id)
+        for status_code, record_ids in ids.items():
+            for chunk in chunked(record_ids, 500):
+                model.update(status_code=status_code).where(model.id << chunk).execute()
+
+
+def backfill_task_counts():
+    """Set the progress counters of the tasks uploaded before the counters were introduced.
+
+    The counters of the loaded tasks that have records but no record count get recalculated
+    from the records (see :py:meth:`Task.reconcile_counts`).
+    """
+    for model in (AffiliationRecord, FundingRecord, WorkRecord, PeerReviewRecord):
+        for task in Task.select().where(Task.total_count == 0, Task.load_status == LoadStatus.LOADED,
+                                        Task.id << model.select(model.task_id).distinct()):
+            task.reconcile_counts()
+
 
 def create_audit_tables():
     """Create all DB audit tables for PostgreSQL DB."""
@@ -2114,7 +2761,8 @@ def create_audit_tables():
 def drop_tables():
     """Drop all model tables."""
     for m in (Organisation, User, UserOrg, OrcidToken, UserOrgAffiliation, OrgInfo, OrgInvitation,
-              OrcidApiCall, OrcidAuthorizeCall, Task, AffiliationRecord, Url, UserInvitation):
+              OrcidApiCall, OrcidAuthorizeCall, Task, AffiliationRecord, AffiliationFingerprint, Url, UserInvitation,
+              RecordEvent, ProfileCache):
         if m.table_exists():
             try:
                 m.drop_table(fail_silently=True, cascade=m._meta.database.drop_cascade)
@@ -2122,19 +2770,259 @@ def drop_tables():
                 pass
 
 
-def load_yaml_json(filename, source):
-    """Create a common way of loading json or yaml file."""
-    if os.path.splitext(filename)[1][1:] == "yaml" or os.path.splitext(
-            filename)[1][1:] == "yml":
-        data_list = yaml.load(source)
-    else:
-        data_list = json.loads(source)
+def iter_json_items(stream, read_size=1 << 16):
+    """Parse incrementally the JSON list of the items read from the text stream yielding one item at a time.
+
+    Only the text of the item being parsed is kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, expected = '', 0, '['
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buffer):
+            buffer, pos = stream.read(read_size), 0
+            if not buffer:
+                if expected == '[':
+                    raise SchemaError(u"Schema validation failed:\n - Expecting a list of Records")
+                raise ValueError("Unexpected end of the JSON data: the list is not closed")
+            continue
+        char = buffer[pos]
+        if expected == '[':
+            if char != '[':
+                raise SchemaError(u"Schema validation failed:\n - Expecting a list of Records")
+            pos += 1
+            expected = "item or ]"
+        elif char == ']' and expected != "item":
+            return
+        elif expected == ", or ]":
+            if char != ',':
+                raise ValueError(f"Expecting ',' delimiter or ']' at {char!r}")
+            pos += 1
+            expected = "item"
+        else:
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer):
+                        break
+                    more = stream.read(read_size)  # the item might continue (e.g., a number)
+                except ValueError:
+                    more = stream.read(read_size)
+                    if not more:
+                        raise
+                if not more:
+                    break
+                buffer, pos = buffer[pos:] + more, 0
+            buffer, pos = buffer[end:], 0
+            expected = ", or ]"
+            yield item
+
+
+def iter_yaml_items(stream):
+    """Parse incrementally the YAML list (sequence) of the items yielding one item at a time."""
+    loader = yaml.SafeLoader(stream)
+    try:
+        loader.get_event()  # the stream start
+        if loader.check_event(yaml.DocumentStartEvent):
+            loader.get_event()
+        if not loader.check_event(yaml.SequenceStartEvent):
+            raise SchemaError(u"Schema validation failed:\n - Expecting a list of Records")
+        loader.get_event()
+        while not loader.check_event(yaml.SequenceEndEvent):
+            yield loader.construct_document(loader.compose_node(None, None))
+    finally:
+        loader.dispose()
+
+
+def iter_yaml_json(filename, source):
+    """Parse incrementally the JSON or YAML (based on the file extension) list of the items.
+
+    :param source: the text of the file or a text stream (file object).
+    """
+    if isinstance(source, str):
+        source = StringIO(source)
+    if os.path.splitext(filename or '')[1][1:] in ("yaml", "yml"):
+        return iter_yaml_items(source)
+    return iter_json_items(source)
+
+
+class RecordLoader:
+    """Streaming loader of the task records with the related rows (the invitees, the contributors, etc.).
+
+    The items get validated and inserted in chunks of ``LOAD_CHUNK_SIZE`` items (the records with
+    a statement per chunk with PostgreSQL and the related rows with :py:class:`BulkInserter`),
+    so only a single chunk of the items is kept in memory. It should be used within a transaction.
+
+    Usage::
+
+        loader = RecordLoader(WorkRecord, task, "work_schema.yaml")
+        for item in loader.items(iter_yaml_json(filename, source)):
+            record = loader.add(title=get_val(item, "title", "title", "value"), ...)
+            loader.add_related(WorkInvitees, record, email=..., ...)
+        task.total_count = loader.count
+    """
+
+    def __init__(self, model, task, schema_file, chunk_size=None, progress=None):
+        """Set up the loader of the records of the model for the task.
 
-    # Removing None for correct schema validation
-    if not isinstance(data_list, list):
-        raise SchemaError(
-            u"Schema validation failed:\n - Expecting a list of Records")
-    return data_list
+        :param progress: the function called with the current counters after each chunk of the items.
+        """
+        self.model = model
+        self.task = task
+        self.schema_file = schema_file
+        self.chunk_size = max(1, chunk_size or app.config.get("LOAD_CHUNK_SIZE") or 500)
+        self.progress = progress
+        self.count = 0
+        self.parsed_count = 0
+        self.rejected_count = 0
+        self.records = []
+        self.related = []
+        self.inserters = {}
+
+    def items(self, items):
+        """Iterate over the items validating them and inserting the added records after each chunk.
+
+        The chunks get validated by a process pool if ``LOAD_VALIDATION_WORKERS`` is more than one
+        (see :py:func:`validate_in_chunks`).
+        """
+        chunks = ((n * self.chunk_size, chunk) for n, chunk in enumerate(chunked_iter(items, self.chunk_size)))
+        for (_, chunk), error in validate_in_chunks(partial(validate_record_items, self.schema_file), chunks):
+            yield from self._process(chunk, error)
+
+    def _process(self, chunk, error=None):
+        """Yield the validated chunk of the items and insert the records added while they were processed.
+
+        :param error: the validation error message of the chunk.
+        """
+        self.parsed_count += len(chunk)
+        if error:
+            self.rejected_count += len(set(re.findall(r"[Pp]ath: '/(\d+)", error))) or len(chunk)
+            self.report()
+            raise SchemaError(error)
+        yield from chunk
+        self.flush()
+        self.report()
+
+    def report(self):
+        """Report the current counters to the progress function."""
+        if self.progress:
+            self.progress(
+                parsed_count=self.parsed_count, total_count=self.count, rejected_count=self.rejected_count)
+
+    def add(self, **fields):
+        """Add a record of the task and return its reference for the related rows."""
+        self.records.append(fields)
+        return len(self.records) - 1
+
+    def add_related(self, model, record, **fields):
+        """Add a related row of the record (returned by :py:meth:`add`)."""
+        self.related.append((model, record, fields))
+
+    def foreign_key(self, model):
+        """Get the name of the foreign key field of the related model referencing the records."""
+        for field in model._meta.sorted_fields:
+            if isinstance(field, ForeignKeyField) and field.rel_model is self.model:
+                return field.name
+
+    def flush(self):
+        """Insert the added records and their related rows."""
+        if not self.records:
+            return
+        rows = [self.model(task=self.task, **fields)._data for fields in self.records]
+        if isinstance(self.model._meta.database, PostgresqlDatabase):
+            ids = self.model.insert_many(rows).return_id_list().execute()
+        else:
+            ids = [self.model.insert(**row).execute() for row in rows]
+        for model, record, fields in self.related:
+            if model not in self.inserters:
+                self.inserters[model] = BulkInserter(model)
+            fields[self.foreign_key(model)] = ids[record]
+            self.inserters[model].add(model(**fields)._data)
+        for inserter in self.inserters.values():
+            inserter.flush()
+        self.count += len(self.records)
+        self.records, self.related = [], []
+
+
+def without_none(value):
+    """Get the value without the dictionary entries with the value ``None`` (recursively).
+
+    Unlike :py:func:`del_none` the value is not modified and only the dictionaries and lists
+    containing such entries get copied.
+    """
+    if isinstance(value, dict):
+        items = [(k, without_none(v)) for k, v in value.items() if v is not None]
+        if len(items) == len(value) and all(v is value[k] for k, v in items):
+            return value
+        return dict(items)
+    if isinstance(value, list):
+        items = [without_none(v) for v in value]
+        if all(v is item for v, item in zip(value, items)):
+            return value
+        return items
+    return value
+
+
+class SchemaValidator(Core):
+    """Schema validator of the lists of the uploaded items with the schema loaded and compiled only once.
+
+    The items get validated in a single pass as a sequence of the items described by the schema
+    and the entries with the value ``None`` are ignored (see :py:func:`without_none`).
+    """
+
+    def __init__(self, schema_file):
+        """Load the schema file (relative to the project directory) and compile the validation rules."""
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), schema_file)
+        with open(path if os.path.exists(path) else schema_file) as f:
+            schema = yaml.safe_load(f)
+        schema = {"type": "seq", "sequence": [schema]}
+        super().__init__(source_data=[], schema_data=schema)
+        self.root_rule = Rule(schema=schema)
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def _start_validate(self, value=None):
+        """Validate the value with the compiled rules."""
+        self.errors = []
+        self._validate(value, self.root_rule, "", [])
+        if self.offset:  # report the positions of the items in the whole list
+            for error in self.errors:
+                if isinstance(getattr(error, "path", None), str):
+                    error.path = re.sub(r"^/(\d+)", lambda m: f"/{int(m.group(1)) + self.offset}", error.path)
+
+    def validate_items(self, items, raise_exception=True, offset=0):
+        """Validate the list of the items raising :py:class:`~pykwalify.errors.SchemaError` if any is invalid.
+
+        :param offset: the position of the first item if it is a chunk of a longer list.
+        """
+        with self._lock:
+            self.offset = offset
+            self.source = without_none(items)
+            try:
+                return self.validate(raise_exception=raise_exception)
+            finally:
+                self.source = None
+
+
+@lru_cache()
+def schema_validator(schema_file):
+    """Get the (cached) validator of the schema file."""
+    return SchemaValidator(schema_file)
+
+
+def validate_record_items(schema_file, chunk):
+    """Validate the chunk of the uploaded items (run by a process pool worker in parallel mode).
+
+    :param chunk: the pair of the position of the first item in the whole list and the list of the items.
+    :return: the chunk and the validation error message (``None`` if all the items are valid).
+    """
+    offset, items = chunk
+    try:
+        schema_validator(schema_file).validate_items(items, offset=offset)
+    except SchemaError as ex:
+        return chunk, ex.msg
+    return chunk, None
 
 
 def del_none(d):
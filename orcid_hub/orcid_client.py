@@ -7,83 +7,666 @@ isort:skip_file
 
 from .config import ORCID_API_BASE, SCOPE_READ_LIMITED, SCOPE_ACTIVITIES_UPDATE, ORCID_BASE_URL
 from flask_login import current_user
-from .models import (OrcidApiCall, Affiliation, OrcidToken, FundingContributor as FundingCont,
+from .models import (OrcidApiCall, Affiliation, OrcidToken, ProfileCache, FundingContributor as FundingCont,
                      ExternalId as ExternalIdModel, WorkContributor as WorkCont, WorkExternalId, PeerReviewExternalId)
+# NB! only the used API and model classes get imported (the package is loaded lazily)
 from orcid_api import (configuration, rest, api_client, MemberAPIV20Api, SourceClientId, Source,
                        OrganizationAddress, DisambiguatedOrganization, Employment, Education,
                        Organization)
+from orcid_api.models import (Amount, Citation, Contributor, ContributorAttributes, ContributorEmail,
+                              ContributorOrcid, Country, CreditName, ExternalID, ExternalIDs, Funding,
+                              FundingContributor, FundingContributorAttributes, FundingContributors, FundingTitle,
+                              GroupIdRecord, PeerReview, Subtitle, Title, TranslatedTitle, Url, Work,
+                              WorkContributors, WorkTitle)
 from orcid_api.rest import ApiException
-from time import time
+from collections import deque
+from datetime import datetime
+from http.cookiejar import DefaultCookiePolicy
+from random import random
+from time import sleep, time
 from urllib.parse import urlparse
 from . import app
+from .queuing import RateLimitExceeded, rate_limiter, retry_after
+import atexit
+import base64
+import certifi
 import json
+import os
+import requests
+import ssl
+import threading
+import urllib3
+import zlib
 
 url = urlparse(ORCID_API_BASE)
 configuration.host = url.scheme + "://" + url.hostname
 
 
+def pack_text(value, max_size=0, compress=False):
+    """Limit the size of a logged request or response body.
+
+    The text longer than *max_size* characters gets truncated, or if *compress* is set,
+    gets compressed and stored base64 encoded with the prefix "zlib:" (see :py:func:`unpack_text`).
+
+    >>> pack_text("ABCDEF", 3)
+    'ABC... [3 more characters truncated]'
+    >>> unpack_text(pack_text("ABCDEF" * 100, 10, compress=True)) == "ABCDEF" * 100
+    True
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    elif not isinstance(value, str):
+        value = str(value)
+    if not max_size or len(value) <= max_size:
+        return value
+    if compress:
+        return "zlib:" + base64.b64encode(zlib.compress(value.encode())).decode()
+    return value[:max_size] + f"... [{len(value) - max_size} more characters truncated]"
+
+
+def unpack_text(value):
+    """Restore the logged body compressed by :py:func:`pack_text`."""
+    if value and value.startswith("zlib:"):
+        return zlib.decompress(base64.b64decode(value[5:])).decode()
+    return value
+
+
+class ApiCallLog:
+    """Buffered ORCID API call log.
+
+    The call log entries get buffered in memory and written with a single bulk insert
+    by a background thread once the buffer has ``ORCID_API_CALL_LOG_BUFFER_SIZE`` entries
+    or every ``ORCID_API_CALL_LOG_FLUSH_INTERVAL`` seconds, so the API calls don't wait for the DB.
+    If the buffer size is 1, the entries get written right away in the calling thread.
+    The successful calls can be sampled (``ORCID_API_CALL_LOG_SAMPLE_RATE``) and the large bodies
+    truncated or compressed (``ORCID_API_CALL_LOG_MAX_BODY_SIZE``, ``ORCID_API_CALL_LOG_COMPRESS``).
+    If the DB cannot keep up, the oldest entries get dropped (:py:attr:`dropped_count`).
+    The entries that fail to get written are logged and counted (:py:attr:`failed_count`),
+    so a broken call log doesn't break the API calls.
+    """
+
+    def __init__(self):
+        """Set up an empty log buffer."""
+        self.dropped_count = 0
+        self.failed_count = 0
+        self._reset()
+
+    def _reset(self):
+        """Reset the buffer and the flushing thread (also in a forked process)."""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def buffer_size(self):
+        """Get the number of the entries written with a single insert."""
+        return max(1, app.config.get("ORCID_API_CALL_LOG_BUFFER_SIZE") or 1)
+
+    def log(self, status=None, **entry):
+        """Add a call log entry (see :py:class:`~orcid_hub.models.OrcidApiCall`) to the buffer.
+
+        :param status: the response HTTP status code (used for sampling).
+        :return: ``True`` if the entry gets logged and ``False`` if it got sampled out.
+        """
+        sample_rate = app.config.get("ORCID_API_CALL_LOG_SAMPLE_RATE", 1.0)
+        if sample_rate < 1.0 and isinstance(status, int) and status < 400 and random() >= sample_rate:
+            return False
+        max_size = app.config.get("ORCID_API_CALL_LOG_MAX_BODY_SIZE")
+        compress = app.config.get("ORCID_API_CALL_LOG_COMPRESS")
+        for name in ("body", "response"):
+            entry[name] = pack_text(entry.get(name), max_size, compress)
+
+        buffer_size = self.buffer_size
+        if buffer_size == 1:
+            self.write([entry])
+            return True
+
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            while len(self._buffer) >= buffer_size * 10:
+                self._buffer.popleft()
+                self.dropped_count += 1
+            self._buffer.append(entry)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="api-call-log", daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= buffer_size:
+                self._wakeup.set()
+        return True
+
+    def write(self, entries):
+        """Insert the log entries into the DB."""
+        try:
+            with OrcidApiCall._meta.database.atomic():
+                for idx in range(0, len(entries), self.buffer_size):
+                    OrcidApiCall.insert_many(entries[idx:idx + self.buffer_size]).execute()
+        except Exception:
+            self.failed_count += len(entries)
+            app.logger.exception(f"Failed to write {len(entries)} API call log entries.")
+
+    def flush(self):
+        """Write all the buffered entries and return their number."""
+        with self._lock:
+            entries = list(self._buffer)
+            self._buffer.clear()
+        if entries:
+            self.write(entries)
+        return len(entries)
+
+    def _run(self):
+        """Flush the buffer periodically or when it gets full."""
+        while True:
+            self._wakeup.wait(app.config.get("ORCID_API_CALL_LOG_FLUSH_INTERVAL") or 5)
+            self._wakeup.clear()
+            self.flush()
+
+
+api_call_log = ApiCallLog()
+atexit.register(api_call_log.flush)
+
+
+class CircuitBreakerOpen(ApiException):
+    """The API host is considered unavailable after a series of failed calls."""
+
+    def __init__(self, host):
+        """Create the exception for the host."""
+        super().__init__(status=503, reason=f"The API host {host} is unavailable (the circuit breaker is open).")
+        self.host = host
+
+
+class CircuitBreaker:
+    """Per host circuit breaker of the API calls.
+
+    After ``ORCID_API_BREAKER_THRESHOLD`` consecutive failed calls (5xx responses, timeouts or connection
+    errors) to a host the breaker opens and the calls fail right away with :py:class:`CircuitBreakerOpen`.
+    After ``ORCID_API_BREAKER_RESET_TIMEOUT`` seconds a single trial call is let through. If it succeeds,
+    the breaker closes, otherwise it stays open for another period.
+    """
+
+    def __init__(self):
+        """Set up the breaker with all the hosts available."""
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    @property
+    def threshold(self):
+        """Get the number of the consecutive failures that open the breaker."""
+        return app.config.get("ORCID_API_BREAKER_THRESHOLD") or 5
+
+    @property
+    def reset_timeout(self):
+        """Get the time in seconds the breaker stays open."""
+        return app.config.get("ORCID_API_BREAKER_RESET_TIMEOUT") or 60
+
+    def is_open(self, host=None):
+        """Test if the calls to the host (by default the ORCID API host) get rejected."""
+        opened_at = self._opened_at.get(host or url.netloc)
+        return opened_at is not None and time() - opened_at < self.reset_timeout
+
+    def allow(self, host):
+        """Test if a call to the host can be made (the trial call is let through a half-open breaker)."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time() - opened_at < self.reset_timeout:
+                return False
+            # half-open: let a single trial call through and keep rejecting the others:
+            self._opened_at[host] = time()
+            return True
+
+    def success(self, host):
+        """Record a successful call closing the breaker."""
+        if self._failures.get(host) or host in self._opened_at:
+            with self._lock:
+                if host in self._opened_at:
+                    app.logger.info(f"The API host {host} is available again, closing the circuit breaker.")
+                self._failures.pop(host, None)
+                self._opened_at.pop(host, None)
+
+    def failure(self, host):
+        """Record a failed call opening the breaker if the failure threshold is reached."""
+        with self._lock:
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            if failures >= self.threshold:
+                if host not in self._opened_at:
+                    app.logger.warning(
+                        f"The API host {host} failed {failures} times in a row, opening the circuit breaker.")
+                self._opened_at[host] = time()
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def is_connect_error(ex):
+    """Test if the request failed before it reached the server (so it is safe to repeat any request)."""
+    if isinstance(ex, urllib3.exceptions.MaxRetryError):
+        ex = ex.reason
+    return isinstance(ex, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+class PoolStats:
+    """Counters of the process-wide HTTP connection pool.
+
+    * ``checkouts`` - the number of the connections taken from the pool (one per request);
+    * ``handshakes`` - the number of the established connections (TCP and TLS handshakes);
+    * ``reused`` - the number of the requests sent over an already established connection;
+    * ``pool_waits`` - the number of the requests that waited for a free connection (``ORCID_HTTP_POOL_BLOCK``);
+    * ``pool_wait_time`` - the total time in seconds spent waiting for a free connection;
+    * ``overflows`` - the number of the extra connections opened with the pool exhausted (discarded after use).
+    """
+
+    FIELDS = ("checkouts", "handshakes", "pool_waits", "pool_wait_time", "overflows")
+
+    def __init__(self):
+        """Set up the counters."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all the counters."""
+        with self._lock:
+            for name in self.FIELDS:
+                setattr(self, name, 0)
+
+    def add(self, **counts):
+        """Increment the counters."""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def reused(self):
+        """Get the number of the requests sent over an already established connection."""
+        return max(0, self.checkouts - self.handshakes)
+
+    def as_dict(self):
+        """Get the counters as a dictionary."""
+        return dict((name, getattr(self, name)) for name in self.FIELDS + ("reused", ))
+
+
+class _CountingConnectionMixin:
+    """Connection counting the handshakes."""
+
+    def connect(self):
+        """Establish the connection and count the handshake."""
+        http_pool.stats.add(handshakes=1)
+        return super().connect()
+
+
+class CountingHTTPConnection(_CountingConnectionMixin, urllib3.connection.HTTPConnection):
+    """HTTP connection counting the handshakes."""
+
+
+class CountingHTTPSConnection(_CountingConnectionMixin, urllib3.connection.HTTPSConnection):
+    """HTTPS connection counting the handshakes."""
+
+
+class _CountingPoolMixin:
+    """Connection pool counting the connection checkouts and the waits for a free connection."""
+
+    def _get_conn(self, timeout=None):
+        """Take a connection from the pool waiting at most ``ORCID_HTTP_POOL_TIMEOUT`` for a free one."""
+        exhausted = self.pool is not None and self.pool.empty()
+        if timeout is None:
+            timeout = app.config.get("ORCID_HTTP_POOL_TIMEOUT") or None
+        started_at = time()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            if exhausted and self.block:
+                http_pool.stats.add(checkouts=1, pool_waits=1, pool_wait_time=time() - started_at)
+            else:
+                http_pool.stats.add(checkouts=1, overflows=int(exhausted))
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, urllib3.HTTPConnectionPool):
+    """HTTP connection pool with the usage counters."""
+
+    ConnectionCls = CountingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, urllib3.HTTPSConnectionPool):
+    """HTTPS connection pool with the usage counters."""
+
+    ConnectionCls = CountingHTTPSConnection
+
+
+POOL_CLASSES = {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter using the counting connection pools and the default timeouts."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the pool manager with the counting connection pools."""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def send(self, request, timeout=None, **kwargs):
+        """Send the request with the default timeouts (if no timeout is given)."""
+        return super().send(request, timeout=timeout or http_pool.timeout, **kwargs)
+
+
+class HttpPool:
+    """Process-wide pooled HTTP layer for all the outbound ORCID API and webhook traffic.
+
+    The swagger generated API clients share :py:attr:`pool_manager` and the other calls (the tokens,
+    the webhooks, the API proxy) are made with :py:attr:`session` (or with the shortcuts, e.g.,
+    ``http_pool.post(...)``), so the connections get reused instead of being set up for every
+    API client or call. Each host gets a pool of up to ``ORCID_HTTP_POOL_MAXSIZE`` connections
+    (``ORCID_HTTP_POOL_CONNECTIONS`` hosts are kept). If ``ORCID_HTTP_POOL_BLOCK`` is set, the requests
+    wait for a free connection (at most ``ORCID_HTTP_POOL_TIMEOUT`` seconds), otherwise an extra connection
+    gets opened. The connections are not shared with the forked processes (e.g., the RQ jobs).
+    The usage counters are in :py:attr:`stats`.
+    """
+
+    def __init__(self):
+        """Set up the pool (the connections get established on demand)."""
+        self.stats = PoolStats()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Discard the pool (also the pool inherited by a forked process)."""
+        self._pid = os.getpid()
+        self._pool_manager = None
+        self._session = None
+
+    @property
+    def num_pools(self):
+        """Get the number of the hosts to keep the connection pools for."""
+        return app.config.get("ORCID_HTTP_POOL_CONNECTIONS") or 10
+
+    @property
+    def maxsize(self):
+        """Get the number of the connections to keep per host."""
+        return app.config.get("ORCID_HTTP_POOL_MAXSIZE") or 10
+
+    @property
+    def block(self):
+        """Test if the requests wait for a free connection when all connections to the host are in use."""
+        return bool(app.config.get("ORCID_HTTP_POOL_BLOCK"))
+
+    @property
+    def timeout(self):
+        """Get the default connection and read timeouts."""
+        timeout = (app.config.get("ORCID_API_CONNECT_TIMEOUT"), app.config.get("ORCID_API_READ_TIMEOUT"))
+        return timeout if all(timeout) else None
+
+    @property
+    def pool_manager(self):
+        """Get the connection pool manager of the swagger generated API clients."""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._pool_manager is None:
+            with self._lock:
+                if self._pool_manager is None:
+                    config = configuration
+                    pool_manager = urllib3.PoolManager(
+                        num_pools=self.num_pools,
+                        maxsize=self.maxsize,
+                        block=self.block,
+                        cert_reqs=ssl.CERT_REQUIRED if config.verify_ssl else ssl.CERT_NONE,
+                        ca_certs=config.ssl_ca_cert or certifi.where(),
+                        cert_file=config.cert_file,
+                        key_file=config.key_file)
+                    pool_manager.pool_classes_by_scheme = POOL_CLASSES
+                    self._pool_manager = pool_manager
+        return self._pool_manager
+
+    @property
+    def session(self):
+        """Get the shared HTTP session (the cookies don't get stored)."""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                    adapter = PooledHTTPAdapter(
+                        pool_connections=self.num_pools, pool_maxsize=self.maxsize, pool_block=self.block)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        """Send a request (see :py:meth:`requests.Session.request`)."""
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """Send a PUT request."""
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """Send a DELETE request."""
+        return self.request("DELETE", url, **kwargs)
+
+    def send(self, request, **kwargs):
+        """Send a prepared request (see :py:meth:`requests.Session.send`)."""
+        return self.session.send(request, **kwargs)
+
+    def clear(self):
+        """Close all the pooled connections."""
+        with self._lock:
+            if self._pool_manager is not None:
+                self._pool_manager.clear()
+            if self._session is not None:
+                self._session.close()
+            self._reset()
+
+
+http_pool = HttpPool()
+
+
 class OrcidRESTClientObject(rest.RESTClientObject):
-    """REST Client with call logging."""
-
-    def request(self,
-                method,
-                url,
-                query_params=None,
-                headers=None,
-                body=None,
-                post_params=None,
-                _preload_content=True,
-                _request_timeout=None,
-                **kwargs):
-        """Exectue REST API request and logs both request, response and the restponse time."""
+    """REST Client with call logging, retries and circuit breaker."""
+
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+    TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+    def __init__(self, *args, **kwargs):
+        """Set up the client using the process-wide connection pool instead of a pool per client."""
+
+    @property
+    def pool_manager(self):
+        """Get the process-wide connection pool manager (see :py:data:`http_pool`)."""
+        return http_pool.pool_manager
+
+    def request(self, method, url, *args, _request_timeout=None, **kwargs):
+        """Exectue REST API request retrying the idempotent requests after transient failures.
+
+        The request gets retried up to ``ORCID_API_MAX_RETRIES`` times with jittered exponential
+        backoff (``ORCID_API_RETRY_BACKOFF`` doubled with each attempt up to ``ORCID_API_RETRY_MAX_DELAY``
+        seconds) if the server responds with 5xx or the request times out. The non-idempotent requests
+        are retried only if the connection could not be established.
+        The requests to a failing host get rejected by :py:data:`circuit_breaker`.
+        """
+        if _request_timeout is None:
+            _request_timeout = http_pool.timeout
+        host = urlparse(url).netloc
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        max_retries = app.config.get("ORCID_API_MAX_RETRIES", 3)
+        attempt = 0
+        while True:
+            if not circuit_breaker.allow(host):
+                raise CircuitBreakerOpen(host)
+            try:
+                res = self.send(method, url, *args, _request_timeout=_request_timeout, **kwargs)
+            except ApiException as ex:
+                if ex.status not in self.TRANSIENT_STATUSES:
+                    circuit_breaker.success(host)
+                    raise
+                circuit_breaker.failure(host)
+                if not idempotent or attempt >= max_retries:
+                    raise
+            except urllib3.exceptions.HTTPError as ex:
+                circuit_breaker.failure(host)
+                if not (idempotent or is_connect_error(ex)) or attempt >= max_retries:
+                    raise
+            else:
+                circuit_breaker.success(host)
+                return res
+            delay = min(app.config.get("ORCID_API_RETRY_MAX_DELAY", 10),
+                        app.config.get("ORCID_API_RETRY_BACKOFF", 0.5) * 2**attempt)
+            app.logger.warning(f"{method} {url} failed (attempt {attempt + 1}), retrying in up to {delay:.1f}s.")
+            sleep(delay / 2 + random() * delay / 2)
+            attempt += 1
+
+    def send(self,
+             method,
+             url,
+             query_params=None,
+             headers=None,
+             body=None,
+             post_params=None,
+             _preload_content=True,
+             _request_timeout=None,
+             **kwargs):
+        """Exectue REST API request and log the request, the response and the response time."""
+        called_at = datetime.utcnow()
         request_time = time()
-        put_code = body.get("put-code") if body else None
         try:
-            oac = OrcidApiCall.create(
-                user_id=current_user.id if current_user else None,
+            entry = dict(
+                called_at=called_at,
+                user=current_user.id if current_user else None,
                 method=method,
                 url=url,
                 query_params=query_params,
                 body=body,
-                put_code=put_code)
+                put_code=body.get("put-code") if body else None)
         except Exception:
             app.logger.exception("Failed to create API call log entry.")
-            oac = None
-        res = super().request(
-            method=method,
-            url=url,
-            query_params=query_params,
-            headers=headers,
-            body=body,
-            post_params=post_params,
-            _preload_content=_preload_content,
-            _request_timeout=_request_timeout,
-            **kwargs)
-        if res and oac:
-            oac.status = res.status
-            oac.response_time_ms = round((time() - request_time) * 1000)
-            if res.data:
-                oac.response = res.data
-            oac.save()
+            entry = None
+        res = None
+        try:
+            res = super().request(
+                method=method,
+                url=url,
+                query_params=query_params,
+                headers=headers,
+                body=body,
+                post_params=post_params,
+                _preload_content=_preload_content,
+                _request_timeout=_request_timeout,
+                **kwargs)
+        except ApiException as ex:
+            if entry is not None:
+                entry.update(status=ex.status, response=ex.body)
+            raise
+        else:
+            if entry is not None and res:
+                entry.update(status=res.status, response=res.data or None)
+        finally:
+            if entry is not None:
+                entry["response_time_ms"] = round((time() - request_time) * 1000)
+                api_call_log.log(**entry)
+
+        return res
+
+
+class OrcidApiClient(api_client.ApiClient):
+    """API client that owns its credentials.
+
+    The generated client reads the access token from the global configuration,
+    that is shared by all threads. Each instance of this client uses its own token
+    instead, so the API calls can be made concurrently on behalf of different users.
+    """
+
+    def __init__(self, access_token=None, *args, raw=False, **kwargs):
+        """Set up the client with the given access token.
 
+        :param raw: return the parsed JSON (the dicts with the ORCID message keys) instead of the model objects.
+        """
+        super().__init__(*args, **kwargs)
+        self.access_token = access_token or ''
+        self.profile_key = None
+        self.client_id = None
+        self.raw = raw
+
+    def deserialize(self, response, response_type):
+        """Deserialize the response (in the raw mode skip the construction of the model objects)."""
+        if not self.raw or response_type == "file":
+            return super().deserialize(response, response_type)
+        try:
+            return json.loads(response.data)
+        except ValueError:
+            return response.data
+
+    def update_params_for_auth(self, headers, querys, auth_settings):
+        """Set up the authorization header with the client access token."""
+        if auth_settings and self.access_token:
+            headers["Authorization"] = "Bearer " + self.access_token
+
+    def call_api(self, resource_path, method, *args, **kwargs):
+        """Invoke the API invalidating the cached profile summary if the user record gets modified.
+
+        The calls are rate limited per ORCID client ID (see :py:class:`~orcid_hub.queuing.RateLimiter`).
+        If ORCID responds with 429 (Too Many Requests), the client calls get suspended for the time
+        given in the header "Retry-After" and the call gets retried up to ``ORCID_API_MAX_429_RETRIES`` times.
+        """
+        attempt = 0
+        while True:
+            try:
+                rate_limiter.acquire(self.client_id)
+            except RateLimitExceeded as ex:
+                raise ApiException(status=429, reason=str(ex))
+            try:
+                res = super().call_api(resource_path, method, *args, **kwargs)
+                break
+            except ApiException as ex:
+                if ex.status != 429 or attempt >= app.config.get("ORCID_API_MAX_429_RETRIES", 3):
+                    raise
+                rate_limiter.block(self.client_id, retry_after(ex.headers and ex.headers.get("Retry-After")))
+                attempt += 1
+        if method != "GET" and self.profile_key:
+            ProfileCache.invalidate(*self.profile_key)
         return res
 
 
 class MemberAPI(MemberAPIV20Api):
     """ORCID Mmeber API extension."""
 
-    def __init__(self, org=None, user=None, access_token=None, *args, **kwargs):
-        """Set up the configuration with the access token given to the org. by the user."""
+    def __init__(self, org=None, user=None, access_token=None, *args, raw=False, **kwargs):
+        """Set up the configuration with the access token given to the org. by the user.
+
+        :param raw: return the responses as the parsed JSON instead of the model objects.
+            It is faster and should be used for reading if the models are not needed
+            (e.g., ``MemberAPI(org, user, raw=True).view_works(user.orcid)["group"]``).
+        """
+        if not args and "api_client" not in kwargs:
+            kwargs["api_client"] = OrcidApiClient(raw=raw)
         super().__init__(*args, **kwargs)
         self.set_config(org, user, access_token)
 
+    @property
+    def access_token(self):
+        """Get the access token used by the instance."""
+        return self.api_client.access_token
+
     def set_config(self, org=None, user=None, access_token=None):
-        """Set up clietn configuration."""
-        # global configuration
+        """Set up clietn configuration (the credentials are kept in the instance API client)."""
         if org is None:
             org = user.organisation
         self.org = org
         self.user = user
+        self.api_client.client_id = org.orcid_client_id if org else None
         if access_token is None:
             try:
                 orcid_token = OrcidToken.get(
@@ -94,9 +677,10 @@ class MemberAPI(MemberAPIV20Api):
                 app.logger.exception("Exception occured while retriving ORCID Token")
                 return None
 
-            configuration.access_token = orcid_token.access_token
+            self.api_client.access_token = orcid_token.access_token
         else:
-            configuration.access_token = access_token
+            self.api_client.access_token = access_token
+        self.api_client.profile_key = (user.id, org.id) if user and user.id else None
 
         url = urlparse(ORCID_BASE_URL)
         self.source_clientid = SourceClientId(
@@ -127,6 +711,10 @@ class MemberAPI(MemberAPIV20Api):
                 auth_settings=["orcid_auth"],
                 _preload_content=False)
         except ApiException as ex:
+            if ex.status not in (401, 404):
+                # ORCID is unavailable (eg, the circuit breaker is open) or failed to process the call,
+                # so the records should be processed again later:
+                raise
             if ex.status == 401:
                 try:
                     orcid_token = OrcidToken.get(
@@ -148,6 +736,26 @@ class MemberAPI(MemberAPIV20Api):
 
         return json.loads(resp.data.decode())
 
+    def get_activities(self, use_cache=True):
+        """Get the activities summary of the user.
+
+        A cached copy gets used if it is not older than ``ORCID_PROFILE_CACHE_TTL`` seconds.
+        The cache entries are invalidated when the record gets modified via the API or
+        ORCID notifies about the profile update.
+        """
+        ttl = app.config.get("ORCID_PROFILE_CACHE_TTL")
+        if use_cache and ttl:
+            summary = ProfileCache.get_summary(self.user.id, self.org.id, ttl)
+            if summary is not None:
+                return summary
+        record = self.get_record()
+        if not record:
+            return None
+        summary = record.get("activities-summary")
+        if ttl and summary is not None:
+            ProfileCache.set_summary(self.user.id, self.org.id, summary)
+        return summary
+
     def is_emp_or_edu_record_present(self, affiliation_type):
         """Determine if there is already an affiliation record for the user.
 
@@ -360,8 +968,8 @@ class MemberAPI(MemberAPIV20Api):
         else:
             return (put_code, orcid, created)
 
-    def create_or_update_work(self, task_by_user, *args, **kwargs):
-        """Create or update work record of a user."""
+    def build_work(self, task_by_user):
+        """Create a work (:py:class:`~orcid_api.models.Work`) from the work record and the invitee."""
         wr = task_by_user.work_record
         wi = task_by_user.work_record.work_invitees
 
@@ -476,6 +1084,13 @@ class MemberAPI(MemberAPIV20Api):
                     external_id_relationship=external_id_relationship))
 
         rec.external_ids = ExternalIDs(external_id=external_id_list)  # noqa: F405
+        return rec
+
+    def create_or_update_work(self, task_by_user, *args, **kwargs):
+        """Create or update work record of a user."""
+        wi = task_by_user.work_record.work_invitees
+        rec = self.build_work(task_by_user)
+        put_code = wi.put_code
 
         try:
             api_call = self.update_work if put_code else self.create_work
@@ -514,6 +1129,44 @@ class MemberAPI(MemberAPIV20Api):
         else:
             return (put_code, orcid, created)
 
+    def create_works_in_bulk(self, records):
+        """Create new works of the user with a single call of the bulk endpoint (``POST /works``).
+
+        The bulk endpoint is available since the API version 2.1 (``ORCID_API_BULK_VERSION``)
+        and accepts at most 100 works per call. The result of each work is reported separately.
+
+        :param records: the work records (with the invitees) of the new works.
+        :return: a list of the pairs (put-code, error message) in the order of the records.
+        """
+        body = {
+            "bulk": [{
+                "work": self.api_client.sanitize_for_serialization(self.build_work(r))
+            } for r in records]
+        }
+        resp = self.api_client.call_api(
+            f"/{app.config.get('ORCID_API_BULK_VERSION', 'v2.1')}/{{orcid}}/works",
+            "POST",
+            path_params={"orcid": self.user.orcid},
+            header_params={"Accept": "application/json", "Content-Type": "application/json"},
+            body=body,
+            auth_settings=["orcid_auth"],
+            _return_http_data_only=True,
+            _preload_content=False)
+        app.logger.info(f"For {self.user} {len(records)} ORCID work records were created in bulk from {self.org}")
+        data = json.loads(resp.data)
+        results = []
+        for item in data.get("bulk") or []:
+            if "work" in item:
+                results.append((item["work"].get("put-code"), None))
+            else:
+                error = item.get("error") or {}
+                results.append(
+                    (None, f"{error.get('response-code')}: "
+                     f"{error.get('user-message') or error.get('developer-message')}"))
+        if len(results) != len(records):
+            raise Exception(f"The bulk response has {len(results)} results for {len(records)} works.")
+        return results
+
     def create_or_update_funding(self, task_by_user, *args, **kwargs):
         """Create or update funding record of a user."""
         fr = task_by_user.funding_record
@@ -815,7 +1468,4 @@ class MemberAPI(MemberAPIV20Api):
         pass
 
 
-# yapf: disable
-from orcid_api import *  # noqa: F401,F403,F405
-
-api_client.RESTClientObject = OrcidRESTClientObject  # noqa: F405
+api_client.RESTClientObject = OrcidRESTClientObject
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-  # noqa
 """Quequeing."""
 
+import threading
+from email.utils import parsedate_to_datetime
 from time import sleep, time
 
 from flask import abort
@@ -63,6 +65,11 @@ else:
                 def decorated_view(*args, **kwargs):
                     return fn(*args, **kwargs)
 
+                def queue(*args, job_id=None, timeout=None, description=None, **kwargs):
+                    """Call the function right away ignoring the job options."""
+                    return fn(*args, **kwargs)
+
+                decorated_view.queue = queue
                 return decorated_view
 
             return wrapper
@@ -83,3 +90,237 @@ if __redis_available:
     app.register_blueprint(rq_dashboard.blueprint, url_prefix="/rq")
 else:
     app.config["REDIS_URL"] = None
+
+
+def fetch_job(job_id):
+    """Fetch the job from the default queue (``None`` if it doesn't exist or Redis is not available)."""
+    if not __redis_available:
+        return None
+    try:
+        return rq.get_queue().fetch_job(job_id)
+    except Exception:
+        app.logger.exception(f"Failed to fetch the job {job_id!r}.")
+        return None
+
+
+def get_current_job():
+    """Get the job executed by the worker (``None`` if the function was called directly)."""
+    if not __redis_available:
+        return None
+    from rq import get_current_job
+    return get_current_job()
+
+
+# Token bucket (KEYS - the bucket keys; ARGV - the current time and the rate and the burst of each bucket).
+# The token gets taken from all the buckets or none of them. Returns the time to wait (0 - acquired).
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local state = {}
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[i * 2]), tonumber(ARGV[i * 2 + 1])
+    local s = redis.call("HMGET", key, "tokens", "ts", "blocked_until")
+    local tokens = math.min(burst, (tonumber(s[1]) or burst) + math.max(0, now - (tonumber(s[2]) or now)) * rate)
+    local blocked_until = tonumber(s[3]) or 0
+    if blocked_until > now then
+        wait = math.max(wait, blocked_until - now)
+    elseif tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    state[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local tokens = state[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call("HSET", key, "tokens", tostring(tokens))
+    redis.call("HSET", key, "ts", ARGV[1])
+    redis.call("EXPIRE", key, 3600)
+end
+return tostring(wait)
+"""
+
+
+class RedisState:
+    """Base of the objects keeping their state in Redis, so it is shared by all the web and RQ worker processes.
+
+    If Redis is not available (or fails), the subclasses fall back to their in-process state
+    and the connection is retried after ``REDIS_RETRY_INTERVAL`` seconds.
+    """
+
+    REDIS_RETRY_INTERVAL = 60  #: Time in sec. before reconnecting to Redis after a failure
+
+    def __init__(self, redis_url=None):
+        """Set up the state kept in Redis at *redis_url* (in-process only, if it is not given)."""
+        self.redis_url = redis_url
+        self._redis = None
+        self._redis_failed_at = None
+
+    def connected(self, redis):
+        """Set up the new Redis connection (e.g., register the scripts)."""
+        pass
+
+    @property
+    def redis(self):
+        """Get the Redis connection (``None`` if Redis is not available)."""
+        if not self.redis_url:
+            return None
+        if self._redis_failed_at and time() - self._redis_failed_at < self.REDIS_RETRY_INTERVAL:
+            return None
+        if self._redis is None:
+            try:
+                from redis import StrictRedis
+                self._redis = StrictRedis.from_url(self.redis_url, socket_timeout=1, socket_connect_timeout=1)
+                self.connected(self._redis)
+            except Exception:
+                app.logger.exception(f"Failed to connect to Redis, {type(self).__name__} falls back to "
+                                     "the in-process state.")
+                self._redis, self._redis_failed_at = None, time()
+                return None
+        return self._redis
+
+    def _redis_call(self, fn):
+        """Execute the Redis command returning ``None`` if it fails (the in-process state should be used)."""
+        if self.redis is None:
+            return None
+        try:
+            return fn()
+        except Exception:
+            app.logger.exception(f"Redis command failed, {type(self).__name__} falls back to the in-process state.")
+            self._redis, self._redis_failed_at = None, time()
+            return None
+
+
+class RateLimiter(RedisState):
+    """Token bucket rate limiter of the ORCID API calls.
+
+    A call takes a token from the global bucket (``ORCID_API_GLOBAL_RATE`` calls per second and
+    up to ``ORCID_API_GLOBAL_BURST`` calls at once) and from the bucket of the ORCID client ID
+    (``ORCID_API_CLIENT_RATE`` and ``ORCID_API_CLIENT_BURST``). If the rate is 0, the bucket is not limited.
+    The buckets are kept in Redis, so the limits are shared by all the web and RQ worker processes.
+    If Redis is not available, each process falls back to its own in-process buckets.
+
+    Usage::
+
+        rate_limiter.acquire(org.orcid_client_id)
+        ...
+        # ORCID responded with 429:
+        rate_limiter.block(org.orcid_client_id, retry_after(resp.headers.get("Retry-After")))
+    """
+
+    KEY_PREFIX = "orcidhub:rate:"
+
+    def __init__(self, redis_url=None):
+        """Set up the limiter (the buckets are kept in Redis at *redis_url*, if it is given)."""
+        super().__init__(redis_url)
+        self._script = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def limits(self, client_id=None):
+        """Get the keys, the rates and the bursts of the buckets of the call on behalf of the client."""
+        limits = []
+        rate = app.config.get("ORCID_API_GLOBAL_RATE")
+        if rate:
+            limits.append(("global", rate, app.config.get("ORCID_API_GLOBAL_BURST") or rate))
+        rate = app.config.get("ORCID_API_CLIENT_RATE")
+        if rate and client_id:
+            limits.append(("client:" + client_id, rate, app.config.get("ORCID_API_CLIENT_BURST") or rate))
+        return limits
+
+    def connected(self, redis):
+        """Register the token bucket script."""
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, client_id=None, now=None):
+        """Try to take a token from the buckets of the call.
+
+        :return: 0 if the token was taken, otherwise the time in seconds to wait before the next attempt.
+        """
+        limits = self.limits(client_id)
+        if not limits:
+            return 0
+        if now is None:
+            now = time()
+        wait = self._redis_call(lambda: self._script(
+            keys=[self.KEY_PREFIX + key for key, *_ in limits],
+            args=[repr(now)] + [v for _, rate, burst in limits for v in (rate, burst)]))
+        if wait is not None:
+            return float(wait)
+
+        with self._lock:
+            state = []
+            wait = 0
+            for key, rate, burst in limits:
+                tokens, ts, blocked_until = self._buckets.get(key, (burst, now, 0))
+                tokens = min(burst, tokens + max(0, now - ts) * rate)
+                if blocked_until > now:
+                    wait = max(wait, blocked_until - now)
+                elif tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                state.append((key, tokens, blocked_until))
+            for key, tokens, blocked_until in state:
+                self._buckets[key] = (tokens if wait else tokens - 1, now, blocked_until)
+        return wait
+
+    def acquire(self, client_id=None, max_wait=None):
+        """Wait until a token is taken from the buckets of the call.
+
+        :param max_wait: the maximum time in seconds to wait (by default ``ORCID_API_RATE_MAX_WAIT``).
+        :return: the time in seconds spent waiting.
+        :raises RateLimitExceeded: if the token cannot be taken within *max_wait* seconds.
+        """
+        if max_wait is None:
+            max_wait = app.config.get("ORCID_API_RATE_MAX_WAIT", 30)
+        started_at = time()
+        while True:
+            wait = self.take(client_id)
+            if not wait:
+                return time() - started_at
+            if time() + wait - started_at > max_wait:
+                raise RateLimitExceeded(wait)
+            sleep(wait)
+
+    def block(self, client_id=None, seconds=1):
+        """Stop taking tokens from the client (or the global, if the client is not given) bucket for a while."""
+        key = "client:" + client_id if client_id else "global"
+        blocked_until = time() + seconds
+        if self._redis_call(lambda: self._redis.hset(
+                self.KEY_PREFIX + key, "blocked_until", repr(blocked_until))) is not None:
+            return
+        with self._lock:
+            tokens, ts, _ = self._buckets.get(key, (0, blocked_until, 0))
+            self._buckets[key] = (tokens, ts, blocked_until)
+
+
+class RateLimitExceeded(Exception):
+    """The ORCID API call cannot be made within the allowed waiting time."""
+
+    def __init__(self, retry_after):
+        """Keep the time in seconds after which the call can be retried."""
+        super().__init__(f"ORCID API rate limit exceeded, retry after {retry_after:.1f}s.")
+        self.retry_after = retry_after
+
+
+def retry_after(value, default=1):
+    """Get the time to wait in seconds from the value of the header "Retry-After".
+
+    >>> retry_after("120")
+    120.0
+    >>> retry_after(None)
+    1
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return default
+
+
+rate_limiter = RateLimiter(REDIS_URL if __redis_available else None)
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 """Various utilities."""
 
+import codecs
 import json
 import logging
 import os
+import random
+import threading
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from itertools import filterfalse, groupby
+from functools import partial
+from itertools import filterfalse
+from time import sleep, time
+from uuid import uuid4
 from urllib.parse import quote, urlencode, urlparse
 
 import emails
@@ -16,13 +24,15 @@ from flask_login import current_user
 from html2text import html2text
 from itsdangerous import BadSignature, TimedJSONWebSignatureSerializer
 from jinja2 import Template
-from peewee import JOIN
+from peewee import JOIN, SQL, PostgresqlDatabase, fn
+from playhouse.shortcuts import case
 
 from . import app, orcid_client, rq
-from .models import (AFFILIATION_TYPES, Affiliation, AffiliationRecord, FundingInvitees,
-                     FundingRecord, OrcidToken, Organisation, PartialDate, PeerReviewExternalId,
-                     PeerReviewInvitee, PeerReviewRecord, Role, Task, Url, User, UserInvitation,
-                     UserOrg, WorkInvitees, WorkRecord, get_val)
+from .queuing import RedisState, fetch_job, get_current_job, rate_limiter, retry_after
+from .models import (AFFILIATION_TYPES, Affiliation, AffiliationFingerprint, AffiliationRecord, FundingInvitees,
+                     FundingRecord, LoadStatus, OrcidToken, Organisation, PartialDate, PeerReviewExternalId,
+                     PeerReviewInvitee, PeerReviewRecord, RecordStatus, Role, Task, Url, User,
+                     UserInvitation, TaskType, UserOrg, WorkInvitees, WorkRecord, get_val)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -188,6 +198,19 @@ def append_qs(url, **qs):
     return url + ('&' if urlparse(url).query else '?') + urlencode(qs, doseq=True)
 
 
+def snake_case_keys(data):
+    """Replace recursively the hyphens in the keys of ORCID JSON data with underscores.
+
+    >>> snake_case_keys({"put-code": 123, "source": {"source-name": {"value": "ABC"}}})
+    {'put_code': 123, 'source': {'source_name': {'value': 'ABC'}}}
+    """
+    if isinstance(data, dict):
+        return {k.replace('-', '_'): snake_case_keys(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [snake_case_keys(v) for v in data]
+    return data
+
+
 def track_event(category, action, label=None, value=0):
     """Track application events with Google Analytics."""
     ga_tracking_id = app.config.get("GA_TRACKING_ID")
@@ -294,6 +317,169 @@ def send_work_funding_peer_review_invitation(inviter, org, email, first_name=Non
         raise ex
 
 
+class PushExecutor:
+    """Push the batch records of independent users to ORCID concurrently.
+
+    Each submitted job is a batch of a single user and the jobs of the same user
+    are executed sequentially in the order they were submitted, so the put-code
+    matching stays correct. The number of jobs in flight is limited globally
+    (``ORCID_PUSH_MAX_WORKERS``) and per organisation ORCID client ID
+    (``ORCID_PUSH_MAX_PER_CLIENT``). The jobs of different clients get dispatched
+    in round-robin fashion. If the global limit is 1, the jobs get executed
+    right away in the calling thread.
+
+    A failed job doesn't stop the other jobs, but once all of them are completed, the exception
+    of the first failed job is re-raised by :py:meth:`shutdown` (when leaving the ``with`` block),
+    so the batch processing job fails as it did without the executor.
+
+    Usage::
+
+        with PushExecutor() as executor:
+            executor.submit(org, user.id, partial(create_or_update_work, user, org.id, records),
+                            record_count=len(records))
+        logger.info(f"Pushed {executor.record_count} records ({executor.throughput:.1f} records/sec)")
+    """
+
+    def __init__(self, max_workers=None, max_per_client=None):
+        """Set up the executor limits."""
+        self.max_workers = max(1, max_workers or app.config.get("ORCID_PUSH_MAX_WORKERS") or 1)
+        self.max_per_client = max(
+            1, max_per_client or app.config.get("ORCID_PUSH_MAX_PER_CLIENT") or self.max_workers)
+        self.record_count = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+        self._client_ids = {}
+        self._pending = OrderedDict()
+        self._in_flight = 0
+        self._in_flight_by_client = defaultdict(int)
+        self._busy_users = set()
+        self._lock = threading.Condition()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers) if self.max_workers > 1 else None
+
+    def __enter__(self):  # noqa: D105
+        return self
+
+    def __exit__(self, *args):  # noqa: D105
+        self.shutdown()
+
+    @property
+    def elapsed(self):
+        """Get the time (in seconds) elapsed since the first submitted job."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Get the number of pushed records per second."""
+        elapsed = self.elapsed
+        return self.record_count / elapsed if elapsed else 0.0
+
+    def client_id(self, org):
+        """Get the organisation ORCID client ID (cached)."""
+        if hasattr(org, "orcid_client_id"):
+            return org.orcid_client_id
+        if org not in self._client_ids:
+            self._client_ids[org] = Organisation.select(
+                Organisation.orcid_client_id).where(Organisation.id == org).scalar()
+        return self._client_ids[org]
+
+    def submit(self, org, user_id, fn, record_count=1):
+        """Schedule a user batch push job.
+
+        :param org: the organisation (or its ID) on which behalf the records get pushed.
+        :param user_id: the user ID used to keep the jobs of the same user in order.
+        :param fn: a callable without arguments that pushes the records.
+        :param record_count: the number of records in the job.
+        """
+        if self.started_at is None:
+            self.started_at = time()
+        if self._pool is None:
+            try:
+                fn()
+            except Exception as ex:
+                logger.exception(f"Failed to push the records of the user (ID: {user_id}).")
+                self.errors.append(ex)
+            else:
+                self.record_count += record_count
+            return
+
+        client_id = self.client_id(org)
+        with self._lock:
+            self._pending.setdefault(client_id, deque()).append((user_id, fn, record_count))
+            self._dispatch()
+
+    def _next_job(self):
+        """Pick the next job (round-robin by client) which client and user have no capacity limit hit."""
+        for client_id, jobs in self._pending.items():
+            if self._in_flight_by_client[client_id] >= self.max_per_client:
+                continue
+            for idx, job in enumerate(jobs):
+                if job[0] not in self._busy_users:
+                    del jobs[idx]
+                    if jobs:
+                        self._pending.move_to_end(client_id)
+                    else:
+                        del self._pending[client_id]
+                    return client_id, job
+        return None
+
+    def _dispatch(self):
+        """Submit the pending jobs to the pool up to the limits. Should be called holding the lock."""
+        while self._in_flight < self.max_workers:
+            next_job = self._next_job()
+            if next_job is None:
+                break
+            client_id, (user_id, fn, record_count) = next_job
+            self._in_flight += 1
+            self._in_flight_by_client[client_id] += 1
+            self._busy_users.add(user_id)
+            self._pool.submit(self._run, client_id, user_id, fn, record_count)
+
+    def _run(self, client_id, user_id, fn, record_count):
+        """Execute a job in a worker thread and dispatch the next pending jobs."""
+        error = None
+        try:
+            with app.app_context():
+                fn()
+        except Exception as ex:
+            logger.exception(f"Failed to push the records of the user (ID: {user_id}).")
+            error = ex
+        finally:
+            # each worker thread has its own DB connection:
+            database = Task._meta.database
+            if not database.is_closed():
+                database.close()
+            with self._lock:
+                if error is None:
+                    self.record_count += record_count
+                else:
+                    self.errors.append(error)
+                self._in_flight -= 1
+                self._in_flight_by_client[client_id] -= 1
+                self._busy_users.discard(user_id)
+                self._dispatch()
+                self._lock.notify_all()
+
+    def join(self):
+        """Wait until all the submitted jobs are completed."""
+        if self._pool is not None:
+            with self._lock:
+                while self._in_flight or self._pending:
+                    self._lock.wait()
+        self.finished_at = time()
+
+    def shutdown(self):
+        """Wait for the submitted jobs, release the worker threads and re-raise the first job failure."""
+        self.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self.errors:
+            raise self.errors[0]
+
+
 def create_or_update_work(user, org_id, records, *args, **kwargs):
     """Create or update work record of a user."""
     records = list(unique_everseen(records, key=lambda t: t.work_record.id))
@@ -301,10 +487,9 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
     client_id = org.orcid_client_id
     api = orcid_client.MemberAPI(org, user)
 
-    profile_record = api.get_record()
+    activities = api.get_activities()
 
-    if profile_record:
-        activities = profile_record.get("activities-summary")
+    if activities:
 
         def is_org_rec(rec):
             return (rec.get("source").get("source-client-id")
@@ -322,41 +507,75 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
             for r in records if r.work_record.work_invitees.put_code
         }
 
-        def match_put_code(records, work_record, work_invitees):
+        matcher = PutCodeMatcher(
+            works,
+            lambda r: (None, [(get_val(r, "title", "title", "value"), r.get("type"))] if r.get("title") else []),
+            taken=taken_put_codes)
+
+        def match_put_code(work_record, work_invitees):
             """Match and assign put-code to a single work record and the existing ORCID records."""
             if work_invitees.put_code:
                 return
-            for r in records:
-                put_code = r.get("put-code")
-                if put_code in taken_put_codes:
-                    continue
-
-                if ((r.get("title") is None and r.get("title").get("title") is None
-                     and r.get("title").get("title").get("value") is None and r.get("type") is None)
-                        or (r.get("title").get("title").get("value") == work_record.title
-                            and r.get("type") == work_record.type)):
-                    work_invitees.put_code = put_code
-                    work_invitees.save()
-                    taken_put_codes.add(put_code)
-                    app.logger.debug(
-                        f"put-code {put_code} was asigned to the work record "
-                        f"(ID: {work_record.id}, Task ID: {work_record.task_id})")
-                    break
+            put_code, _ = matcher.match(fallback_keys=[(work_record.title, work_record.type)])
+            if put_code:
+                work_invitees.put_code = put_code
+                work_invitees.save()
+                app.logger.debug(
+                    f"put-code {put_code} was asigned to the work record "
+                    f"(ID: {work_record.id}, Task ID: {work_record.task_id})")
 
         for task_by_user in records:
             wr = task_by_user.work_record
             wi = task_by_user.work_record.work_invitees
-            match_put_code(works, wr, wi)
+            match_put_code(wr, wi)
+
+        # the new works get created in bulk (in chunks of up to ORCID_API_BULK_SIZE works):
+        new_records = [r for r in records if not r.work_record.work_invitees.put_code]
+        bulk_size = min(app.config.get("ORCID_API_BULK_SIZE") or 0, 100)
+        if bulk_size > 0 and len(new_records) > 1:
+            records = [r for r in records if r.work_record.work_invitees.put_code]
+            for idx in range(0, len(new_records), bulk_size):
+                if orcid_client.circuit_breaker.is_open():
+                    break
+                chunk = new_records[idx:idx + bulk_size]
+                try:
+                    results = api.create_works_in_bulk(chunk)
+                except Exception as ex:
+                    logger.exception(f"For {user} encountered exception")
+                    try:
+                        error = json.loads(getattr(ex, "body", None) or "null") or str(ex)
+                    except ValueError:  # the error body isn't JSON (e.g., an error page of a proxy)
+                        error = str(ex)
+                    results = [(None, error)] * len(chunk)
+                processed_at = datetime.utcnow()
+                for task_by_user, (put_code, error) in zip(chunk, results):
+                    wr = task_by_user.work_record
+                    wi = task_by_user.work_record.work_invitees
+                    if put_code:
+                        wi.add_status_line(f"Work record was created.", RecordStatus.CREATED)
+                        wi.orcid = user.orcid
+                        wi.put_code = put_code
+                    else:
+                        wi.add_status_line(f"Exception occured processing the record: {error}.", RecordStatus.ERROR)
+                        wr.add_status_line(
+                            f"Error processing record. Fix and reset to enable this record to be processed: {error}.",
+                            RecordStatus.ERROR)
+                    wi.processed_at = processed_at
+                    wr.save()
+                    wi.save()
 
         for task_by_user in records:
-            wi = task_by_user.work_record.work_invitees
+            if orcid_client.circuit_breaker.is_open():
+                break  # ORCID is unavailable, the rest of the records get processed once it recovers
+            wr = task_by_user.work_record
+            wi = wr.work_invitees
 
             try:
                 put_code, orcid, created = api.create_or_update_work(task_by_user)
                 if created:
-                    wi.add_status_line(f"Work record was created.")
+                    wi.add_status_line(f"Work record was created.", RecordStatus.CREATED)
                 else:
-                    wi.add_status_line(f"Work record was updated.")
+                    wi.add_status_line(f"Work record was updated.", RecordStatus.UPDATED)
                 wi.orcid = orcid
                 wi.put_code = put_code
 
@@ -365,10 +584,11 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
                 exception_msg = ""
                 if ex and ex.body:
                     exception_msg = json.loads(ex.body)
-                wi.add_status_line(f"Exception occured processing the record: {exception_msg}.")
+                wi.add_status_line(f"Exception occured processing the record: {exception_msg}.",
+                                   RecordStatus.ERROR)
                 wr.add_status_line(
-                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}."
-                )
+                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}.",
+                    RecordStatus.ERROR)
 
             finally:
                 wi.processed_at = datetime.utcnow()
@@ -387,10 +607,9 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
     client_id = org.orcid_client_id
     api = orcid_client.MemberAPI(org, user)
 
-    profile_record = api.get_record()
+    activities = api.get_activities()
 
-    if profile_record:
-        activities = profile_record.get("activities-summary")
+    if activities:
 
         def is_org_rec(rec):
             return (rec.get("source").get("source-client-id")
@@ -409,29 +628,26 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
             for r in records if r.peer_review_record.peer_review_invitee.put_code
         }
 
-        def match_put_code(records, peer_review_record, peer_review_invitee, taken_external_id_values):
+        def summary_keys(r):
+            """Match peer reviews by the review group ID and the first external ID value of the summary."""
+            external_ids = get_val(r, "external-ids", "external-id")
+            external_id_value = external_ids[0].get("external-id-value") if external_ids else None
+            return None, [(r.get("review-group-id"), external_id_value)] if r.get("review-group-id") else []
+
+        matcher = PutCodeMatcher(peer_reviews, summary_keys, taken=taken_put_codes)
+
+        def match_put_code(peer_review_record, peer_review_invitee, taken_external_id_values):
             """Match and assign put-code to a single peer review record and the existing ORCID records."""
             if peer_review_invitee.put_code:
                 return
-            for r in records:
-                put_code = r.get("put-code")
-
-                external_id_value = r.get("external-ids").get("external-id")[0].get("external-id-value") if r.get(
-                    "external-ids") and r.get("external-ids").get("external-id") and r.get("external-ids").get(
-                    "external-id")[0].get("external-id-value") else None
-
-                if put_code in taken_put_codes:
-                    continue
-
-                if (r.get("review-group-id") and r.get("review-group-id") == peer_review_record.review_group_id and
-                            external_id_value in taken_external_id_values):     # noqa: E127
-                    peer_review_invitee.put_code = put_code
-                    peer_review_invitee.save()
-                    taken_put_codes.add(put_code)
-                    app.logger.debug(
-                        f"put-code {put_code} was asigned to the peer review record "
-                        f"(ID: {peer_review_record.id}, Task ID: {peer_review_record.task_id})")
-                    break
+            put_code, _ = matcher.match(fallback_keys=[(peer_review_record.review_group_id, v)
+                                                       for v in taken_external_id_values])
+            if put_code:
+                peer_review_invitee.put_code = put_code
+                peer_review_invitee.save()
+                app.logger.debug(
+                    f"put-code {put_code} was asigned to the peer review record "
+                    f"(ID: {peer_review_record.id}, Task ID: {peer_review_record.task_id})")
 
         for task_by_user in records:
             pr = task_by_user.peer_review_record
@@ -439,18 +655,20 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
 
             external_ids = PeerReviewExternalId.select().where(PeerReviewExternalId.peer_review_record_id == pr.id)
             taken_external_id_values = {ei.value for ei in external_ids if ei.value}
-            match_put_code(peer_reviews, pr, pi, taken_external_id_values)
+            match_put_code(pr, pi, taken_external_id_values)
 
         for task_by_user in records:
+            if orcid_client.circuit_breaker.is_open():
+                break  # ORCID is unavailable, the rest of the records get processed once it recovers
             pr = task_by_user.peer_review_record
             pi = pr.peer_review_invitee
 
             try:
                 put_code, orcid, created = api.create_or_update_peer_review(task_by_user)
                 if created:
-                    pi.add_status_line(f"Peer review record was created.")
+                    pi.add_status_line(f"Peer review record was created.", RecordStatus.CREATED)
                 else:
-                    pi.add_status_line(f"Peer review record was updated.")
+                    pi.add_status_line(f"Peer review record was updated.", RecordStatus.UPDATED)
                 pi.orcid = orcid
                 pi.put_code = put_code
 
@@ -459,10 +677,11 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
                 exception_msg = ""
                 if ex and ex.body:
                     exception_msg = json.loads(ex.body)
-                pi.add_status_line(f"Exception occured processing the record: {exception_msg}.")
+                pi.add_status_line(f"Exception occured processing the record: {exception_msg}.",
+                                   RecordStatus.ERROR)
                 pr.add_status_line(
-                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}."
-                )
+                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}.",
+                    RecordStatus.ERROR)
 
             finally:
                 pi.processed_at = datetime.utcnow()
@@ -481,10 +700,9 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
     client_id = org.orcid_client_id
     api = orcid_client.MemberAPI(org, user)
 
-    profile_record = api.get_record()
+    activities = api.get_activities()
 
-    if profile_record:
-        activities = profile_record.get("activities-summary")
+    if activities:
 
         def is_org_rec(rec):
             return (rec.get("source").get("source-client-id")
@@ -502,44 +720,42 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
             for r in records if r.funding_record.funding_invitees.put_code
         }
 
-        def match_put_code(records, funding_record, funding_invitees):
+        matcher = PutCodeMatcher(
+            fundings,
+            lambda r: (None, [(get_val(r, "title", "title", "value"), r.get("type"),
+                               get_val(r, "organization", "name"))] if r.get("title") else []),
+            taken=taken_put_codes)
+
+        def match_put_code(funding_record, funding_invitees):
             """Match and asign put-code to a single funding record and the existing ORCID records."""
             if funding_invitees.put_code:
                 return
-            for r in records:
-                put_code = r.get("put-code")
-                if put_code in taken_put_codes:
-                    continue
-
-                if ((r.get("title") is None and r.get("title").get("title") is None
-                     and r.get("title").get("title").get("value") is None and r.get("type") is None
-                     and r.get("organization") is None
-                     and r.get("organization").get("name") is None)
-                        or (r.get("title").get("title").get("value") == funding_record.title
-                            and r.get("type") == funding_record.type
-                            and r.get("organization").get("name") == funding_record.org_name)):
-                    funding_invitees.put_code = put_code
-                    funding_invitees.save()
-                    taken_put_codes.add(put_code)
-                    app.logger.debug(
-                        f"put-code {put_code} was asigned to the funding record "
-                        f"(ID: {funding_record.id}, Task ID: {funding_record.task_id})")
-                    break
+            put_code, _ = matcher.match(
+                fallback_keys=[(funding_record.title, funding_record.type, funding_record.org_name)])
+            if put_code:
+                funding_invitees.put_code = put_code
+                funding_invitees.save()
+                app.logger.debug(
+                    f"put-code {put_code} was asigned to the funding record "
+                    f"(ID: {funding_record.id}, Task ID: {funding_record.task_id})")
 
         for task_by_user in records:
             fr = task_by_user.funding_record
             fi = task_by_user.funding_record.funding_invitees
-            match_put_code(fundings, fr, fi)
+            match_put_code(fr, fi)
 
         for task_by_user in records:
-            fi = task_by_user.funding_record.funding_invitees
+            if orcid_client.circuit_breaker.is_open():
+                break  # ORCID is unavailable, the rest of the records get processed once it recovers
+            fr = task_by_user.funding_record
+            fi = fr.funding_invitees
 
             try:
                 put_code, orcid, created = api.create_or_update_funding(task_by_user)
                 if created:
-                    fi.add_status_line(f"Funding record was created.")
+                    fi.add_status_line(f"Funding record was created.", RecordStatus.CREATED)
                 else:
-                    fi.add_status_line(f"Funding record was updated.")
+                    fi.add_status_line(f"Funding record was updated.", RecordStatus.UPDATED)
                 fi.orcid = orcid
                 fi.put_code = put_code
 
@@ -548,10 +764,11 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
                 exception_msg = ""
                 if ex and ex.body:
                     exception_msg = json.loads(ex.body)
-                fi.add_status_line(f"Exception occured processing the record: {exception_msg}.")
+                fi.add_status_line(f"Exception occured processing the record: {exception_msg}.",
+                                   RecordStatus.ERROR)
                 fr.add_status_line(
-                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}."
-                )
+                    f"Error processing record. Fix and reset to enable this record to be processed: {exception_msg}.",
+                    RecordStatus.ERROR)
 
             finally:
                 fi.processed_at = datetime.utcnow()
@@ -661,11 +878,9 @@ def send_user_invitation(inviter,
             disambiguation_source=disambiguation_source,
             token=token)
 
-        status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
-        (AffiliationRecord.update(status=AffiliationRecord.status + "\n" + status).where(
-            AffiliationRecord.status.is_null(False), AffiliationRecord.email == email).execute())
-        (AffiliationRecord.update(status=status).where(AffiliationRecord.status.is_null(),
-                                                       AffiliationRecord.email == email).execute())
+        AffiliationRecord.update_status(
+            "The invitation sent.", RecordStatus.SENT, AffiliationRecord.email == email,
+            *([AffiliationRecord.task_id == task_id] if task_id else []))
         return ui.id
 
     except Exception as ex:
@@ -696,21 +911,119 @@ def unique_everseen(iterable, key=None):
                 yield element
 
 
-def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
+class PutCodeMatcher:
+    """Index of ORCID entry summaries for matching the local records with the existing entries.
+
+    The summaries get normalised once into hash indexes keyed on the match tuples, so each record
+    is matched in constant time instead of being compared with every summary of the profile.
+    A summary can be matched either exactly (e.g., the entry is already up to date) or by any of
+    the fallback keys. Only the put-codes that are not yet taken by other records are used for
+    the fallback matches. If there are several matching summaries, the first one in the order of
+    the profile wins.
+
+    :param summaries: the list of ORCID entry summaries.
+    :param keys: the function returning the exact match key (``None`` if the summary should be matched
+        only by the fallback keys) and the list of the fallback match keys of a summary.
+    :param taken: the set of the already taken put-codes (can be shared by several matchers).
+    """
+
+    def __init__(self, summaries, keys, taken=None):
+        """Build the indexes of the summaries."""
+        self.taken = taken if taken is not None else set()
+        self.exact_index, self.fallback_index = {}, {}
+        for pos, summary in enumerate(summaries):
+            entry = (pos, summary.get("put-code"))
+            key, fallback_keys = keys(summary)
+            if key is not None:
+                self.exact_index.setdefault(key, []).append(entry)
+            for k in fallback_keys:
+                self.fallback_index.setdefault(k, []).append(entry)
+
+    def exact(self, key, put_code=None):
+        """Get the put-code of the summary matching exactly (preferably, the given put-code)."""
+        entries = self.exact_index.get(key)
+        if not entries:
+            return None
+        if put_code is not None and any(pc == put_code for _, pc in entries):
+            return put_code
+        return entries[0][1]
+
+    def match(self, key=None, fallback_keys=()):
+        """Find the first summary matching the record and take its put-code if it was a fallback match.
+
+        :param key: the exact match key of the record.
+        :param fallback_keys: the fallback match keys of the record.
+        :return: the pair of the put-code (``None`` if there is no match) and the flag of the exact match.
+        """
+        entries = self.exact_index.get(key) if key is not None else None
+        best = entries[0] + (True, ) if entries else None
+        for k in fallback_keys:
+            for pos, put_code in self.fallback_index.get(k, ()):
+                if best is not None and pos >= best[0]:
+                    break
+                if put_code not in self.taken:
+                    best = (pos, put_code, False)
+                    break
+        if best is None:
+            return None, False
+        _, put_code, is_exact = best
+        if not is_exact:
+            self.taken.add(put_code)
+        return put_code, is_exact
+
+
+def orcid_date_key(value):
+    """Normalise ORCID partial date into a hashable tuple.
+
+    >>> orcid_date_key({"year": {"value": "2003"}, "month": {"value": "07"}, "day": None})
+    ('2003', '07', None)
+    """
+    if not value:
+        return None
+    return tuple(get_val(value, f, "value") for f in ("year", "month", "day"))
+
+
+def affiliation_summary_keys(summary):
+    """Get the exact match key and the fallback keys of ORCID employment or education summary."""
+    start_date, end_date = orcid_date_key(summary.get("start-date")), orcid_date_key(summary.get("end-date"))
+    department, role = summary.get("department-name"), summary.get("role-title")
+    org = summary.get("organization") or {}
+    key = (start_date, end_date, department, role, org.get("name"), get_val(org, "address", "city"),
+           get_val(org, "address", "region"), get_val(org, "address", "country"),
+           get_val(org, "disambiguated-organization", "disambiguated-organization-identifier"),
+           get_val(org, "disambiguated-organization", "disambiguation-source"))
+    fallback_keys = [(start_date, department, role)]
+    if start_date is None and end_date is None and department is None and role is None:
+        fallback_keys.append(())
+    return key, fallback_keys
+
+
+def affiliation_record_keys(record):
+    """Get the match keys of an affiliation record (see :py:func:`affiliation_summary_keys`)."""
+    start_date = orcid_date_key(record.start_date.as_orcid_dict()) if record.start_date else None
+    end_date = orcid_date_key(record.end_date.as_orcid_dict()) if record.end_date else None
+    key = (start_date, end_date, record.department, record.role, record.organisation, record.city, record.state,
+           record.country, record.disambiguated_id, record.disambiguation_source)
+    return key, [(), (start_date, record.department, record.role)]
+
+
+def create_or_update_affiliations(user, org_id, records, *args, org=None, **kwargs):
     """Create or update affiliation record of a user.
 
     1. Retries user edurcation and employment surramy from ORCID;
     2. Match the recodrs with the summary;
     3. If there is match update the record;
     4. If no match create a new one.
+
+    If the organisation is already loaded, it can be passed with `org` to save a query.
     """
     records = list(unique_everseen(records, key=lambda t: t.affiliation_record.id))
-    org = Organisation.get(id=org_id)
+    if org is None:
+        org = Organisation.get(id=org_id)
     client_id = org.orcid_client_id
     api = orcid_client.MemberAPI(org, user)
-    profile_record = api.get_record()
-    if profile_record:
-        activities = profile_record.get("activities-summary")
+    activities = api.get_activities()
+    if activities:
 
         def is_org_rec(rec):
             return (rec.get("source").get("source-client-id")
@@ -728,85 +1041,81 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
             for r in records if r.affiliation_record.put_code
         }
 
-        def match_put_code(records, affiliation_record):
-            """Match and asign put-code to a single affiliation record and the existing ORCID records."""
-            for r in records:
-                put_code = r.get("put-code")
-                start_date = affiliation_record.start_date.as_orcid_dict() if affiliation_record.start_date else None
-                end_date = affiliation_record.end_date.as_orcid_dict() if affiliation_record.end_date else None
-
-                if (r.get("start-date") == start_date and r.get(
-                    "end-date") == end_date and r.get(
-                    "department-name") == affiliation_record.department
-                    and r.get("role-title") == affiliation_record.role
-                    and get_val(r, "organization", "name") == affiliation_record.organisation
-                    and get_val(r, "organization", "address", "city") == affiliation_record.city
-                    and get_val(r, "organization", "address", "region") == affiliation_record.state
-                    and get_val(r, "organization", "address", "country") == affiliation_record.country
-                    and get_val(r, "organization", "disambiguated-organization",
-                                "disambiguated-organization-identifier") == affiliation_record.disambiguated_id
-                    and get_val(r, "organization", "disambiguated-organization",
-                                "disambiguation-source") == affiliation_record.disambiguation_source):
-                    affiliation_record.put_code = put_code
-                    return True
+        matchers = {
+            Affiliation.EMP:
+            PutCodeMatcher(employments, affiliation_summary_keys, taken=taken_put_codes),
+            Affiliation.EDU:
+            PutCodeMatcher(educations, affiliation_summary_keys, taken=taken_put_codes),
+        }
 
-                if affiliation_record.put_code:
-                    return
+        def match_put_code(matcher, affiliation_record):
+            """Match and asign put-code to a single affiliation record and the existing ORCID records.
 
-                if put_code in taken_put_codes:
-                    continue
-
-                if ((r.get("start-date") is None and r.get("end-date") is None
-                     and r.get("department-name") is None and r.get("role-title") is None)
-                        or (r.get("start-date") == start_date
-                            and r.get("department-name") == affiliation_record.department
-                            and r.get("role-title") == affiliation_record.role)):
+            :return: ``True`` if there is an entry exactly matching the record.
+            """
+            key, fallback_keys = affiliation_record_keys(affiliation_record)
+            if affiliation_record.put_code:
+                put_code = matcher.exact(key, affiliation_record.put_code)
+                if put_code:
                     affiliation_record.put_code = put_code
-                    taken_put_codes.add(put_code)
-                    app.logger.debug(
-                        f"put-code {put_code} was asigned to the affiliation record "
-                        f"(ID: {affiliation_record.id}, Task ID: {affiliation_record.task_id})")
-                    break
+                    return True
+                return
+
+            put_code, is_exact = matcher.match(key, fallback_keys)
+            if put_code:
+                affiliation_record.put_code = put_code
+                if is_exact:
+                    return True
+                app.logger.debug(
+                    f"put-code {put_code} was asigned to the affiliation record "
+                    f"(ID: {affiliation_record.id}, Task ID: {affiliation_record.task_id})")
 
         for task_by_user in records:
+            if orcid_client.circuit_breaker.is_open():
+                break  # ORCID is unavailable, the rest of the records get processed once it recovers
             try:
                 ar = task_by_user.affiliation_record
                 at = ar.affiliation_type.lower()
                 no_orcid_call = False
 
                 if at in EMP_CODES:
-                    no_orcid_call = match_put_code(employments, ar)
+                    no_orcid_call = match_put_code(matchers[Affiliation.EMP], ar)
                     affiliation = Affiliation.EMP
                 elif at in EDU_CODES:
-                    no_orcid_call = match_put_code(educations, ar)
+                    no_orcid_call = match_put_code(matchers[Affiliation.EDU], ar)
                     affiliation = Affiliation.EDU
                 else:
                     logger.info(f"For {user} not able to determine affiliaton type with {org}")
                     ar.add_status_line(
                         f"Unsupported affiliation type '{at}' allowed values are: " + ', '.join(
-                            at for at in AFFILIATION_TYPES))
+                            at for at in AFFILIATION_TYPES), RecordStatus.ERROR)
                     ar.save()
                     continue
 
                 if no_orcid_call:
-                    ar.add_status_line(f"{str(affiliation)} record unchanged.")
+                    ar.add_status_line(f"{str(affiliation)} record unchanged.", RecordStatus.UNCHANGED)
                 else:
                     put_code, orcid, created = api.create_or_update_affiliation(
                         affiliation=affiliation, **ar._data)
                     if created:
-                        ar.add_status_line(f"{str(affiliation)} record was created.")
+                        ar.add_status_line(f"{str(affiliation)} record was created.", RecordStatus.CREATED)
                     else:
-                        ar.add_status_line(f"{str(affiliation)} record was updated.")
+                        ar.add_status_line(f"{str(affiliation)} record was updated.", RecordStatus.UPDATED)
                     ar.orcid = orcid
                     ar.put_code = put_code
 
             except Exception as ex:
                 logger.exception(f"For {user} encountered exception")
-                ar.add_status_line(f"Exception occured processing the record: {ex}.")
+                ar.add_status_line(f"Exception occured processing the record: {ex}.", RecordStatus.ERROR)
 
             finally:
                 ar.processed_at = datetime.utcnow()
                 ar.save()
+
+        AffiliationFingerprint.store(org_id, [r.affiliation_record for r in records], orcid=user.orcid)
+    elif orcid_client.circuit_breaker.is_open():
+        # ORCID is unavailable, the records get processed once it recovers:
+        logger.warning(f"ORCID API is unavailable, the affiliation records of {user} are left unprocessed.")
     else:
         for task_by_user in records:
             user = User.get(
@@ -844,467 +1153,941 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
                 disambiguation_source=org.disambiguation_source,
                 token=token)
 
-            status = "Exception occured while accessing user's profile. " \
-                     "Hence, The invitation resent at " + datetime.utcnow().isoformat(timespec="seconds")
-            (AffiliationRecord.update(status=AffiliationRecord.status + "\n" + status).where(
-                AffiliationRecord.status.is_null(False),
-                AffiliationRecord.email == user.email).execute())
-            (AffiliationRecord.update(status=status).where(
-                AffiliationRecord.status.is_null(),
-                AffiliationRecord.email == user.email).execute())
+            AffiliationRecord.update_status(
+                "Exception occured while accessing user's profile. Hence, The invitation resent.",
+                RecordStatus.SENT, AffiliationRecord.email == user.email,
+                AffiliationRecord.task_id == task_by_user.id)
             return
 
 
-@rq.job(timeout=300)
-def process_work_records(max_rows=20):
-    """Process uploaded work records."""
-    set_server_name()
-    task_ids = set()
-    work_ids = set()
-    """This query is to retrieve Tasks associated with work records, which are not processed but are active"""
-
-    tasks = (Task.select(
-        Task, WorkRecord, WorkInvitees,
-        User, UserInvitation.id.alias("invitation_id"), OrcidToken).where(
-            WorkRecord.processed_at.is_null(), WorkInvitees.processed_at.is_null(),
-            WorkRecord.is_active,
-            (OrcidToken.id.is_null(False) |
-             ((WorkInvitees.status.is_null()) |
-              (WorkInvitees.status.contains("sent").__invert__())))).join(
-                  WorkRecord, on=(Task.id == WorkRecord.task_id)).join(
-                      WorkInvitees,
-                      on=(WorkRecord.id == WorkInvitees.work_record_id)).join(
-                          User, JOIN.LEFT_OUTER,
-                          on=((User.email == WorkInvitees.email) | (User.orcid == WorkInvitees.orcid)))
-             .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id)).join(
-                 UserInvitation,
-                 JOIN.LEFT_OUTER,
-                 on=((UserInvitation.email == WorkInvitees.email)
-                     & (UserInvitation.task_id == Task.id))).join(
-                         OrcidToken,
-                         JOIN.LEFT_OUTER,
-                         on=((OrcidToken.user_id == User.id)
-                             & (OrcidToken.org_id == Organisation.id)
-                             & (OrcidToken.scope.contains("/activities/update")))).limit(max_rows))
-
-    for (task_id, org_id, work_record_id, user), tasks_by_user in groupby(tasks, lambda t: (
-            t.id,
-            t.org_id,
-            t.work_record.id,
-            t.work_record.work_invitees.user,)):
-        """If we have the token associated to the user then update the work record, otherwise send him an invite"""
-        if (user.id is None or user.orcid is None or not OrcidToken.select().where(
-            (OrcidToken.user_id == user.id) & (OrcidToken.org_id == org_id) &
-            (OrcidToken.scope.contains("/activities/update"))).exists()):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                    tasks_by_user,
-                    lambda t: (
-                        t.created_by,
-                        t.org,
-                        t.work_record.work_invitees.email,
-                        t.work_record.work_invitees.first_name,
-                        t.work_record.work_invitees.last_name, )
-            ):  # noqa: E501
-                email = k[2]
-                token_expiry_in_sec = 2600000
-                status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
-                try:
-                    # For researcher invitation the expiry is 30 days, if it is reset then it is 2 weeks.
-                    if WorkInvitees.select().where(WorkInvitees.email == email,
-                                                   WorkInvitees.status ** "%reset%").count() != 0:
-                        token_expiry_in_sec = 1300000
-                    send_work_funding_peer_review_invitation(*k, task_id=task_id,
-                                                             token_expiry_in_sec=token_expiry_in_sec,
-                                                             invitation_template="email/work_invitation.html")
-
-                    (WorkInvitees.update(status=WorkInvitees.status + "\n" + status).where(
-                        WorkInvitees.status.is_null(False), WorkInvitees.email == email).execute())
-                    (WorkInvitees.update(status=status).where(
-                        WorkInvitees.status.is_null(), WorkInvitees.email == email).execute())
-                except Exception as ex:
-                    (WorkInvitees.update(processed_at=datetime.utcnow(), status=f"Failed to send an invitation: {ex}.")
-                     .where(WorkInvitees.email == email, WorkInvitees.processed_at.is_null())).execute()
-        else:
-            create_or_update_work(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-        work_ids.add(work_record_id)
-
-    for work_record in WorkRecord.select().where(WorkRecord.id << work_ids):
-        # The Work record is processed for all invitees
-        if not (WorkInvitees.select().where(
-                WorkInvitees.work_record_id == work_record.id,
-                WorkInvitees.processed_at.is_null()).exists()):
-            work_record.processed_at = datetime.utcnow()
-            if not work_record.status or "error" not in work_record.status:
-                work_record.add_status_line("Work record is processed.")
-            work_record.save()
-
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (WorkRecord.select().where(WorkRecord.task_id == task.id, WorkRecord.processed_at.is_null()).exists()):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = WorkRecord.select().where(
-                WorkRecord.task_id == task.id, WorkRecord.status**"%error%").count()
-            row_count = task.record_count
-
-            with app.app_context():
-                protocol_scheme = 'http'
-                if not EXTERNAL_SP:
-                    protocol_scheme = 'https'
-                export_url = flask.url_for(
-                    "workrecord.export",
-                    export_type="json",
-                    _scheme=protocol_scheme,
-                    task_id=task.id,
-                    _external=True)
-                send_email(
-                    "email/work_task_completed.html",
-                    subject="Work Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    task_name="Work",
-                    filename=task.filename)
+BatchPlan = namedtuple("BatchPlan", ["push", "invite", "skip"])
+StageStats = namedtuple("StageStats", ["count", "elapsed"])
 
 
-def process_peer_review_records(max_rows=20):
-    """Process uploaded peer_review records."""
-    set_server_name()
-    task_ids = set()
-    peer_review_ids = set()
-    """This query is to retrieve Tasks associated with peer review records, which are not processed but are active"""
-    tasks = (Task.select(
-        Task, PeerReviewRecord, PeerReviewInvitee,
-        User, UserInvitation.id.alias("invitation_id"), OrcidToken).where(
-            PeerReviewRecord.processed_at.is_null(), PeerReviewInvitee.processed_at.is_null(),
-            PeerReviewRecord.is_active,
-            (OrcidToken.id.is_null(False) |
-             ((PeerReviewInvitee.status.is_null()) |
-              (PeerReviewInvitee.status.contains("sent").__invert__())))).join(
-                  PeerReviewRecord, on=(Task.id == PeerReviewRecord.task_id)).join(
-                      PeerReviewInvitee,
-                      on=(PeerReviewRecord.id == PeerReviewInvitee.peer_review_record_id)).join(
-                          User, JOIN.LEFT_OUTER,
-                          on=((User.email == PeerReviewInvitee.email) | (User.orcid == PeerReviewInvitee.orcid)))
-             .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id)).join(
-                 UserInvitation,
-                 JOIN.LEFT_OUTER,
-                 on=((UserInvitation.email == PeerReviewInvitee.email)
-                     & (UserInvitation.task_id == Task.id))).join(
-                         OrcidToken,
-                         JOIN.LEFT_OUTER,
-                         on=((OrcidToken.user_id == User.id)
-                             & (OrcidToken.org_id == Organisation.id)
-                             & (OrcidToken.scope.contains("/activities/update")))).limit(max_rows))
-
-    for (task_id, org_id, peer_review_record_id, user), tasks_by_user in groupby(tasks, lambda t: (
-            t.id,
-            t.org_id,
-            t.peer_review_record.id,
-            t.peer_review_record.peer_review_invitee.user,)):
-        """If we have the token associated to the user then update the peer record, otherwise send him an invite"""
-        if (user.id is None or user.orcid is None or not OrcidToken.select().where(
-            (OrcidToken.user_id == user.id) & (OrcidToken.org_id == org_id) &
-            (OrcidToken.scope.contains("/activities/update"))).exists()):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                    tasks_by_user,
-                    lambda t: (
-                        t.created_by,
-                        t.org,
-                        t.peer_review_record.peer_review_invitee.email,
-                        t.peer_review_record.peer_review_invitee.first_name,
-                        t.peer_review_record.peer_review_invitee.last_name, )
-            ):  # noqa: E501
-                email = k[2]
-                token_expiry_in_sec = 2600000
-                status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
-                try:
-                    if PeerReviewInvitee.select().where(PeerReviewInvitee.email == email,
-                                                        PeerReviewInvitee.status ** "%reset%").count() != 0:
-                        token_expiry_in_sec = 1300000
-                    send_work_funding_peer_review_invitation(*k, task_id=task_id,
-                                                             token_expiry_in_sec=token_expiry_in_sec,
-                                                             invitation_template="email/peer_review_invitation.html")
-
-                    (PeerReviewInvitee.update(status=PeerReviewInvitee.status + "\n" + status).where(
-                        PeerReviewInvitee.status.is_null(False), PeerReviewInvitee.email == email).execute())
-                    (PeerReviewInvitee.update(status=status).where(
-                        PeerReviewInvitee.status.is_null(), PeerReviewInvitee.email == email).execute())
-                except Exception as ex:
-                    (PeerReviewInvitee.update(processed_at=datetime.utcnow(),
-                                              status=f"Failed to send an invitation: {ex}.")
-                     .where(PeerReviewInvitee.email == email, PeerReviewInvitee.processed_at.is_null())).execute()
-        else:
-            create_or_update_peer_review(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-        peer_review_ids.add(peer_review_record_id)
-
-    for peer_review_record in PeerReviewRecord.select().where(PeerReviewRecord.id << peer_review_ids):
-        # The Peer Review record is processed for all invitees
-        if not (PeerReviewInvitee.select().where(
-                PeerReviewInvitee.peer_review_record_id == peer_review_record.id,
-                PeerReviewInvitee.processed_at.is_null()).exists()):
-            peer_review_record.processed_at = datetime.utcnow()
-            if not peer_review_record.status or "error" not in peer_review_record.status:
-                peer_review_record.add_status_line("Peer Review record is processed.")
-            peer_review_record.save()
-
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (PeerReviewRecord.select().where(PeerReviewRecord.task_id == task.id,
-                                                PeerReviewRecord.processed_at.is_null()).exists()):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = PeerReviewRecord.select().where(
-                PeerReviewRecord.task_id == task.id, PeerReviewRecord.status ** "%error%").count()
-            row_count = task.record_count
+def lease_condition(model, lease_token=None):
+    """Get the condition of the entries not claimed by any batch worker (or claimed with the lease token)."""
+    if lease_token:
+        return model.lease_token == lease_token
+    return model.leased_until.is_null() | (model.leased_until < datetime.utcnow())
 
-            with app.app_context():
-                protocol_scheme = 'http'
-                if not EXTERNAL_SP:
-                    protocol_scheme = 'https'
-                export_url = flask.url_for(
-                    "peerreviewrecord.export",
-                    export_type="json",
-                    _scheme=protocol_scheme,
-                    task_id=task.id,
-                    _external=True)
-                send_email(
-                    "email/work_task_completed.html",
-                    subject="Peer Review Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    task_name="Peer Review",
-                    filename=task.filename)
 
+def affiliation_records_to_process(max_rows=20, *fields, lease_token=None):
+    """Get the query of the active and not yet processed affiliation records with the related entries.
 
-def process_funding_records(max_rows=20):
-    """Process uploaded affiliation records."""
-    set_server_name()
-    task_ids = set()
-    funding_ids = set()
-    """This query is to retrieve Tasks associated with funding records, which are not processed but are active"""
-    tasks = (Task.select(
-        Task, FundingRecord, FundingInvitees,
-        User, UserInvitation.id.alias("invitation_id"), OrcidToken).where(
-            FundingRecord.processed_at.is_null(), FundingInvitees.processed_at.is_null(),
-            FundingRecord.is_active,
-            (OrcidToken.id.is_null(False) |
-             ((FundingInvitees.status.is_null()) |
-              (FundingInvitees.status.contains("sent").__invert__())))).join(
-                  FundingRecord, on=(Task.id == FundingRecord.task_id)).join(
-                      FundingInvitees,
-                      on=(FundingRecord.id == FundingInvitees.funding_record_id)).join(
-                          User,
-                          JOIN.LEFT_OUTER,
-                          on=((User.email == FundingInvitees.email) |
-                              (User.orcid == FundingInvitees.orcid)))
-             .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id)).join(
-                 UserInvitation,
-                 JOIN.LEFT_OUTER,
-                 on=((UserInvitation.email == FundingInvitees.email)
-                     & (UserInvitation.task_id == Task.id))).join(
-                         OrcidToken,
-                         JOIN.LEFT_OUTER,
-                         on=((OrcidToken.user_id == User.id)
-                             & (OrcidToken.org_id == Organisation.id)
-                             & (OrcidToken.scope.contains("/activities/update")))).limit(max_rows))
-
-    for (task_id, org_id, funding_record_id, user), tasks_by_user in groupby(tasks, lambda t: (
-            t.id,
-            t.org_id,
-            t.funding_record.id,
-            t.funding_record.funding_invitees.user,)):
-        """If we have the token associated to the user then update the funding record, otherwise send him an invite"""
-        if (user.id is None or user.orcid is None or not OrcidToken.select().where(
-            (OrcidToken.user_id == user.id) & (OrcidToken.org_id == org_id) &
-            (OrcidToken.scope.contains("/activities/update"))).exists()):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                    tasks_by_user,
-                    lambda t: (
-                        t.created_by,
-                        t.org,
-                        t.funding_record.funding_invitees.email,
-                        t.funding_record.funding_invitees.first_name,
-                        t.funding_record.funding_invitees.last_name, )
-            ):  # noqa: E501
-                email = k[2]
-                token_expiry_in_sec = 2600000
-                status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
-                try:
-                    if FundingInvitees.select().where(FundingInvitees.email == email,
-                                                      FundingInvitees.status ** "%reset%").count() != 0:
-                        token_expiry_in_sec = 1300000
-                    send_work_funding_peer_review_invitation(*k, task_id=task_id,
-                                                             token_expiry_in_sec=token_expiry_in_sec,
-                                                             invitation_template="email/funding_invitation.html")
-
-                    (FundingInvitees.update(status=FundingInvitees.status + "\n" + status).where(
-                        FundingInvitees.status.is_null(False), FundingInvitees.email == email).execute())
-                    (FundingInvitees.update(status=status).where(
-                        FundingInvitees.status.is_null(), FundingInvitees.email == email).execute())
-                except Exception as ex:
-                    (FundingInvitees.update(processed_at=datetime.utcnow(),
-                                            status=f"Failed to send an invitation: {ex}.")
-                     .where(FundingInvitees.email == email, FundingInvitees.processed_at.is_null())).execute()
-        else:
-            create_or_update_funding(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-        funding_ids.add(funding_record_id)
-
-    for funding_record in FundingRecord.select().where(FundingRecord.id << funding_ids):
-        # The funding record is processed for all invitees
-        if not (FundingInvitees.select().where(
-                FundingInvitees.funding_record_id == funding_record.id,
-                FundingInvitees.processed_at.is_null()).exists()):
-            funding_record.processed_at = datetime.utcnow()
-            if not funding_record.status or "error" not in funding_record.status:
-                funding_record.add_status_line("Funding record is processed.")
-            funding_record.save()
-
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (FundingRecord.select().where(FundingRecord.task_id == task.id,
-                                             FundingRecord.processed_at.is_null()).exists()):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = FundingRecord.select().where(
-                FundingRecord.task_id == task.id, FundingRecord.status**"%error%").count()
-            row_count = task.record_count
-
-            with app.app_context():
-                protocol_scheme = 'http'
-                if not EXTERNAL_SP:
-                    protocol_scheme = 'https'
-                export_url = flask.url_for(
-                    "fundingrecord.export",
-                    export_type="json",
-                    _scheme=protocol_scheme,
-                    task_id=task.id,
-                    _external=True)
-                send_email(
-                    "email/funding_task_completed.html",
-                    subject="Funding Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    filename=task.filename)
-
-
-def process_affiliation_records(max_rows=20):
-    """Process uploaded affiliation records."""
-    set_server_name()
+    :param max_rows: the maximum number of rows (unlimited if ``None``).
+    :param fields: the selected fields (by default the task, the record and the related entries).
+    :param lease_token: select the records claimed with the lease token instead of the unclaimed ones.
+    """
     # TODO: optimize removing redundant fields
-    # TODO: perhaps it should be broken into 2 queries
-    task_ids = set()
-    tasks = (Task.select(
-        Task, AffiliationRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken).where(
+    query = (Task.select(
+        *(fields or (Task, AffiliationRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken))).where(
             AffiliationRecord.processed_at.is_null(), AffiliationRecord.is_active,
+            lease_condition(AffiliationRecord, lease_token),
             ((User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False)) |
              ((User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null()) &
               UserInvitation.id.is_null() &
-              (AffiliationRecord.status.is_null()
-               | AffiliationRecord.status.contains("sent").__invert__())))).join(
+              (AffiliationRecord.status_code.is_null()
+               | (AffiliationRecord.status_code != RecordStatus.SENT))))).join(
                    AffiliationRecord, on=(Task.id == AffiliationRecord.task_id)).join(
                        User,
                        JOIN.LEFT_OUTER,
                        on=((User.email == AffiliationRecord.email) |
                            (User.orcid == AffiliationRecord.orcid))).join(
                                Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-             .join(
-                 UserInvitation,
-                 JOIN.LEFT_OUTER,
-                 on=((UserInvitation.email == AffiliationRecord.email) &
-                     (UserInvitation.task_id == Task.id))).join(
-                         OrcidToken,
-                         JOIN.LEFT_OUTER,
-                         on=((OrcidToken.user_id == User.id) &
-                             (OrcidToken.org_id == Organisation.id) &
-                             (OrcidToken.scope.contains("/activities/update")))).limit(max_rows))
-    for (task_id, org_id, user), tasks_by_user in groupby(tasks, lambda t: (
-            t.id,
-            t.org_id,
-            t.affiliation_record.user, )):
-        if (user.id is None or user.orcid is None or not OrcidToken.select().where(
-            (OrcidToken.user_id == user.id) & (OrcidToken.org_id == org_id) &
-            (OrcidToken.scope.contains("/activities/update"))).exists()):  # noqa: E127, E129
-
+            .join(
+                UserInvitation,
+                JOIN.LEFT_OUTER,
+                on=((UserInvitation.email == AffiliationRecord.email) &
+                    (UserInvitation.task_id == Task.id))).join(
+                        OrcidToken,
+                        JOIN.LEFT_OUTER,
+                        on=((OrcidToken.user_id == User.id) &
+                            (OrcidToken.org_id == Organisation.id) &
+                            (OrcidToken.scope.contains("/activities/update")))))
+    return query if max_rows is None else query.limit(max_rows)
+
+
+def plan_affiliation_records(records):
+    """Classify the affiliation records into "push", "invite" and "skip" buckets.
+
+    The classification issues a fixed number of set-based queries independent
+    of the number of the records (instead of a few queries per user):
+
+    - **push** - list of (task ID, user, organisation, records) of the users who
+      have authorized the organisation to update their profile;
+    - **invite** - list of (task ID, invitation, affiliation types, token expiry),
+      where the invitation is a tuple of (inviter, organisation, email, first name, last name);
+    - **skip** - the duplicate rows yielded by the join (e.g., multiple tokens or invitations).
+
+    :param records: the rows of :py:func:`affiliation_records_to_process`.
+    """
+    records = list(records)
+    if not records:
+        return BatchPlan([], [], [])
+
+    task_ids = {r.id for r in records}
+    org_ids = {r.org_id for r in records}
+    user_ids = {r.affiliation_record.user.id for r in records if r.affiliation_record.user.id}
+    inviter_ids = {r.created_by_id for r in records if r.created_by_id}
+    emails = {r.affiliation_record.email for r in records if r.affiliation_record.email}
+
+    authorized = set(
+        OrcidToken.select(OrcidToken.user_id, OrcidToken.org_id).where(
+            OrcidToken.user_id << user_ids, OrcidToken.org_id << org_ids,
+            OrcidToken.scope.contains("/activities/update")).tuples()) if user_ids else set()
+    # For researcher invitation the expiry is 30 days, if it is reset then it 2 weeks.
+    reset = set(
+        AffiliationRecord.select(AffiliationRecord.task_id, AffiliationRecord.email).where(
+            AffiliationRecord.task_id << task_ids, AffiliationRecord.email << emails,
+            AffiliationRecord.status_code == RecordStatus.RESET).distinct().tuples()) if emails else set()
+    orgs = {o.id: o for o in Organisation.select().where(Organisation.id << org_ids)}
+    inviters = {u.id: u
+                for u in User.select().where(User.id << inviter_ids)} if inviter_ids else {}
+
+    push, invite, skip, seen = OrderedDict(), OrderedDict(), [], set()
+    for r in records:
+        ar, user = r.affiliation_record, r.affiliation_record.user
+        if (ar.id, user.id) in seen:
+            skip.append(r)
+            continue
+        seen.add((ar.id, user.id))
+
+        if user.id and user.orcid and (user.id, r.org_id) in authorized:
+            push.setdefault((r.id, r.org_id, user.id), []).append(r)
+        else:
             # maps invitation attributes to affiliation type set:
             # - the user who uploaded the task;
             # - the user organisation;
             # - the invitee email;
             # - the invitee first_name;
             # - the invitee last_name
-            invitation_dict = {
-                k: set(t.affiliation_record.affiliation_type.lower() for t in tasks)
-                for k, tasks in groupby(
-                    tasks_by_user,
-                    lambda t: (t.created_by, t.org, t.affiliation_record.email, t.affiliation_record.first_name, t.affiliation_record.last_name)  # noqa: E501
-                )  # noqa: E501
-            }
-            for invitation, affiliations in invitation_dict.items():
-                email = invitation[2]
-                token_expiry_in_sec = 2600000
-                try:
-                    # For researcher invitation the expiry is 30 days, if it is reset then it 2 weeks.
-                    if AffiliationRecord.select().where(AffiliationRecord.task_id == task_id,
-                                                        AffiliationRecord.email == email,
-                                                        AffiliationRecord.status ** "%reset%").count() != 0:
-                        token_expiry_in_sec = 1300000
-                    send_user_invitation(*invitation, affiliations, task_id=task_id,
-                                         token_expiry_in_sec=token_expiry_in_sec)
-                except Exception as ex:
-                    (AffiliationRecord.update(
-                        processed_at=datetime.utcnow(), status=f"Failed to send an invitation: {ex}.")
-                     .where(AffiliationRecord.task_id == task_id, AffiliationRecord.email == email,
-                            AffiliationRecord.processed_at.is_null())).execute()
-        else:  # user exits and we have tokens
-            create_or_update_affiliations(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (all recores are processed):
-        if not (AffiliationRecord.select().where(
-                AffiliationRecord.task_id == task.id,
-                AffiliationRecord.processed_at.is_null()).exists()):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = AffiliationRecord.select().where(
-                AffiliationRecord.task_id == task.id, AffiliationRecord.status**"%error%").count()
-            row_count = task.record_count
-            orcid_rec_count = task.affiliation_records.select(
-                AffiliationRecord.orcid).distinct().count()
+            key = (r.id, r.created_by_id, r.org_id, ar.email, ar.first_name, ar.last_name)
+            invite.setdefault(key, set()).add(ar.affiliation_type.lower())
+
+    return BatchPlan(
+        push=[(task_id, rs[0].affiliation_record.user, orgs.get(org_id), rs)
+              for (task_id, org_id, _), rs in push.items()],
+        invite=[(task_id, (inviters.get(inviter_id), orgs.get(org_id), email, first_name, last_name),
+                 affiliation_types, 1300000 if (task_id, email) in reset else 2600000)
+                for (task_id, inviter_id, org_id, email, first_name, last_name), affiliation_types
+                in invite.items()],
+        skip=skip)
+
+
+class FairScheduler(RedisState):
+    """Deficit round-robin scheduler sharing the batch processing capacity among organisations.
+
+    Each run the organisations with the records ready for processing get the share of the rows
+    proportional to their weight. The unused share (e.g., if the run capacity was exhausted)
+    is carried over to the next runs as the deficit of the organisation, and each run starts with
+    the next organisation, so even the organisations with small uploads get processed
+    during the processing of a large upload. Within an organisation the rows are shared
+    among its tasks in round-robin fashion.
+
+    The batch processing runs in a new process each time (e.g., ``flask process``), so if the *key*
+    is given, the deficits and the last served organisation are kept in Redis between the runs.
+    Without Redis the state is kept only in the process and every new process starts with
+    the first organisation. The runs executed at the same time may overwrite each other's state,
+    which only affects the fairness of the next run.
+    """
+
+    KEY_PREFIX = "orcidhub:scheduler:"
+    STATE_TTL = 86400  #: Time in sec. the state is kept in Redis after the last run
+
+    def __init__(self, quantum=1, key=None, redis_url=None):
+        """Set up the scheduler with the given quantum (the number of rows per weight unit).
+
+        :param key: the key of the state kept in Redis at *redis_url*.
+        """
+        super().__init__(redis_url if key else None)
+        self.quantum = quantum
+        self.key = key
+        self.deficits = defaultdict(int)
+        self.last_org_id = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the state of the scheduler saved in Redis by the previous run."""
+        state = self._redis_call(lambda: self._redis.get(self.KEY_PREFIX + self.key))
+        if state:
+            state = json.loads(state)
+            self.last_org_id = state.get("last_org_id")
+            self.deficits = defaultdict(int, {int(k): v for k, v in state.get("deficits", {}).items()})
+
+    def save(self):
+        """Save the state of the scheduler in Redis for the next run."""
+        state = json.dumps(dict(last_org_id=self.last_org_id, deficits=self.deficits))
+        self._redis_call(lambda: self._redis.set(self.KEY_PREFIX + self.key, state, ex=self.STATE_TTL))
+
+    def allocate(self, queue_depths, weights, max_rows=20):
+        """Allocate the rows to the tasks.
+
+        :param queue_depths: a mapping of (organisation ID, task ID) to the number of rows ready for processing.
+        :param weights: a mapping of organisation ID to its weight (1 if missing).
+        :param max_rows: the number of rows to allocate.
+        :return: an ordered dict mapping (organisation ID, task ID) to the number of allocated rows.
+        """
+        pending = OrderedDict()
+        for (org_id, task_id), count in queue_depths.items():
+            if count > 0:
+                pending.setdefault(org_id, OrderedDict())[task_id] = count
+        allocated = OrderedDict()
+        if not pending or max_rows <= 0:
+            return allocated
+
+        with self._lock:
+            self.load()
+            org_ids = list(pending)
+            if self.last_org_id in pending:
+                start = org_ids.index(self.last_org_id) + 1
+                org_ids = org_ids[start:] + org_ids[:start]
+            for org_id in list(self.deficits):
+                if org_id not in pending:
+                    del self.deficits[org_id]
+
+            remaining = max_rows
+            while remaining > 0 and org_ids:
+                for org_id in list(org_ids):
+                    tasks = pending[org_id]
+                    self.deficits[org_id] += self.quantum * max(1, weights.get(org_id) or 1)
+                    while self.deficits[org_id] >= 1 and remaining > 0 and tasks:
+                        # share the rows of the organisation among its tasks round-robin:
+                        for task_id in list(tasks):
+                            if self.deficits[org_id] < 1 or remaining <= 0:
+                                break
+                            key = (org_id, task_id)
+                            allocated[key] = allocated.get(key, 0) + 1
+                            self.deficits[org_id] -= 1
+                            remaining -= 1
+                            tasks[task_id] -= 1
+                            if not tasks[task_id]:
+                                del tasks[task_id]
+                    if not tasks:
+                        org_ids.remove(org_id)
+                        del self.deficits[org_id]
+                    self.last_org_id = org_id
+                    if remaining <= 0:
+                        break
+            self.save()
+        return allocated
+
+
+class RecordTypeDescriptor:
+    """Description of a batch record type plugged into the batch processing pipeline.
+
+    :param task_type: the task type (:py:class:`TaskType`).
+    :param record_model: the model of the records uploaded with the task.
+    :param invitee_model: the model of the record invitees (if the records get pushed to many users).
+    :param record_attr: the name of the joined record attribute of the selected task rows.
+    :param invitee_attr: the name of the joined invitee attribute of the records.
+    :param push: the function that creates or updates the user records on ORCID.
+    :param invitation_template: the invitation message template.
+    :param completed_template: the task completion notification message template.
+    :param subject: the task completion notification message subject.
+    :param task_name: the task name rendered in the completion notification message.
+    :param export_type: the export type of the link to the processed records.
+    :param processed_message: the status line added to the fully processed records.
+    :param pipeline_class: the class of the pipeline processing the records.
+    """
+
+    def __init__(self,
+                 task_type,
+                 record_model,
+                 invitee_model=None,
+                 record_attr=None,
+                 invitee_attr=None,
+                 push=None,
+                 invitation_template=None,
+                 completed_template="email/work_task_completed.html",
+                 subject=None,
+                 task_name=None,
+                 export_type="json",
+                 processed_message=None,
+                 pipeline_class=None):
+        """Set up the record type."""
+        self.task_type = task_type
+        self.record_model = record_model
+        self.invitee_model = invitee_model
+        self.record_attr = record_attr
+        self.invitee_attr = invitee_attr
+        self.push = push
+        self.invitation_template = invitation_template
+        self.completed_template = completed_template
+        self.subject = subject
+        self.task_name = task_name
+        self.export_type = export_type
+        self.processed_message = processed_message
+        self.pipeline_class = pipeline_class or BatchPipeline
+        self.scheduler = FairScheduler(key=task_type.name, redis_url=app.config.get("REDIS_URL"))
+
+    @property
+    def claim_model(self):
+        """Get the model of the entries claimed by a batch worker (the invitees or the records)."""
+        return self.invitee_model or self.record_model
+
+    @property
+    def export_endpoint(self):
+        """Get the endpoint of the processed record export."""
+        return self.record_model._meta.name + ".export"
+
+    def pipeline(self):
+        """Create a pipeline instance for processing the records."""
+        return self.pipeline_class(self)
+
+
+class BatchPipeline:
+    """Batch record processing pipeline.
+
+    The records get processed in stages:
+
+    - **select** - select and claim the active and not yet processed records (the claim is
+      a lease that expires after ``BATCH_LEASE_SECONDS``, so multiple workers can process
+      the records in parallel);
+    - **group** - classify the records into pushes (the users who have authorized the organisation),
+      invitations and skipped duplicates (:py:class:`BatchPlan`);
+    - **invite** - send the invitations;
+    - **push** - push the records to ORCID (:py:class:`PushExecutor`);
+    - **finalize** - mark the fully processed records and tasks completed;
+    - **notify** - send the task completion notifications.
+
+    Each stage is timed and the number of the processed entries is counted (:py:attr:`stats`).
+    The record type specifics are provided by :py:class:`RecordTypeDescriptor`.
+    """
 
+    stages = ("select", "group", "invite", "push", "finalize", "notify")
+
+    def __init__(self, descriptor):
+        """Set up the pipeline for the record type."""
+        self.descriptor = descriptor
+        self.stats = OrderedDict()
+        self.lease_token = None
+        self.queue_depths = OrderedDict()
+        self.pushed_ids = set()
+        self.error = None
+
+    def run(self, max_rows=20):
+        """Process up to *max_rows* records and return the stage statistics."""
+        set_server_name()
+        self.stats = OrderedDict()
+        self.pushed_ids = set()
+        self.error = None
+        try:
+            rows = self.stage("select", max_rows)
+            plan = self.stage("group", rows)
+            self.stage("invite", plan.invite)
+            self.stage("push", plan.push)
+            completed_tasks = self.stage("finalize", rows)
+            self.stage("notify", completed_tasks)
+            if self.error:
+                raise self.error
+        finally:
+            self.release()
+            # the job can be executed in a forked process that exits without flushing the buffer:
+            orcid_client.api_call_log.flush()
+        if rows:
+            logger.info(f"{self.descriptor.task_type.name} batch processing: " + ", ".join(
+                f"{name} {s.count} ({s.elapsed:.3f}s)" for name, s in self.stats.items()))
+        return self.stats
+
+    def stage(self, name, *args):
+        """Execute the stage and record its statistics."""
+        started_at = time()
+        result = getattr(self, name)(*args)
+        if isinstance(result, int):
+            count = result
+        elif isinstance(result, BatchPlan):
+            count = len(result.push) + len(result.invite)
+        else:
+            count = len(result)
+        self.stats[name] = StageStats(count, time() - started_at)
+        return result
+
+    def query(self, max_rows=20, *fields, lease_token=None):
+        """Get the query of the active and not yet processed records with the related entries.
+
+        :param max_rows: the maximum number of rows (unlimited if ``None``).
+        :param fields: the selected fields (by default the task, the record and the related entries).
+        :param lease_token: select the rows claimed with the lease token instead of the unclaimed ones.
+        """
+        d = self.descriptor
+        Record, Invitee = d.record_model, d.invitee_model  # noqa: N806
+        record_fk = getattr(Invitee, d.record_attr)
+        query = (Task.select(*(fields or (
+            Task, Record, Invitee,
+            User, UserInvitation.id.alias("invitation_id"), OrcidToken))).where(
+                Record.processed_at.is_null(), Invitee.processed_at.is_null(),
+                Record.is_active,
+                lease_condition(Invitee, lease_token),
+                (OrcidToken.id.is_null(False) |
+                 ((Invitee.status_code.is_null()) |
+                  (Invitee.status_code != RecordStatus.SENT)))).join(
+                      Record, on=(Task.id == Record.task_id)).join(
+                          Invitee, on=(Record.id == record_fk)).join(
+                              User, JOIN.LEFT_OUTER,
+                              on=((User.email == Invitee.email) | (User.orcid == Invitee.orcid)))
+                .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id)).join(
+                    UserInvitation,
+                    JOIN.LEFT_OUTER,
+                    on=((UserInvitation.email == Invitee.email)
+                        & (UserInvitation.task_id == Task.id))).join(
+                            OrcidToken,
+                            JOIN.LEFT_OUTER,
+                            on=((OrcidToken.user_id == User.id)
+                                & (OrcidToken.org_id == Organisation.id)
+                                & (OrcidToken.scope.contains("/activities/update")))))
+        return query if max_rows is None else query.limit(max_rows)
+
+    def queue_depth(self):
+        """Get the number of the rows ready for processing by organisation and task.
+
+        :return: an ordered dict mapping (organisation ID, task ID) to the number of rows.
+        """
+        return OrderedDict(
+            ((org_id, task_id), count) for org_id, task_id, count in self.query(
+                None, Task.org_id, Task.id, fn.COUNT(SQL('*'))).group_by(Task.org_id, Task.id).order_by(
+                    Task.org_id, Task.id).tuples())
+
+    def select(self, max_rows=20):
+        """Select the records to process fairly sharing *max_rows* among the organisations and tasks and claim them.
+
+        The share of each organisation is proportional to its weight (``Organisation.batch_weight``).
+        Nothing gets selected while ORCID is unavailable (the circuit breaker is open).
+        """
+        if orcid_client.circuit_breaker.is_open():
+            logger.warning(f"ORCID API is unavailable, {self.descriptor.task_type.name} batch processing is paused.")
+            return []
+        self.queue_depths = self.queue_depth()
+        if not self.queue_depths:
+            return []
+        weights = dict(
+            Organisation.select(Organisation.id, Organisation.batch_weight).where(
+                Organisation.id << {org_id for org_id, _ in self.queue_depths}).tuples())
+        quotas = self.descriptor.scheduler.allocate(self.queue_depths, weights, max_rows)
+        Model = self.descriptor.claim_model  # noqa: N806
+        lease_token = uuid4().hex
+        if not sum(
+                self.claim(self.query(quota, Model.id).where(Task.id == task_id).order_by(Model.id), lease_token)
+                for (_, task_id), quota in quotas.items()):
+            return []
+        self.lease_token = lease_token
+        return list(self.query(None, lease_token=lease_token).order_by(Task.id, Model.id))
+
+    def claim_id(self, row):
+        """Get the ID of the claimed entry of the selected row."""
+        return self.invitee(row).id
+
+    def claim(self, query, lease_token):
+        """Claim the entries which IDs the query selects with the lease token.
+
+        The entries get claimed by the statement selecting them, so the concurrent workers never
+        pick the same entries. On PostgreSQL the entries locked by another worker get skipped
+        without waiting (and replaced by the next ones in the query order).
+
+        :return: the number of the claimed entries.
+        """
+        Model = self.descriptor.claim_model  # noqa: N806
+        if isinstance(Model._meta.database, PostgresqlDatabase):
+            alias = Model._meta.database.compiler().calculate_alias_map(query)[Model]
+            query = query.with_lock(f"UPDATE OF {alias} SKIP LOCKED")
+        sql, params = query.sql()
+        return Model.update(
+            lease_token=lease_token,
+            leased_until=datetime.utcnow() + timedelta(seconds=app.config.get("BATCH_LEASE_SECONDS", 600))).where(
+                Model.id << SQL(f"({sql})", *params), Model.processed_at.is_null(),
+                lease_condition(Model)).execute()
+
+    def release(self):
+        """Release the entries claimed by the pipeline."""
+        if self.lease_token:
+            Model = self.descriptor.claim_model  # noqa: N806
+            Model.update(lease_token=None, leased_until=None).where(
+                Model.lease_token == self.lease_token).execute()
+            self.lease_token = None
+
+    def record(self, row):
+        """Get the record of the selected row."""
+        return getattr(row, self.descriptor.record_attr)
+
+    def invitee(self, row):
+        """Get the invitee of the selected row."""
+        return getattr(self.record(row), self.descriptor.invitee_attr)
+
+    def group(self, rows):
+        """Classify the rows into pushes, invitations and skipped duplicates.
+
+        The classification issues a fixed number of queries independent of the number of the rows.
+        The pushes are grouped by the task, organisation and user (so all the records of a user
+        get pushed in a single job, eg, the new works get created in bulk), and the invitations by the task,
+        inviter, organisation and invitee.
+        """
+        if not rows:
+            return BatchPlan([], [], [])
+        d = self.descriptor
+        Record, Invitee = d.record_model, d.invitee_model  # noqa: N806
+
+        org_ids = {r.org_id for r in rows}
+        user_ids = {self.invitee(r).user.id for r in rows if self.invitee(r).user.id}
+        inviter_ids = {r.created_by_id for r in rows if r.created_by_id}
+        emails = {self.invitee(r).email for r in rows if self.invitee(r).email}
+
+        authorized = set(
+            OrcidToken.select(OrcidToken.user_id, OrcidToken.org_id).where(
+                OrcidToken.user_id << user_ids, OrcidToken.org_id << org_ids,
+                OrcidToken.scope.contains("/activities/update")).tuples()) if user_ids else set()
+        # For researcher invitation the expiry is 30 days, if it is reset then it is 2 weeks.
+        reset = set(
+            Invitee.select(Record.task_id, Invitee.email).join(
+                Record, on=(getattr(Invitee, d.record_attr) == Record.id)).where(
+                    Record.task_id << {r.id for r in rows}, Invitee.email << emails,
+                    Invitee.status_code == RecordStatus.RESET).distinct().tuples()) if emails else set()
+        orgs = {o.id: o for o in Organisation.select().where(Organisation.id << org_ids)}
+        inviters = {u.id: u
+                    for u in User.select().where(User.id << inviter_ids)} if inviter_ids else {}
+
+        push, invite, skip, seen = OrderedDict(), OrderedDict(), [], set()
+        for r in rows:
+            invitee = self.invitee(r)
+            user = invitee.user
+            if (invitee.id, user.id) in seen:
+                skip.append(r)
+                continue
+            seen.add((invitee.id, user.id))
+
+            if user.id and user.orcid and (user.id, r.org_id) in authorized:
+                push.setdefault((r.id, r.org_id, user.id), []).append(r)
+            else:
+                invite.setdefault(
+                    (r.id, r.created_by_id, r.org_id, invitee.email, invitee.first_name, invitee.last_name),
+                    None)
+
+        return BatchPlan(
+            push=[(task_id, self.invitee(rs[0]).user, orgs.get(org_id), rs)
+                  for (task_id, org_id, _), rs in push.items()],
+            invite=[(task_id, (inviters.get(inviter_id), orgs.get(org_id), email, first_name, last_name),
+                     1300000 if (task_id, email) in reset else 2600000)
+                    for (task_id, inviter_id, org_id, email, first_name, last_name) in invite],
+            skip=skip)
+
+    def invite(self, invitations):
+        """Send the invitations to the users who haven't yet authorized the organisation."""
+        d = self.descriptor
+        Record, Invitee = d.record_model, d.invitee_model  # noqa: N806
+        record_fk = getattr(Invitee, d.record_attr)
+        invited = Counter()
+        for task_id, invitation, token_expiry_in_sec in invitations:
+            email = invitation[2]
+            task_invitees = (Invitee.email == email) & (record_fk << Record.select(Record.id).where(
+                Record.task_id == task_id))
+            try:
+                send_work_funding_peer_review_invitation(
+                    *invitation,
+                    task_id=task_id,
+                    token_expiry_in_sec=token_expiry_in_sec,
+                    invitation_template=d.invitation_template)
+                Invitee.update_status("The invitation sent.", RecordStatus.SENT, task_invitees)
+                invited[task_id] += 1
+            except Exception as ex:
+                Invitee.update_status(
+                    f"Failed to send an invitation: {ex}.",
+                    RecordStatus.ERROR,
+                    task_invitees,
+                    Invitee.processed_at.is_null(),
+                    processed_at=datetime.utcnow())
+        for task_id, count in invited.items():
+            Task.update_counts(task_id, invited_count=count)
+        return sum(invited.values())
+
+    def push(self, pushes):
+        """Push the records of the users who have authorized the organisation.
+
+        The first failure of the pushes is kept (:py:attr:`error`) and re-raised by :py:meth:`run`
+        once the pushed records are finalized.
+        """
+        executor = PushExecutor()
+        try:
+            with executor:
+                for _, user, org, records in pushes:
+                    self.pushed_ids.update(self.claim_id(r) for r in records)
+                    executor.submit(
+                        org, user.id, partial(self.descriptor.push, user, org.id, records, org=org),
+                        record_count=len(records))
+        except Exception as ex:
+            self.error = ex
+        return executor.record_count
+
+    def pushed_counts(self):
+        """Count the entries successfully pushed to ORCID in the run by task."""
+        if not self.pushed_ids:
+            return {}
+        Model = self.descriptor.claim_model  # noqa: N806
+        Record = self.descriptor.record_model  # noqa: N806
+        query = Model.select(Record.task_id, fn.COUNT(Model.id))
+        if Model is not Record:
+            query = query.join(Record)
+        return dict(
+            query.where(Model.id << self.pushed_ids, Model.processed_at.is_null(False),
+                        Model.status_code.is_null() | (Model.status_code != RecordStatus.ERROR)).group_by(
+                            Record.task_id).tuples())
+
+    def finalize(self, rows):
+        """Mark the fully processed records and the completed tasks and update the task counters.
+
+        The records processed for all the invitees are found with a single grouped query and
+        get marked with bulk updates, so the cost of the stage doesn't grow with the number of the records.
+
+        :return: the list of the completed tasks.
+        """
+        d = self.descriptor
+        Record, Invitee = d.record_model, d.invitee_model  # noqa: N806
+        record_ids = {self.record(r).id for r in rows}
+        processed, failed = Counter(), Counter()
+        if record_ids:
+            record_fk = getattr(Invitee, d.record_attr)
+            # The records processed for all invitees:
+            query = Record.select(Record.id, Record.task_id, Record.status_code).join(
+                Invitee, JOIN.LEFT_OUTER, on=((record_fk == Record.id) & Invitee.processed_at.is_null())).where(
+                    Record.id << record_ids, Record.processed_at.is_null()).group_by(
+                        Record.id, Record.task_id, Record.status_code).having(fn.COUNT(Invitee.id) == 0)
+            completed_ids, failed_ids = [], []
+            for record_id, task_id, status_code in query.tuples():
+                processed[task_id] += 1
+                if status_code == RecordStatus.ERROR:
+                    failed[task_id] += 1
+                    failed_ids.append(record_id)
+                else:
+                    completed_ids.append(record_id)
+            now = datetime.utcnow()
+            if completed_ids:
+                Record.update_status(
+                    d.processed_message, RecordStatus.PROCESSED, Record.id << completed_ids, processed_at=now)
+            if failed_ids:
+                Record.update(processed_at=now).where(Record.id << failed_ids).execute()
+            if processed:
+                Task.update(updated_at=now).where(Task.id << list(processed)).execute()
+        self.update_counts(processed, failed, self.pushed_counts())
+        return self.complete_tasks({r.id for r in rows})
+
+    def update_counts(self, processed, failed, pushed):
+        """Add the numbers of the processed, failed, and pushed entries of the run to the task counters."""
+        for task_id in set(processed) | set(failed) | set(pushed):
+            Task.update_counts(
+                task_id,
+                processed_count=processed.get(task_id, 0),
+                failed_count=failed.get(task_id, 0),
+                pushed_count=pushed.get(task_id, 0))
+
+    def completion_stats_columns(self):
+        """Get the aggregates of the task records reported in the task completion notification."""
+        Record = self.descriptor.record_model  # noqa: N806
+        return OrderedDict([
+            ("row_count", fn.COUNT(Record.id)),
+            ("error_count", fn.COUNT(case(None, [(Record.status_code == RecordStatus.ERROR, 1)]))),
+        ])
+
+    def complete_tasks(self, task_ids):
+        """Mark the tasks, that have all the records processed, completed.
+
+        The completion is decided for all the tasks with a single grouped query that also collects
+        the statistics for the completion notifications (set as ``completion_stats`` of the tasks).
+        """
+        Record = self.descriptor.record_model  # noqa: N806
+        if not task_ids:
+            return []
+        columns = self.completion_stats_columns()
+        query = Record.select(Record.task_id, *columns.values()).where(Record.task_id << task_ids).group_by(
+            Record.task_id).having(fn.COUNT(case(None, [(Record.processed_at.is_null(), 1)])) == 0)
+        stats = {task_id: dict(zip(columns, values)) for task_id, *values in query.tuples()}
+        if not stats:
+            return []
+        now = datetime.utcnow()
+        Task.update(completed_at=now, updated_at=now).where(Task.id << list(stats)).execute()
+        completed_tasks = list(
+            Task.select(Task, User).join(User, JOIN.LEFT_OUTER, on=Task.created_by).where(Task.id << list(stats)))
+        for task in completed_tasks:
+            task.completed_at = task.updated_at = now
+            task.completion_stats = stats[task.id]
+        return completed_tasks
+
+    def notification_kwargs(self, task):
+        """Get the task specific arguments of the task completion notification."""
+        kwargs = dict(getattr(task, "completion_stats", None)
+                      or dict(error_count=task.error_count, row_count=task.record_count))
+        if self.descriptor.task_name:
+            kwargs["task_name"] = self.descriptor.task_name
+        return kwargs
+
+    def notify(self, tasks):
+        """Send the task completion notifications to the users who uploaded the tasks."""
+        d = self.descriptor
+        count = 0
+        for task in tasks:
             with app.app_context():
                 protocol_scheme = 'http'
                 if not EXTERNAL_SP:
                     protocol_scheme = 'https'
                 export_url = flask.url_for(
-                    "affiliationrecord.export",
-                    export_type="csv",
+                    d.export_endpoint,
+                    export_type=d.export_type,
                     _scheme=protocol_scheme,
                     task_id=task.id,
                     _external=True)
                 try:
                     send_email(
-                        "email/task_completed.html",
-                        subject="Affiliation Process Update",
+                        d.completed_template,
+                        subject=d.subject,
                         recipient=(task.created_by.name, task.created_by.email),
-                        error_count=error_count,
-                        row_count=row_count,
-                        orcid_rec_count=orcid_rec_count,
                         export_url=export_url,
-                        filename=task.filename)
+                        filename=task.filename,
+                        **self.notification_kwargs(task))
+                    count += 1
                 except Exception:
-                    logger.exception(
-                        "Failed to send batch process comletion notification message.")
+                    logger.exception("Failed to send batch process comletion notification message.")
+        return count
+
+
+class AffiliationPipeline(BatchPipeline):
+    """Affiliation record processing pipeline (the affiliation records are the invitees themselves)."""
+
+    def query(self, max_rows=20, *fields, lease_token=None):
+        """Get the query of the affiliation records to process (see :py:func:`affiliation_records_to_process`)."""
+        return affiliation_records_to_process(max_rows, *fields, lease_token=lease_token)
+
+    def claim_id(self, row):
+        """Get the ID of the affiliation record of the selected row."""
+        return row.affiliation_record.id
+
+    def group(self, rows):
+        """Classify the affiliation records (see :py:func:`plan_affiliation_records`)."""
+        return plan_affiliation_records(rows)
+
+    def invite(self, invitations):
+        """Send the invitations with the affiliation types to the users."""
+        invited = Counter()
+        for task_id, invitation, affiliations, token_expiry_in_sec in invitations:
+            email = invitation[2]
+            try:
+                send_user_invitation(*invitation, affiliations, task_id=task_id,
+                                     token_expiry_in_sec=token_expiry_in_sec)
+                invited[task_id] += 1
+            except Exception as ex:
+                AffiliationRecord.update_status(
+                    f"Failed to send an invitation: {ex}.",
+                    RecordStatus.ERROR,
+                    AffiliationRecord.task_id == task_id,
+                    AffiliationRecord.email == email,
+                    AffiliationRecord.processed_at.is_null(),
+                    processed_at=datetime.utcnow())
+        for task_id, count in invited.items():
+            Task.update_counts(task_id, invited_count=count)
+        return sum(invited.values())
+
+    def finalize(self, rows):
+        """Update the task counters with the records processed in the run and mark the completed tasks."""
+        record_ids = {self.claim_id(r) for r in rows}
+        if record_ids:
+            query = AffiliationRecord.select(AffiliationRecord.task_id, fn.COUNT(AffiliationRecord.id)).where(
+                AffiliationRecord.id << record_ids,
+                AffiliationRecord.processed_at.is_null(False)).group_by(AffiliationRecord.task_id)
+            self.update_counts(
+                dict(query.tuples()),
+                dict(query.where(AffiliationRecord.status_code == RecordStatus.ERROR).tuples()),
+                self.pushed_counts())
+        return self.complete_tasks({r.id for r in rows})
+
+    def completion_stats_columns(self):
+        """Add the number of the distinct ORCID iDs to the task completion notification statistics."""
+        columns = super().completion_stats_columns()
+        columns["orcid_rec_count"] = fn.COUNT(fn.DISTINCT(AffiliationRecord.orcid))
+        return columns
+
+
+RECORD_TYPES = {
+    TaskType.AFFILIATION:
+    RecordTypeDescriptor(
+        TaskType.AFFILIATION,
+        AffiliationRecord,
+        push=create_or_update_affiliations,
+        completed_template="email/task_completed.html",
+        subject="Affiliation Process Update",
+        export_type="csv",
+        pipeline_class=AffiliationPipeline),
+    TaskType.FUNDING:
+    RecordTypeDescriptor(
+        TaskType.FUNDING,
+        FundingRecord,
+        FundingInvitees,
+        record_attr="funding_record",
+        invitee_attr="funding_invitees",
+        push=create_or_update_funding,
+        invitation_template="email/funding_invitation.html",
+        completed_template="email/funding_task_completed.html",
+        subject="Funding Process Update",
+        processed_message="Funding record is processed."),
+    TaskType.WORK:
+    RecordTypeDescriptor(
+        TaskType.WORK,
+        WorkRecord,
+        WorkInvitees,
+        record_attr="work_record",
+        invitee_attr="work_invitees",
+        push=create_or_update_work,
+        invitation_template="email/work_invitation.html",
+        subject="Work Process Update",
+        task_name="Work",
+        processed_message="Work record is processed."),
+    TaskType.PEER_REVIEW:
+    RecordTypeDescriptor(
+        TaskType.PEER_REVIEW,
+        PeerReviewRecord,
+        PeerReviewInvitee,
+        record_attr="peer_review_record",
+        invitee_attr="peer_review_invitee",
+        push=create_or_update_peer_review,
+        invitation_template="email/peer_review_invitation.html",
+        subject="Peer Review Process Update",
+        task_name="Peer Review",
+        processed_message="Peer Review record is processed."),
+}
+
+
+@rq.job(timeout=300)
+def process_work_records(max_rows=20):
+    """Process uploaded work records."""
+    return RECORD_TYPES[TaskType.WORK].pipeline().run(max_rows)
+
+
+def process_peer_review_records(max_rows=20):
+    """Process uploaded peer_review records."""
+    return RECORD_TYPES[TaskType.PEER_REVIEW].pipeline().run(max_rows)
+
+
+def process_funding_records(max_rows=20):
+    """Process uploaded funding records."""
+    return RECORD_TYPES[TaskType.FUNDING].pipeline().run(max_rows)
+
+
+def process_affiliation_records(max_rows=20):
+    """Process uploaded affiliation records."""
+    return RECORD_TYPES[TaskType.AFFILIATION].pipeline().run(max_rows)
+
+
+def load_job_id(task_id):
+    """Get the ID of the job loading the upload of the task."""
+    return f"load-task-{task_id}"
+
+
+def detect_encoding(path):
+    """Detect the encoding of the uploaded file: UTF-16 (with BOM), UTF-8 or Latin-1.
+
+    The file is read in blocks, so it doesn't get loaded into memory.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+            return "utf-16"
+        f.seek(0)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return "latin-1"
+    return "utf-8-sig"
+
+
+def queue_upload(task, upload, suffix=None):
+    """Store the uploaded file of the task and queue its loading into the task.
+
+    If the loading cannot be queued, the file gets loaded right away and the task gets deleted
+    if the loading fails.
+
+    :param task: the task created for the upload with the status ``LoadStatus.QUEUED``.
+    :param upload: the uploaded file (:py:class:`~werkzeug.datastructures.FileStorage`) or its content.
+    :param suffix: the suffix of the stored file picking the loader (by default, the extension of the task filename).
+    """
+    folder = app.config.get("UPLOAD_FOLDER")
+    os.makedirs(folder, exist_ok=True)
+    if suffix is None:
+        suffix = os.path.splitext(task.filename or '')[1]
+    path = os.path.join(folder, f"task-{task.id}-{uuid4().hex}{suffix}")
+    if isinstance(upload, bytes):
+        with open(path, "wb") as f:
+            f.write(upload)
+    else:
+        upload.save(path)
+    try:
+        return load_upload.queue(task.id, path, job_id=load_job_id(task.id))
+    except Exception:  # e.g., Redis is not available
+        app.logger.exception(f"Failed to queue the loading of {path!r}, loading it right away.")
+    try:
+        return load_upload(task.id, path)
+    except Exception:
+        # nothing was loaded and the error gets reported to the uploader right away:
+        task.delete_instance()
+        raise
+
+
+@rq.job(timeout=3600)
+def load_upload(task_id, path):
+    """Load the stored upload into the task and remove the file.
+
+    The progress (the numbers of the parsed, inserted and rejected rows) gets reported
+    in the job meta data after each chunk and stored in the task when the loading is completed.
+    """
+    try:
+        task = Task.get(id=task_id)
+    except Task.DoesNotExist:  # the task was deleted before it was loaded
+        os.remove(path)
+        return
+
+    job = get_current_job()
+    counts = {}
+
+    def progress(**kwargs):
+        counts.update(kwargs)
+        if job:
+            job.meta.update(kwargs)
+            job.save_meta()
+
+    Task.update(load_status=LoadStatus.LOADING).where(Task.id == task_id).execute()
+    try:
+        with open(path, encoding=detect_encoding(path), newline='') as source:
+            if task.task_type == TaskType.AFFILIATION:
+                if os.path.splitext(path)[1] in (".json", ".yaml", ".yml"):
+                    Task.load_from_json(source, filename=task.filename, task=task, progress=progress)
+                else:
+                    Task.load_from_csv(source, filename=task.filename, task=task, progress=progress)
+            else:
+                RECORD_TYPES[TaskType(task.task_type)].record_model.load_from_json(
+                    source, filename=task.filename, task=task, progress=progress)
+    except Exception as ex:
+        counts["total_count"] = 0  # nothing was inserted (the transaction was rolled back)
+        Task.update(load_status=LoadStatus.FAILED, load_error=str(ex), **counts).where(
+            Task.id == task_id).execute()
+        raise
+    else:
+        Task.update(load_status=LoadStatus.LOADED).where(Task.id == task_id).execute()
+    finally:
+        os.remove(path)
+    return task_id
+
+
+def get_load_progress(task):
+    """Get the status and the counters of the loading of the upload of the task.
+
+    While the upload is being loaded in the background, the counters are taken from the job.
+    """
+    progress = dict(
+        load_status=LoadStatus(task.load_status).name,
+        parsed_count=task.parsed_count,
+        total_count=task.total_count,
+        rejected_count=task.rejected_count,
+        load_error=task.load_error)
+    if task.load_status in (LoadStatus.QUEUED, LoadStatus.LOADING):
+        job = fetch_job(load_job_id(task.id))
+        if job:
+            progress.update({k: v for k, v in job.meta.items() if k in progress})
+    return progress
 
 
 @rq.job(timeout=300)
@@ -1378,7 +2161,8 @@ def get_client_credentials_token(org, scope="/webhook"):
 
     The any previously requesed with the give scope tokens will be deleted.
     """
-    resp = requests.post(
+    rate_limiter.acquire(org.orcid_client_id)
+    resp = orcid_client.http_pool.post(
         app.config["TOKEN_URL"],
         headers={"Accept": "application/json"},
         data=dict(
@@ -1424,7 +2208,12 @@ def register_orcid_webhook(user, callback_url=None, delete=False):
         "Authorization": f"Bearer {token.access_token}",
         "Content-Length": "0"
     }
-    resp = requests.delete(url, headers=headers) if delete else requests.put(url, headers=headers)
+    client_id = user.organisation.orcid_client_id
+    rate_limiter.acquire(client_id)
+    http_pool = orcid_client.http_pool
+    resp = http_pool.delete(url, headers=headers) if delete else http_pool.put(url, headers=headers)
+    if resp.status_code == 429:
+        rate_limiter.block(client_id, retry_after(resp.headers.get("Retry-After")))
     if local_handler and resp.status_code // 100 == 2:
         if delete:
             user.webhook_enabled = False
@@ -1438,7 +2227,7 @@ def register_orcid_webhook(user, callback_url=None, delete=False):
 def invoke_webhook_handler(webhook_url, orcid, updated_at, attempts=3):
     """Propagate 'updated' event to the organisation event handler URL."""
     url = app.config["ORCID_BASE_URL"] + orcid
-    resp = requests.post(
+    resp = orcid_client.http_pool.post(
         webhook_url + '/' + orcid,
         json={
             "orcid": orcid,
@@ -1475,6 +2264,50 @@ def disable_org_webhook(org):
         register_orcid_webhook.queue(u, delete=True)
 
 
+def drain_records(max_rows=20, min_sleep=None, max_sleep=None, max_runs=None):
+    """Keep processing the batch records of all types until interrupted.
+
+    Each run claims and processes up to *max_rows* records of each type. If there was nothing
+    to process, the worker sleeps backing off exponentially from *min_sleep* up to *max_sleep*
+    seconds (``BATCH_IDLE_SLEEP_MIN`` and ``BATCH_IDLE_SLEEP_MAX``).
+
+    :param max_runs: the maximum number of runs (unlimited if not given).
+    :return: the total number of the processed records.
+    """
+    min_sleep = min_sleep or app.config.get("BATCH_IDLE_SLEEP_MIN", 1)
+    max_sleep = max_sleep or app.config.get("BATCH_IDLE_SLEEP_MAX", 60)
+    idle_sleep, runs, total = min_sleep, 0, 0
+    while max_runs is None or runs < max_runs:
+        runs += 1
+        count = 0
+        for descriptor in RECORD_TYPES.values():
+            try:
+                count += descriptor.pipeline().run(max_rows)["select"].count
+            except Exception:
+                logger.exception(f"Failed to process {descriptor.task_type.name} records.")
+        total += count
+        if count:
+            idle_sleep = min_sleep
+        else:
+            # add some jitter so the idle workers don't poll in lockstep:
+            sleep(idle_sleep * random.uniform(0.5, 1.0))
+            idle_sleep = min(idle_sleep * 2, max_sleep)
+    return total
+
+
+def batch_queue_depth():
+    """Get the number of the batch rows ready for processing by organisation and task type.
+
+    :return: a dict mapping organisation ID to the dict of the task type names and the numbers of the rows.
+    """
+    depths = OrderedDict()
+    for task_type, descriptor in RECORD_TYPES.items():
+        for (org_id, _), count in descriptor.pipeline().queue_depth().items():
+            org_depths = depths.setdefault(org_id, OrderedDict())
+            org_depths[task_type.name] = org_depths.get(task_type.name, 0) + count
+    return depths
+
+
 def process_records(n):
     """Process first n records and run other batch tasks."""
     process_affiliation_records(n)
@@ -11,7 +11,6 @@ import traceback
 from datetime import datetime
 from io import BytesIO
 
-import requests
 import tablib
 import yaml
 from flask import (Response, abort, flash, g, jsonify, redirect, render_template, request,
@@ -39,14 +38,14 @@ from .forms import (ApplicationFrom, BitmapMultipleValueField, CredentialForm, E
                     FileUploadForm, JsonOrYamlFileUploadForm, LogoForm, OrgRegistrationForm,
                     PartialDateField, RecordForm, UserInvitationForm, WebhookForm)
 from .login_provider import roles_required
-from .models import (Affiliation, AffiliationRecord, CharField, Client, File, FundingInvitees,
+from .models import (Affiliation, AffiliationFingerprint, AffiliationRecord, CharField, Client, File, FundingInvitees,
                      FundingRecord, Grant, GroupIdRecord, ModelException, OrcidApiCall, OrcidToken,
-                     Organisation, OrgInfo, OrgInvitation, PartialDate, PeerReviewInvitee,
-                     PeerReviewRecord, Role, Task, TextField, Token, Url, User, UserInvitation,
-                     UserOrg, UserOrgAffiliation, WorkInvitees, WorkRecord, db, get_val)
+                     LoadStatus, Organisation, OrgInfo, OrgInvitation, PartialDate, PeerReviewInvitee,
+                     PeerReviewRecord, ProfileCache, RecordStatus, Role, Task, TaskType, TextField, Token, Url,
+                     User, UserInvitation, UserOrg, UserOrgAffiliation, WorkInvitees, WorkRecord, db, get_val)
 # NB! Should be disabled in production
 from .pyinfo import info
-from .utils import generate_confirmation_token, get_next_url, send_user_invitation
+from .utils import generate_confirmation_token, get_next_url, send_user_invitation, snake_case_keys
 
 HEADERS = {"Accept": "application/vnd.orcid+json", "Content-type": "application/vnd.orcid+json"}
 
@@ -124,6 +123,7 @@ def status():
         return jsonify({
             "status": "Connection successful.",
             "db-timestamp": now.isoformat(),
+            "http-pool": orcid_client.http_pool.stats.as_dict(),
         })
     except Exception as ex:
         return jsonify({
@@ -162,6 +162,23 @@ def read_uploaded_file(form):
     return raw.decode("latin-1")
 
 
+def queue_uploaded_file(form, task_type):
+    """Create the task of the uploaded file and queue the loading of the file into the task."""
+    task = Task.create(
+        org=current_user.organisation,
+        filename=secure_filename(form.file_.data.filename),
+        task_type=task_type,
+        load_status=LoadStatus.QUEUED)
+    utils.queue_upload(task, form.file_.data)
+    task = Task.get(id=task.id)
+    if task.load_status == LoadStatus.LOADED:  # loaded right away (no RQ workers)
+        flash(f"Successfully loaded {task.record_count} rows.")
+    else:
+        flash(f"The file '{task.filename}' was uploaded and queued for loading. "
+              "The progress of the loading is shown in the task list.", "info")
+    return task
+
+
 def orcid_link_formatter(view, context, model, name):
     """Format ORCID ID for ModelViews."""
     if not model.orcid:
@@ -218,6 +235,16 @@ class AppModelView(ModelView):
                 model = models.__dict__.get(model_class_name)
         super().__init__(model, *args, **kwargs)
 
+    def scaffold_filters(self, name):
+        """Filter the records by the processing status picked from the list of the status codes."""
+        if name == "status_code":
+            return [
+                filters.IntEqualFilter(
+                    self.model.status_code, "Status", options=[(s.value, str(s)) for s in RecordStatus]),
+                filters.FilterEmpty(self.model.status_code, "Status"),
+            ]
+        return super().scaffold_filters(name)
+
     # TODO: remove whent it gets merged into the upsteem repo (it's a workaround to make
     # joins LEFT OUTERE)
     def _handle_join(self, query, field, joins):
@@ -514,12 +541,24 @@ class UserOrgAmin(AppModelView):
     )
 
 
+def load_progress_formatter(view, context, model, name):
+    """Format the loading status or a counter of the task with the current progress of the loading."""
+    value = utils.get_load_progress(model)[name]
+    return str(LoadStatus[value]) if name == "load_status" else value
+
+
 class TaskAdmin(AppModelView):
     """Task model view."""
 
     roles_required = Role.SUPERUSER | Role.ADMIN
     list_template = "view_tasks.html"
     column_exclude_list = ("task_type", )
+    column_formatters = dict(
+        AppModelView.column_formatters,
+        load_status=load_progress_formatter,
+        parsed_count=load_progress_formatter,
+        total_count=load_progress_formatter,
+        rejected_count=load_progress_formatter)
     can_edit = False
     can_create = False
     can_delete = True
@@ -540,15 +579,22 @@ class RecordModelView(AppModelView):
     column_exclude_list = (
         "task",
         "organisation",
+        "lease_token",
+        "leased_until",
     )
     form_excluded_columns = (
         "task",
         "organisation",
+        "status_code",
+        "lease_token",
+        "leased_until",
     )
     column_export_exclude_list = (
         "task",
         "is_active",
     )
+    column_filters = ("status_code", )
+    column_choices = {"status_code": [(s.value, str(s)) for s in RecordStatus]}
     can_edit = True
     can_create = False
     can_delete = True
@@ -557,6 +603,14 @@ class RecordModelView(AppModelView):
 
     form_widget_args = {"external_id": {"readonly": True}, "task": {"readonly": True}}
 
+    def after_model_delete(self, model):
+        """Update the task counters after a record was deleted."""
+        Task.update_counts(
+            model.task_id,
+            total_count=-1,
+            processed_count=-1 if model.processed_at else 0,
+            failed_count=-1 if model.status_code == RecordStatus.ERROR else 0)
+
     def render(self, template, **kwargs):
         """Pass the task to the render function as an added argument."""
         if template == self.list_template and "task" not in kwargs:
@@ -645,7 +699,7 @@ to the best of your knowledge, correct!""")
             "Are you sure you want to reset the selected records for batch processing?")
     def action_reset(self, ids):
         """Reset batch task records."""
-        status = "The record was reset at " + datetime.utcnow().isoformat(timespec="seconds")
+        status = "The record was reset."
         task_id = None
         with db.atomic():
             try:
@@ -657,22 +711,24 @@ to the best of your knowledge, correct!""")
                     task_id = request.form.get('task_id')
                 task = Task.get(id=task_id)
 
-                count = self.model.update(
-                    processed_at=None, status=status).where(self.model.is_active,
-                                                            self.model.id.in_(ids)).execute()
+                selected = self.model.select().where(self.model.is_active, self.model.id.in_(ids))
+                Task.update_counts(
+                    task.id,
+                    processed_count=-selected.where(self.model.processed_at.is_null(False)).count(),
+                    failed_count=-selected.where(self.model.status_code == RecordStatus.ERROR).count())
+                count = self.model.update_status(
+                    status, RecordStatus.RESET, self.model.is_active, self.model.id.in_(ids), processed_at=None)
 
                 if self.model == FundingRecord:
-                    count = FundingInvitees.update(
-                        processed_at=None, status=status).where(
-                            FundingInvitees.funding_record.in_(ids)).execute()
+                    count = FundingInvitees.update_status(
+                        status, RecordStatus.RESET, FundingInvitees.funding_record.in_(ids), processed_at=None)
                 elif self.model == WorkRecord:
-                    count = WorkInvitees.update(
-                        processed_at=None, status=status).where(
-                        WorkInvitees.work_record.in_(ids)).execute()
+                    count = WorkInvitees.update_status(
+                        status, RecordStatus.RESET, WorkInvitees.work_record.in_(ids), processed_at=None)
                 elif self.model == PeerReviewRecord:
-                    count = PeerReviewInvitee.update(
-                        processed_at=None, status=status).where(
-                        PeerReviewInvitee.peer_review_record.in_(ids)).execute()
+                    count = PeerReviewInvitee.update_status(
+                        status, RecordStatus.RESET, PeerReviewInvitee.peer_review_record.in_(ids),
+                        processed_at=None)
                 elif self.model == AffiliationRecord:
                     # Delete the userInvitation token for selected reset items.
                     for user_invitation in UserInvitation.select().where(UserInvitation.email.in_(
@@ -785,6 +841,9 @@ class InviteesModelAdmin(AppModelView):
     can_create = False
     can_delete = False
     can_view_details = True
+    form_excluded_columns = ("status_code", "lease_token", "leased_until", )
+    column_filters = ("status_code", )
+    column_choices = {"status_code": [(s.value, str(s)) for s in RecordStatus]}
 
     def is_accessible(self):
         """Verify if the invitees view is accessible for the current user."""
@@ -800,27 +859,39 @@ class InviteesModelAdmin(AppModelView):
         """Batch reset of users."""
         with db.atomic():
             try:
-                status = " The record was reset at " + datetime.utcnow().isoformat(timespec="seconds")
-                count = self.model.update(
-                    processed_at=None, status=status).where(self.model.id.in_(ids)).execute()
+                status = "The record was reset."
+                count = self.model.update_status(
+                    status, RecordStatus.RESET, self.model.id.in_(ids), processed_at=None)
+                record_model = {
+                    FundingInvitees: FundingRecord,
+                    WorkInvitees: WorkRecord,
+                    PeerReviewInvitee: PeerReviewRecord
+                }.get(self.model)
+                if record_model:
+                    record = record_model.select().join(self.model).where(self.model.id.in_(ids)).first()
+                    if record and record.is_active:
+                        Task.update_counts(
+                            record.task_id,
+                            processed_count=-1 if record.processed_at else 0,
+                            failed_count=-1 if record.status_code == RecordStatus.ERROR else 0)
                 if self.model == FundingInvitees:
                     funding_record_id = self.model.select().where(
                         self.model.id.in_(ids))[0].funding_record_id
-                    FundingRecord.update(
-                        processed_at=None, status=status).where(
-                            FundingRecord.is_active, FundingRecord.id == funding_record_id).execute()
+                    FundingRecord.update_status(
+                        status, RecordStatus.RESET, FundingRecord.is_active, FundingRecord.id == funding_record_id,
+                        processed_at=None)
                 elif self.model == WorkInvitees:
                     work_record_id = self.model.select().where(
                         self.model.id.in_(ids))[0].work_record_id
-                    WorkRecord.update(
-                        processed_at=None, status=status).where(
-                        WorkRecord.is_active, WorkRecord.id == work_record_id).execute()
+                    WorkRecord.update_status(
+                        status, RecordStatus.RESET, WorkRecord.is_active, WorkRecord.id == work_record_id,
+                        processed_at=None)
                 elif self.model == PeerReviewInvitee:
                     peer_review_record_id = self.model.select().where(
                         self.model.id.in_(ids))[0].peer_review_record_id
-                    PeerReviewRecord.update(
-                        processed_at=None, status=status).where(
-                        PeerReviewRecord.is_active, PeerReviewRecord.id == peer_review_record_id).execute()
+                    PeerReviewRecord.update_status(
+                        status, RecordStatus.RESET, PeerReviewRecord.is_active,
+                        PeerReviewRecord.id == peer_review_record_id, processed_at=None)
             except Exception as ex:
                 db.rollback()
                 flash(f"Failed to activate the selected records: {ex}")
@@ -838,21 +909,21 @@ class WorkInviteesAdmin(InviteesModelAdmin):
     """Work invitees record model view."""
 
     list_template = "work_invitees_list.html"
-    column_exclude_list = ("work_record", )
+    column_exclude_list = ("work_record", "lease_token", "leased_until", )
 
 
 class FundingInviteesAdmin(InviteesModelAdmin):
     """Funding invitees record model view."""
 
     list_template = "funding_invitees_list.html"
-    column_exclude_list = ("funding_record", )
+    column_exclude_list = ("funding_record", "lease_token", "leased_until", )
 
 
 class PeerReviewInviteeAdmin(InviteesModelAdmin):
     """Peer Review invitee record model view."""
 
     list_template = "peer_review_externalid_invitees_list.html"
-    column_exclude_list = ("peer_review_record", )
+    column_exclude_list = ("peer_review_record", "lease_token", "leased_until", )
 
 
 class FundingWorkCommonModelView(RecordModelView):
@@ -1139,6 +1210,8 @@ class AffiliationRecordAdmin(RecordModelView):
     column_exclude_list = (
         "task",
         "organisation",
+        "lease_token",
+        "leased_until",
     )
     column_searchable_list = (
         "first_name",
@@ -1213,7 +1286,7 @@ class ViewMembersAdmin(AppModelView):
 
         for token in OrcidToken.select().where(OrcidToken.org == org, OrcidToken.user == model):
             try:
-                resp = requests.post(
+                resp = orcid_client.http_pool.post(
                     token_revoke_url,
                     headers={"Accepts": "application/json"},
                     data=dict(
@@ -1320,7 +1393,6 @@ class GroupIdRecordAdmin(AppModelView):
                               "please contact orcid@royalsociety.org.nz for support", "warning")
                         app.logger.exception(f'Exception occured {ex}')
 
-                    orcid_client.configuration.access_token = orcid_token.access_token
                     api = orcid_client.MemberAPI(org=org, access_token=orcid_token.access_token)
 
                     put_code, created = api.create_or_update_record_id_group(put_code=gid.put_code,
@@ -1329,9 +1401,9 @@ class GroupIdRecordAdmin(AppModelView):
                                                                              description=gid.description, type=gid.type)
 
                     if created:
-                        gid.add_status_line(f"The group id record was created.")
+                        gid.add_status_line(f"The group id record was created.", RecordStatus.CREATED)
                     else:
-                        gid.add_status_line(f"The group id record was updated.")
+                        gid.add_status_line(f"The group id record was updated.", RecordStatus.UPDATED)
 
                     gid.put_code = put_code
                     count += 1
@@ -1344,12 +1416,12 @@ class GroupIdRecordAdmin(AppModelView):
                           "In case you understand the 'user-message' present in the status field or else "
                           "please contact orcid@royalsociety.org.nz for support", "warning")
                     app.logger.exception(f'Exception occured {ex}')
-                    gid.add_status_line(f"ApiException: {ex}")
+                    gid.add_status_line(f"ApiException: {ex}", RecordStatus.ERROR)
                 except Exception as ex:
                     flash("Something went wrong in ORCID call, "
                           "Please contact orcid@royalsociety.org.nz for support", "warning")
                     app.logger.exception(f'Exception occured {ex}')
-                    gid.add_status_line(f"Exception: {ex}")
+                    gid.add_status_line(f"Exception: {ex}", RecordStatus.ERROR)
                 finally:
                     gid.processed_at = datetime.utcnow()
                     gid.save()
@@ -1435,8 +1507,10 @@ def activate_all():
     task = Task.get(id=task_id)
     try:
         if task.task_type == 0:
+            # the records marked unchanged on upload are already processed:
             count = AffiliationRecord.update(is_active=True).where(
                 AffiliationRecord.task_id == task_id,
+                AffiliationRecord.processed_at.is_null(),
                 AffiliationRecord.is_active == False).execute()  # noqa: E712
         elif task.task_type == 1:
             count = FundingRecord.update(is_active=True).where(
@@ -1468,52 +1542,46 @@ def reset_all():
     count = 0
     with db.atomic():
         try:
-            status = "The record was reset at " + datetime.now().isoformat(timespec="seconds")
+            status = "The record was reset."
             if task.task_type == 0:
-                count = AffiliationRecord.update(processed_at=None, status=status).where(
+                selected = AffiliationRecord.select().where(
+                    AffiliationRecord.task_id == task_id, AffiliationRecord.is_active == True)  # noqa: E712
+                processed_count = selected.where(AffiliationRecord.processed_at.is_null(False)).count()
+                failed_count = selected.where(AffiliationRecord.status_code == RecordStatus.ERROR).count()
+                count = AffiliationRecord.update_status(
+                    status,
+                    RecordStatus.RESET,
                     AffiliationRecord.task_id == task_id,
-                    AffiliationRecord.is_active == True).execute()  # noqa: E712
+                    AffiliationRecord.is_active == True,  # noqa: E712
+                    processed_at=None)
 
+                invited_count = 0
                 for user_invitation in UserInvitation.select().where(UserInvitation.task == task):
                     try:
-                        user_invitation.delete_instance()
+                        invited_count += user_invitation.delete_instance()
                     except UserInvitation.DoesNotExist:
                         pass
-
-            elif task.task_type == 1:
-                for funding_record in FundingRecord.select().where(FundingRecord.task_id == task_id,
-                                                                   FundingRecord.is_active == True):    # noqa: E712
-                    funding_record.processed_at = None
-                    funding_record.status = status
-
-                    FundingInvitees.update(
-                        processed_at=None, status=status).where(
-                        FundingInvitees.funding_record == funding_record.id).execute()
-                    funding_record.save()
-                    count = count + 1
-
-            elif task.task_type == 2:
-                for work_record in WorkRecord.select().where(WorkRecord.task_id == task_id,
-                                                                   WorkRecord.is_active == True):    # noqa: E712
-                    work_record.processed_at = None
-                    work_record.status = status
-
-                    WorkInvitees.update(
-                        processed_at=None, status=status).where(
-                        WorkInvitees.work_record == work_record.id).execute()
-                    work_record.save()
-                    count = count + 1
-            elif task.task_type == 3:
-                for peer_review_record in PeerReviewRecord.select().where(PeerReviewRecord.task_id == task_id,
-                                                                   PeerReviewRecord.is_active == True):    # noqa: E712
-                    peer_review_record.processed_at = None
-                    peer_review_record.status = status
-
-                    PeerReviewInvitee.update(
-                        processed_at=None, status=status).where(
-                        PeerReviewInvitee.peer_review_record == peer_review_record.id).execute()
-                    peer_review_record.save()
-                    count = count + 1
+                Task.update_counts(
+                    task.id,
+                    processed_count=-processed_count,
+                    failed_count=-failed_count,
+                    invited_count=-invited_count)
+
+            elif task.task_type in (1, 2, 3):
+                Record, Invitee, record_fk = {  # noqa: N806
+                    1: (FundingRecord, FundingInvitees, FundingInvitees.funding_record),
+                    2: (WorkRecord, WorkInvitees, WorkInvitees.work_record),
+                    3: (PeerReviewRecord, PeerReviewInvitee, PeerReviewInvitee.peer_review_record),
+                }[task.task_type]
+                active_records = Record.select(Record.id).where(
+                    Record.task_id == task_id, Record.is_active == True)  # noqa: E712
+                selected = Record.select().where(Record.id << active_records)
+                processed_count = selected.where(Record.processed_at.is_null(False)).count()
+                failed_count = selected.where(Record.status_code == RecordStatus.ERROR).count()
+                Invitee.update_status(status, RecordStatus.RESET, record_fk << active_records, processed_at=None)
+                count = Record.update_status(
+                    status, RecordStatus.RESET, Record.id << active_records, processed_at=None)
+                Task.update_counts(task.id, processed_count=-processed_count, failed_count=-failed_count)
         except Exception as ex:
             db.rollback()
             flash(f"Failed to reset the selected records: {ex}")
@@ -1559,8 +1627,7 @@ def delete_record(user_id, section_type, put_code):
         flash("The user hasn't authorized you to delete records", "warning")
         return redirect(_url)
 
-    orcid_client.configuration.access_token = orcid_token.access_token
-    api_instance = orcid_client.MemberAPIV20Api()
+    api_instance = orcid_client.MemberAPI(user=user, access_token=orcid_token.access_token)
 
     try:
         # Delete an Employment
@@ -1607,8 +1674,7 @@ def edit_record(user_id, section_type, put_code=None):
     except Exception:
         flash("The user hasn't authorized you to Add records", "warning")
         return redirect(_url)
-    orcid_client.configuration.access_token = orcid_token.access_token
-    api = orcid_client.MemberAPI(user=user)
+    api = orcid_client.MemberAPI(org=org, user=user, access_token=orcid_token.access_token, raw=True)
 
     form = RecordForm(form_type=section_type)
     if request.method == "GET":
@@ -1616,26 +1682,25 @@ def edit_record(user_id, section_type, put_code=None):
             try:
                 # Fetch an Employment
                 if section_type == "EMP":
-                    api_response = api.view_employment(user.orcid, put_code)
+                    _data = api.view_employment(user.orcid, put_code)
                 elif section_type == "EDU":
-                    api_response = api.view_education(user.orcid, put_code)
+                    _data = api.view_education(user.orcid, put_code)
 
-                _data = api_response.to_dict()
                 data = dict(
-                    org_name=_data.get("organization").get("name"),
+                    org_name=get_val(_data, "organization", "name"),
                     disambiguated_id=get_val(
-                        _data, "organization", "disambiguated_organization",
-                        "disambiguated_organization_identifier"),
+                        _data, "organization", "disambiguated-organization",
+                        "disambiguated-organization-identifier"),
                     disambiguation_source=get_val(
-                        _data, "organization", "disambiguated_organization",
-                        "disambiguation_source"),
-                    city=_data.get("organization").get("address").get("city", ""),
-                    state=_data.get("organization").get("address").get("region", ""),
-                    country=_data.get("organization").get("address").get("country", ""),
-                    department=_data.get("department_name", ""),
-                    role=_data.get("role_title", ""),
-                    start_date=PartialDate.create(_data.get("start_date")),
-                    end_date=PartialDate.create(_data.get("end_date")))
+                        _data, "organization", "disambiguated-organization",
+                        "disambiguation-source"),
+                    city=get_val(_data, "organization", "address", "city", default=""),
+                    state=get_val(_data, "organization", "address", "region", default=""),
+                    country=get_val(_data, "organization", "address", "country", default=""),
+                    department=_data.get("department-name", ""),
+                    role=_data.get("role-title", ""),
+                    start_date=PartialDate.create(_data.get("start-date")),
+                    end_date=PartialDate.create(_data.get("end-date")))
             except ApiException as e:
                 message = json.loads(e.body.replace("''", "\"")).get('user-messsage')
                 app.logger.error(f"Exception when calling MemberAPIV20Api->view_employment: {message}")
@@ -1721,37 +1786,30 @@ def section(user_id, section_type="EMP"):
         flash("User didn't give permissions to update his/her records", "warning")
         return redirect(_url)
 
-    orcid_client.configuration.access_token = orcid_token.access_token
     # create an instance of the API class
-    api_instance = orcid_client.MemberAPIV20Api()
+    api_instance = orcid_client.MemberAPI(
+        org=current_user.organisation, user=user, access_token=orcid_token.access_token)
     try:
-        # Fetch all entries
-        if section_type == "EMP":
-            api_response = api_instance.view_employments(user.orcid)
-        else:  # section_type == "EDU
-            api_response = api_instance.view_educations(user.orcid)
-    except ApiException as ex:
-        if ex.status == 401:
+        # Fetch all entries (the cached activities summary if it's fresh enough)
+        activities = api_instance.get_activities()
+    except Exception as ex:
+        abort(500, ex)
+
+    if activities is None:
+        if not OrcidToken.select().where(OrcidToken.id == orcid_token.id).exists():
             flash("User has revoked the permissions to update his/her records", "warning")
         else:
-            flash("Exception when calling ORCID API: \n" +
-                  json.loads(ex.body.replace("''", "\"")).get('user-messsage'), "danger")
+            flash("Failed to retrieve the ORCID record of the user", "danger")
         return redirect(_url)
-    except Exception as ex:
-        abort(500, ex)
 
     # TODO: Organisation has read token
     # TODO: Organisation has access to the employment records
     # TODO: retrieve and tranform for presentation (order, etc)
-    try:
-        data = api_response.to_dict()
-    except Exception as ex:
-        flash("User didn't give permissions to update his/her records", "warning")
-        flash("Unhandled exception occured while retrieving ORCID data: %s" % ex, "danger")
-        app.logger.exception(f"For {user} encountered exception")
-        return redirect(_url)
-    # TODO: transform data for presentation:
-    records = data.get("education_summary" if section_type == "EDU" else "employment_summary", [])
+    if section_type == "EDU":
+        records = get_val(activities, "educations", "education-summary") or []
+    else:
+        records = get_val(activities, "employments", "employment-summary") or []
+    records = [snake_case_keys(r) for r in records]
     return render_template(
         "section.html",
         url=_url,
@@ -1767,9 +1825,10 @@ def load_org():
     """Preload organisation data."""
     form = FileUploadForm()
     if form.validate_on_submit():
-        row_count = OrgInfo.load_from_csv(read_uploaded_file(form))
+        stats = OrgInfo.load_from_csv(read_uploaded_file(form))
 
-        flash("Successfully loaded %d rows." % row_count, "success")
+        flash(f"Successfully loaded {stats.row_count} rows: {stats.inserted} inserted, {stats.updated} updated, "
+              f"{stats.unchanged} unchanged.", "success")
         return redirect(url_for("orginfo.index_view"))
 
     return render_template("fileUpload.html", form=form, form_title="Organisation")
@@ -1781,10 +1840,8 @@ def load_researcher_affiliations():
     """Preload organisation data."""
     form = FileUploadForm()
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
         try:
-            task = Task.load_from_csv(read_uploaded_file(form), filename=filename)
-            flash(f"Successfully loaded {task.record_count} rows.")
+            task = queue_uploaded_file(form, TaskType.AFFILIATION)
             return redirect(url_for("affiliationrecord.index_view", task_id=task.id))
         except (
                 ValueError,
@@ -1802,10 +1859,8 @@ def load_researcher_funding():
     """Preload organisation data."""
     form = JsonOrYamlFileUploadForm()
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
         try:
-            task = FundingRecord.load_from_json(read_uploaded_file(form), filename=filename)
-            flash(f"Successfully loaded {task.record_count} rows.")
+            task = queue_uploaded_file(form, TaskType.FUNDING)
             return redirect(url_for("fundingrecord.index_view", task_id=task.id))
         except Exception as ex:
             flash(f"Failed to load funding record file: {ex}", "danger")
@@ -1820,10 +1875,8 @@ def load_researcher_work():
     """Preload researcher's work data."""
     form = JsonOrYamlFileUploadForm()
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
         try:
-            task = WorkRecord.load_from_json(read_uploaded_file(form), filename=filename)
-            flash(f"Successfully loaded {task.record_count} rows.")
+            task = queue_uploaded_file(form, TaskType.WORK)
             return redirect(url_for("workrecord.index_view", task_id=task.id))
         except Exception as ex:
             flash(f"Failed to load work record file: {ex}", "danger")
@@ -1838,10 +1891,8 @@ def load_researcher_peer_review():
     """Preload researcher's peer review data."""
     form = JsonOrYamlFileUploadForm()
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
         try:
-            task = PeerReviewRecord.load_from_json(read_uploaded_file(form), filename=filename)
-            flash(f"Successfully loaded {task.record_count} rows.")
+            task = queue_uploaded_file(form, TaskType.PEER_REVIEW)
             return redirect(url_for("peerreviewrecord.index_view", task_id=task.id))
         except Exception as ex:
             flash(f"Failed to load peer review record file: {ex}", "danger")
@@ -2422,6 +2473,8 @@ def update_webhook(user_id):
         user = User.get(id=user_id)
         user.orcid_updated_at = updated_at
         user.save()
+        ProfileCache.invalidate(user.id)
+        AffiliationFingerprint.invalidate(user.orcid, updated_at)
         for org in user.organisations.where(Organisation.webhook_enabled):
 
             if org.webhook_url:
@@ -53,13 +53,19 @@ def app():
         (File, Organisation, User, UserOrg, OrcidToken, UserOrgAffiliation, OrgInfo, Task,
          AffiliationRecord, FundingRecord, FundingContributor, FundingInvitees, OrcidAuthorizeCall, OrcidApiCall,
          Url, UserInvitation, OrgInvitation, ExternalId, Client, Grant, Token, WorkRecord, WorkContributor,
-         WorkExternalId, WorkInvitees, PeerReviewRecord, PeerReviewInvitee, PeerReviewExternalId), fail_silently=True):  # noqa: F405
+         WorkExternalId, WorkInvitees, PeerReviewRecord, PeerReviewInvitee, PeerReviewExternalId, RecordEvent,
+         ProfileCache, AffiliationFingerprint), fail_silently=True):  # noqa: F405
         _app.db = _db
         _app.config["DATABASE_URL"] = DATABASE_URL
         _app.config["EXTERNAL_SP"] = None
         _app.config["SENTRY_DSN"] = None
         _app.config["WTF_CSRF_ENABLED"] = False
         _app.config["DEBUG_TB_ENABLED"] = False
+        # in-memory SQLite DB is not shared with the API call log flushing thread:
+        _app.config["ORCID_API_CALL_LOG_BUFFER_SIZE"] = 1
+        # ... nor with the batch push worker threads:
+        _app.config["ORCID_PUSH_MAX_WORKERS"] = 1
+        _app.config["ORCID_API_GLOBAL_RATE"] = _app.config["ORCID_API_CLIENT_RATE"] = 0
         #_app.config["SERVER_NAME"] = "ORCIDHUB"
         _app.sentry = None
 
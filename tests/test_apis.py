@@ -8,6 +8,7 @@ import pytest
 from flask import url_for
 from flask_login import login_user
 
+from orcid_hub import utils
 from orcid_hub.apis import yamlfy
 from orcid_hub.data_apis import plural
 from orcid_hub.models import Client, OrcidToken, Organisation, Task, TaskType, Token, User
@@ -384,36 +385,49 @@ def test_affiliation_api(client):
         data=b"grant_type=client_credentials&client_id=TEST0-ID&client_secret=TEST0-SECRET")
     data = json.loads(resp.data)
     access_token = data["access_token"]
-    resp = client.post(
-        "/api/v1.0/affiliations/?filename=TEST42.csv",
-        headers=dict(authorization=f"Bearer {access_token}"),
-        content_type="text/csv",
-        data=b"First Name,Last Name,email,Organisation,Affiliation Type,Role,Department,Start Date,"
-        b"End Date,City,State,Country,Disambiguated Id,Disambiguated Source\n"
-        b"Researcher,Par,researcher.020@mailinator.com,Royal Org1,Staff,Programme Guide - "
-        b"ORCID,Research Funding,2016-09,,Wellington,SATE,NZ,,\n"
-        b"Roshan,Pawar,researcher.010@mailinator.com,Royal Org1,Staff,AAA,Research "
-        b"Funding,2016-09,,Wellington,SATE,NZ,,\n"
-        b"Roshan,Pawar,researcher.010@mailinator.com,Royal Org1,Student,BBB,Research "
-        b"Funding,2016-09,,Wellington,SATE,New Zealand,,")
+    # without the job queue the file gets loaded right away:
+    with patch("orcid_hub.utils.load_upload.queue", side_effect=ConnectionError("Redis is not available")):
+        resp = client.post(
+            "/api/v1.0/affiliations/?filename=TEST42.csv",
+            headers=dict(authorization=f"Bearer {access_token}"),
+            content_type="text/csv",
+            data=b"First Name,Last Name,email,Organisation,Affiliation Type,Role,Department,Start Date,"
+            b"End Date,City,State,Country,Disambiguated Id,Disambiguated Source\n"
+            b"Researcher,Par,researcher.020@mailinator.com,Royal Org1,Staff,Programme Guide - "
+            b"ORCID,Research Funding,2016-09,,Wellington,SATE,NZ,,\n"
+            b"Roshan,Pawar,researcher.010@mailinator.com,Royal Org1,Staff,AAA,Research "
+            b"Funding,2016-09,,Wellington,SATE,NZ,,\n"
+            b"Roshan,Pawar,researcher.010@mailinator.com,Royal Org1,Student,BBB,Research "
+            b"Funding,2016-09,,Wellington,SATE,New Zealand,,")
     data = json.loads(resp.data)
     assert data["filename"] == "TEST42.csv"
     assert data["task-type"] == "AFFILIATION"
     assert len(data["records"]) == 3
+    assert data["load-status"] == "LOADED"
     task_id = data["id"]
 
     resp = client.get("/api/v1.0/tasks", headers=dict(authorization=f"Bearer {access_token}"))
     tasks = json.loads(resp.data)
     assert tasks[0]["id"] == task_id
 
+    resp = client.get(f"/api/v1.0/tasks/{task_id}", headers=dict(authorization=f"Bearer {access_token}"))
+    progress = json.loads(resp.data)
+    assert progress["load-status"] == "LOADED"
+    assert (progress["parsed-count"], progress["total-count"], progress["rejected-count"]) == (3, 3, 0)
+    assert "records" not in progress
+    resp = client.get("/api/v1.0/tasks/999999", headers=dict(authorization=f"Bearer {access_token}"))
+    assert resp.status_code == 404
+
     task_copy = copy.deepcopy(data)
     del(task_copy["id"])
     task_copy["filename"] = "TASK-COPY.csv"
-    resp = client.post(
-        "/api/v1.0/affiliations/",
-        headers=dict(authorization=f"Bearer {access_token}"),
-        content_type="application/json",
-        data=json.dumps(task_copy))
+    with patch("orcid_hub.utils.load_upload.queue", side_effect=ConnectionError("Redis is not available")):
+        resp = client.post(
+            "/api/v1.0/affiliations/",
+            headers=dict(authorization=f"Bearer {access_token}"),
+            content_type="application/json",
+            data=json.dumps(task_copy))
+    assert json.loads(resp.data)["load-status"] == "LOADED"
     assert Task.select().count() == 2
 
     for r in data["records"]:
@@ -586,11 +600,12 @@ def test_affiliation_api(client):
         data=b'')
     assert resp.status_code == 400
 
-    resp = client.post(
-        "/api/v1.0/affiliations/?filename=TEST42.csv",
-        headers=dict(authorization=f"Bearer {access_token}", accept="text/yaml"),
-        content_type="text/yaml",
-        data="""task-type: AFFILIATION
+    with patch("orcid_hub.utils.load_upload.queue", side_effect=ConnectionError("Redis is not available")):
+        resp = client.post(
+            "/api/v1.0/affiliations/?filename=TEST42.csv",
+            headers=dict(authorization=f"Bearer {access_token}", accept="text/yaml"),
+            content_type="text/yaml",
+            data="""task-type: AFFILIATION
 filename: TEST42.yml
 records:
 - affiliation-type: student
@@ -634,6 +649,72 @@ records:
     assert task.affiliation_records.count() == 3
 
 
+def test_affiliation_api_queued(client):
+    """Test the loading of the affiliation API uploads queued for the workers."""
+    resp = client.post(
+        "/oauth/token",
+        content_type="application/x-www-form-urlencoded",
+        data=b"grant_type=client_credentials&client_id=TEST0-ID&client_secret=TEST0-SECRET")
+    access_token = json.loads(resp.data)["access_token"]
+    headers = dict(authorization=f"Bearer {access_token}")
+
+    with patch("orcid_hub.utils.load_upload.queue") as queue:
+        resp = client.post(
+            "/api/v1.0/affiliations/?filename=QUEUED.csv",
+            headers=headers,
+            content_type="text/csv",
+            data=b"First Name,Last Name,email,Organisation,Affiliation Type,Role,Department,Start Date,"
+            b"End Date,City,State,Country,Disambiguated Id,Disambiguated Source\n"
+            b"Researcher,Par,researcher.020@mailinator.com,Royal Org1,Staff,Programme Guide - "
+            b"ORCID,Research Funding,2016-09,,Wellington,SATE,NZ,,\n"
+            b"Roshan,Pawar,researcher.010@mailinator.com,Royal Org1,Staff,AAA,Research "
+            b"Funding,2016-09,,Wellington,SATE,NZ,,\n")
+    assert resp.status_code == 202
+    data = json.loads(resp.data)
+    assert data["load-status"] == "QUEUED"
+    assert "records" not in data
+    task_id, path = queue.call_args[0]
+
+    # while the upload is being loaded, the progress is taken from the job:
+    with patch("orcid_hub.utils.fetch_job", return_value=MagicMock(meta=dict(parsed_count=1, total_count=1))):
+        resp = client.get(f"/api/v1.0/tasks/{task_id}", headers=headers)
+    progress = json.loads(resp.data)
+    assert progress["load-status"] == "QUEUED"
+    assert (progress["parsed-count"], progress["total-count"]) == (1, 1)
+
+    utils.load_upload(task_id, path)
+    resp = client.get(f"/api/v1.0/tasks/{task_id}", headers=headers)
+    progress = json.loads(resp.data)
+    assert progress["load-status"] == "LOADED"
+    assert (progress["parsed-count"], progress["total-count"], progress["rejected-count"]) == (2, 2, 0)
+
+    # the JSON bodies of the new tasks get queued too:
+    with patch("orcid_hub.utils.load_upload.queue") as queue:
+        resp = client.post(
+            "/api/v1.0/affiliations/",
+            headers=headers,
+            content_type="application/json",
+            data=json.dumps({
+                "filename": "QUEUED.json",
+                "records": [{
+                    "first-name": "Roshan",
+                    "last-name": "Pawar",
+                    "email": "researcher.010@mailinator.com",
+                    "affiliation-type": "staff",
+                    "start-date": "2016-09",
+                    "city": "Wellington",
+                    "country": "NZ",
+                }]
+            }))
+    assert resp.status_code == 202
+    task_id, path = queue.call_args[0]
+    assert path.endswith(".json")
+    utils.load_upload(task_id, path)
+    task = Task.get(id=task_id)
+    assert (task.filename, task.total_count) == ("QUEUED.json", 1)
+    assert task.affiliation_records.first().email == "researcher.010@mailinator.com"
+
+
 def test_proxy_get_profile(app_req_ctx):
     """Test the echo endpoint."""
     user = User.get(email="app123@test0.edu")
@@ -643,7 +724,7 @@ def test_proxy_get_profile(app_req_ctx):
     with app_req_ctx(
             f"/orcid/api/v1.23/{orcid_id}", headers=dict(
                 authorization=f"Bearer {token.access_token}")) as ctx, patch(
-                        "orcid_hub.apis.requests.Session.send") as mocksend:
+                        "orcid_hub.orcid_client.http_pool.send") as mocksend:
         mockresp = MagicMock(status_code=200)
         mockresp.raw.stream = lambda *args, **kwargs: iter([b"""{"data": "TEST"}"""])
         mockresp.raw.headers = {
@@ -671,7 +752,7 @@ def test_proxy_get_profile(app_req_ctx):
             f"/orcid/api/v1.23/{orcid_id}", headers=dict(
                 authorization=f"Bearer {token.access_token}"), method="POST",
             data=b"""{"data": "REQUEST"}""") as ctx, patch(
-                        "orcid_hub.apis.requests.Session.send") as mocksend:
+                        "orcid_hub.orcid_client.http_pool.send") as mocksend:
         mockresp = MagicMock(status_code=201)
         mockresp.raw.stream = lambda *args, **kwargs: iter([b"""{"data": "TEST"}"""])
         mockresp.raw.headers = {
@@ -324,8 +324,8 @@ def test_onboard_org(request_ctx):
             }) as cttxx:
         login_user(u)
         u.save()
-        with patch("orcid_hub.authcontroller.requests") as requests:
-            requests.post.return_value = Mock(data=b'XXXX', status_code=200)
+        with patch("orcid_hub.orcid_client.http_pool.post") as mockpost:
+            mockpost.return_value = Mock(data=b'XXXX', status_code=200)
             rv = cttxx.app.full_dispatch_request()
             assert rv.status_code == 302
             assert rv.location.startswith("/link")
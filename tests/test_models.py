@@ -1,16 +1,24 @@
-from datetime import datetime
+import json
+import multiprocessing
+from datetime import datetime, timedelta
+from io import StringIO
 from itertools import product
+from unittest.mock import patch
 
 import pytest
+import yaml
 from peewee import Model, SqliteDatabase
+from pykwalify.errors import SchemaError
 from playhouse.test_utils import test_database
 
-from orcid_hub.models import (Affiliation, AffiliationRecord, BaseModel, BooleanField, ExternalId,
-                              FundingContributor, FundingRecord, FundingInvitees, ModelException, OrcidToken,
-                              Organisation, OrgInfo, PartialDate, PartialDateField, Role, Task,
-                              TextField, User, UserOrg, UserOrgAffiliation, WorkRecord, WorkContributor, WorkExternalId,
+from orcid_hub.models import (Affiliation, AffiliationFingerprint, AffiliationRecord, BaseModel, BooleanField,
+                              ExternalId, FundingContributor, FundingRecord, FundingInvitees, ModelException,
+                              OrcidToken, Organisation, OrgInfo, PartialDate, PartialDateField, ProfileCache,
+                              RecordEvent, RecordStatus, Role, Task,
+                              TextField, User, UserInvitation, UserOrg, UserOrgAffiliation, WorkRecord,
+                              WorkContributor, WorkExternalId,
                               WorkInvitees, PeerReviewRecord, PeerReviewInvitee, PeerReviewExternalId,
-                              create_tables, drop_tables, validate_orcid_id)
+                              backfill_task_counts, create_tables, drop_tables, schema_validator, validate_orcid_id)
 
 
 @pytest.fixture
@@ -29,7 +37,7 @@ def test_db():
             _db, (Organisation, User, UserOrg, OrgInfo, OrcidToken, UserOrgAffiliation, Task,
                   AffiliationRecord, ExternalId, FundingRecord, FundingContributor, FundingInvitees,
                   WorkRecord, WorkContributor, WorkExternalId, WorkInvitees, PeerReviewRecord, PeerReviewExternalId,
-                  PeerReviewInvitee),
+                  PeerReviewInvitee, UserInvitation, RecordEvent, ProfileCache, AffiliationFingerprint),
             fail_silently=True) as _test_db:
         yield _test_db
 
@@ -504,6 +512,23 @@ Organisation_1,Title_1,First Name_1,Last Name_1,Role_1,Email_1,Phone_1,yes,Count
     oi = OrgInfo.get(name="Organisation_1")
     assert oi.is_public
 
+    stats = OrgInfo.load_from_csv(
+        """Organisation,City of home campus,common:disambiguated-organization-identifier,common:disambiguation-source
+Organisation_0,City of home campus_0,common:disambiguated-organization-identifier_0,common:disambiguation-source
+Organisation_2,CITY,ID,SOURCE
+
+Organisation_3,CITY,ID,SOURCE
+Organisation_2,NEW CITY,ID,SOURCE
+""")
+    assert stats == (4, 2, 1, 0)
+    assert OrgInfo.select().count() == 4
+    assert OrgInfo.get(name="Organisation_2").city == "NEW CITY"
+    oi = OrgInfo.get(name="Organisation_0")
+    assert oi.city == "City of home campus_0" and oi.title is None and not oi.is_public
+    stats = OrgInfo.load_from_csv("Name,City,Disambiguated Identifier,Disambiguation Source\n"
+                                  "Organisation_3,CITY,ID,SOURCE\n")
+    assert stats.unchanged == 1 and stats.inserted == stats.updated == 0
+
 
 def test_affiliations(test_models):
     assert Affiliation.EDU == "EDU"
@@ -543,6 +568,208 @@ FNB	LNB	b.b@test.com	TEST0	Science and Education Group	Wellington	Manager Specia
     ) == test.record_count + 10  # The 10 value is from already inserted entries.
 
 
+def test_load_task_from_csv_in_chunks(test_models):
+    """Test the chunked loading of the affiliation records and the reporting of all the invalid rows."""
+    org = Organisation.create(name="TEST0")
+    header = "First name\tLast name\temail address\tOrganisation\tCampus/Department\tCity\tCourse or Job title\t" \
+        "Start date\tEnd date\tStudent/Staff\tCountry\n"
+    rows = [f"FN{i}\tLN{i}\tuser{i}@test.com\tTEST0\tDEPARTMENT\tWellington\tROLE\t2016-09\t\tStaff\tNZ\n"
+            for i in range(7)]
+    record_count = AffiliationRecord.select().count()
+    with patch.dict("orcid_hub.models.app.config", LOAD_CHUNK_SIZE=3), patch.object(
+            Task, "save", autospec=True, side_effect=Task.save) as save:
+        task = Task.load_from_csv(header + ''.join(rows), filename="CHUNKS.tsv", org=org)
+    assert save.call_count == 2  # created and the counter set once
+    assert task.record_count == 7
+    assert Task.get(id=task.id).total_count == 7
+    assert AffiliationRecord.select().count() == record_count + 7
+    assert [r.email for r in task.affiliation_records.order_by(AffiliationRecord.id)] == [
+        f"user{i}@test.com" for i in range(7)]
+    assert task.affiliation_records.first().start_date == PartialDate(2016, 9, None)
+
+    rows[2] = rows[2].replace("user2@test.com", "INVALID EMAIL")
+    rows[5] = rows[5].replace("Staff", "VISITOR")
+    task_count = Task.select().count()
+    with pytest.raises(ModelException) as ex_info:
+        Task.load_from_csv(header + ''.join(rows), filename="INVALID.tsv", org=org)
+    assert str(ex_info.value).startswith("2 invalid row(s)")
+    assert "row #4" in str(ex_info.value)
+    assert "row #7" in str(ex_info.value)
+    assert Task.select().count() == task_count
+    assert AffiliationRecord.select().count() == record_count + 7
+
+
+def test_parallel_validation(test_models):
+    """Test the validation of the uploaded rows and items by a process pool."""
+    org = Organisation.create(name="TEST0")
+    header = "First name\tLast name\temail address\tOrganisation\tCampus/Department\tCity\tCourse or Job title\t" \
+        "Start date\tEnd date\tStudent/Staff\tCountry\n"
+    rows = [f"FN{i}\tLN{i}\tuser{i}@test.com\tTEST0\tDEPARTMENT\tWellington\tROLE\t2016-09\t\tStaff\tNZ\n"
+            for i in range(20)]
+    items = [{
+        "title": {"title": {"value": f"TITLE #{i}"}},
+        "type": "BOOK_CHAPTER",
+        "citation": {"citation-type": "FORMATTED_UNSPECIFIED", "citation-value": f"TITLE #{i}"},
+        "invitees": [{"identifier": f"{i:05d}", "email": f"user{i}@test.com", "first-name": "FN", "last-name": "LN"}],
+        "external-ids": {"external-id": [{"external-id-type": "doi", "external-id-value": f"10.1000/{i}"}]},
+    } for i in range(10)]
+
+    with patch.dict("orcid_hub.models.app.config", LOAD_CHUNK_SIZE=3, LOAD_VALIDATION_WORKERS=2), patch(
+            "orcid_hub.models.multiprocessing.Pool", wraps=multiprocessing.Pool) as pool:
+        task = Task.load_from_csv(header + ''.join(rows), filename="PARALLEL.tsv", org=org)
+        assert task.record_count == 20
+        assert [r.email for r in task.affiliation_records.order_by(AffiliationRecord.id)] == [
+            f"user{i}@test.com" for i in range(20)]
+
+        rows[16] = rows[16].replace("Staff", "VISITOR")
+        rows[7] = rows[7].replace("user7@test.com", "INVALID EMAIL")
+        with pytest.raises(ModelException) as ex_info:
+            Task.load_from_csv(header + ''.join(rows), filename="INVALID.tsv", org=org)
+        message = str(ex_info.value)
+        assert message.startswith("2 invalid row(s)")
+        assert message.index("row #9") < message.index("row #18")
+
+        task = WorkRecord.load_from_json(json.dumps(items), filename="WORKS.json", org=org)
+        assert [r.title for r in task.work_records.order_by(WorkRecord.id)] == [f"TITLE #{i}" for i in range(10)]
+
+        items[7]["type"] = 42
+        with pytest.raises(SchemaError) as ex_info:
+            WorkRecord.load_from_json(json.dumps(items), filename="INVALID.json", org=org)
+        assert "/7" in str(ex_info.value)
+    # all the uploads got validated by the process pool:
+    assert pool.call_count == 4
+    pool.assert_called_with(2)
+
+
+def test_affiliation_fingerprints(test_models):
+    """Test that the re-uploaded affiliation records matching the pushed ones get marked unchanged."""
+    org = Organisation.create(name="TEST0")
+    header = "First name\tLast name\temail address\tOrganisation\tCampus/Department\tCity\tCourse or Job title\t" \
+        "Start date\tEnd date\tStudent/Staff\tCountry\n"
+    rows = [f"FN{i}\tLN{i}\tuser{i}@test.com\tTEST0\tDEPARTMENT\tWellington\tROLE\t2016-09\t\tStaff\tNZ\n"
+            for i in range(5)]
+    task = Task.load_from_csv(header + ''.join(rows), filename="NIGHTLY.tsv", org=org)
+    assert task.processed_count == 0
+    records = list(task.affiliation_records.order_by(AffiliationRecord.id))
+    for put_code, r in enumerate(records[:4], start=100):
+        r.put_code = put_code
+        r.add_status_line("Employment record was created.", RecordStatus.CREATED)
+        r.save()
+    records[3].add_status_line("Failed.", RecordStatus.ERROR)
+    records[3].save()
+    assert AffiliationFingerprint.store(org.id, records, orcid="0000-0003-1255-9023") == 3
+    assert AffiliationFingerprint.store(org.id, records[:1]) == 1  # replaced
+
+    # the names and whitespace don't matter:
+    rows[0] = rows[0].replace("FN0", "NEW NAME").replace("DEPARTMENT", "  department ")
+    rows[2] = rows[2].replace("ROLE", "NEW ROLE")
+    with patch.dict("orcid_hub.models.app.config", LOAD_CHUNK_SIZE=2):
+        task = Task.load_from_csv(header + ''.join(rows), filename="NIGHTLY.tsv", org=org)
+    assert (task.processed_count, task.pushed_count, task.completed_at) == (2, 2, None)
+    records = list(task.affiliation_records.order_by(AffiliationRecord.id))
+    assert [r.status_code for r in records] == [RecordStatus.UNCHANGED, RecordStatus.UNCHANGED, None, None, None]
+    assert [r.put_code for r in records] == [100, 101, None, None, None]
+    assert records[1].orcid == "0000-0003-1255-9023"
+    assert all(r.processed_at and not r.is_active for r in records[:2])
+    assert [e.status_code for e in RecordEvent.history(records[0])] == [RecordStatus.UNCHANGED]
+
+    task = Task.load_from_csv(header + rows[1], filename="NIGHTLY.tsv", org=org)
+    assert task.completed_at is not None
+
+    with patch.dict("orcid_hub.models.app.config", AFFILIATION_FINGERPRINT_TTL=0):
+        task = Task.load_from_csv(header + rows[1], filename="NIGHTLY.tsv", org=org)
+        assert task.processed_count == 0
+    assert AffiliationFingerprint.mark_unchanged(org.id, [records[1]._data], ttl=30)
+    assert not AffiliationFingerprint.mark_unchanged(org.id, [dict(records[1]._data, put_code=999)], ttl=30)
+    # all the identical rows get marked:
+    duplicates = [dict(records[1]._data, id=None), dict(records[1]._data, id=None)]
+    assert AffiliationFingerprint.mark_unchanged(org.id, duplicates, ttl=30) == duplicates
+    assert all(r["status_code"] == RecordStatus.UNCHANGED for r in duplicates)
+
+    # the profile update notifications caused by the pushes themselves are ignored:
+    assert AffiliationFingerprint.invalidate("0000-0003-1255-9023", datetime.utcnow()) == 0
+    assert AffiliationFingerprint.invalidate("0000-0003-1255-9023", datetime.utcnow() + timedelta(hours=1)) == 2
+    assert not AffiliationFingerprint.mark_unchanged(org.id, [records[1]._data], ttl=30)
+
+
+def test_task_counters(test_models):
+    """Test the incremental maintenance and reconciliation of the task progress counters."""
+    task = Task.get(id=1)
+    assert task.record_count == 0
+
+    Task.update_counts(task.id, processed_count=3, failed_count=1)
+    Task.update_counts(task.id, processed_count=-1, invited_count=0)
+    task = Task.get(id=1)
+    assert (task.processed_count, task.failed_count, task.invited_count) == (2, 1, 0)
+    assert task.error_count == 1
+
+    AffiliationRecord.update(processed_at=datetime(2018, 1, 1)).where(AffiliationRecord.id << [1, 2, 3]).execute()
+    AffiliationRecord.update(
+        status="ORCID API error", status_code=RecordStatus.ERROR).where(AffiliationRecord.id == 3).execute()
+    changes = task.reconcile_counts()
+    assert changes["total_count"] == (0, 10)
+    assert changes["processed_count"] == (2, 3)
+    assert changes["pushed_count"] == (0, 10)
+    assert "failed_count" not in changes
+    assert task.record_count == 10
+    task = Task.get(id=1)
+    assert (task.total_count, task.processed_count, task.failed_count, task.pushed_count) == (10, 3, 1, 10)
+    assert task.reconcile_counts() == {}
+
+    # the counters of the tasks uploaded before the counters were introduced get backfilled:
+    Task.update(total_count=0, processed_count=0, failed_count=0, pushed_count=0).execute()
+    backfill_task_counts()
+    task = Task.get(id=1)
+    assert (task.total_count, task.processed_count, task.failed_count, task.pushed_count) == (10, 3, 1, 10)
+    assert Task.select().where(Task.total_count == 0).count() == Task.select().count() - 1
+
+
+def test_profile_cache(test_models):
+    """Test ORCID profile summary cache."""
+    assert ProfileCache.get_summary(1, 1, 3600) is None
+    ProfileCache.set_summary(1, 1, {"works": {"group": []}})
+    ProfileCache.set_summary(1, 2, {"works": {"group": [1]}})
+    assert ProfileCache.get_summary(1, 1, 3600) == {"works": {"group": []}}
+    assert ProfileCache.get_summary(1, 2, 3600) == {"works": {"group": [1]}}
+    assert ProfileCache.stats() == dict(entries=2, hits=2, misses=1, hit_rate=0.6667)
+
+    # expired:
+    ProfileCache.update(fetched_at=datetime(2018, 1, 1)).where(ProfileCache.org_id == 2).execute()
+    assert ProfileCache.get_summary(1, 2, 3600) is None
+
+    assert ProfileCache.invalidate(1, 1) == 1
+    assert ProfileCache.get_summary(1, 1, 3600) is None
+    ProfileCache.set_summary(1, 1, {})
+    assert ProfileCache.invalidate(1) == 2
+    assert ProfileCache.stats() == dict(entries=0, hits=2, misses=3, hit_rate=0.4)
+
+
+def test_record_events(test_models):
+    """Test the record status code maintenance and the event log."""
+    ar = AffiliationRecord.get(id=1)
+    ar.add_status_line("Employment record was created.", RecordStatus.CREATED)
+    ar.add_status_line("Something went wrong.", RecordStatus.ERROR)
+    assert RecordEvent.select().count() == 0
+    ar.save()
+    ar = AffiliationRecord.get(id=1)
+    assert ar.status_code == RecordStatus.ERROR
+    assert ar.status.endswith(": Something went wrong.")
+    assert "created" not in ar.status
+    assert [(e.status_code, e.message) for e in RecordEvent.history(ar)] == [
+        (RecordStatus.CREATED, "Employment record was created."),
+        (RecordStatus.ERROR, "Something went wrong."),
+    ]
+
+    count = AffiliationRecord.update_status(
+        "The record was reset.", RecordStatus.RESET, AffiliationRecord.task_id == 1, processed_at=None)
+    assert count == 10
+    assert AffiliationRecord.select().where(AffiliationRecord.status_code == RecordStatus.RESET).count() == 10
+    assert RecordEvent.select().where(RecordEvent.status_code == RecordStatus.RESET,
+                                      RecordEvent.record_type == "affiliation_record").count() == 10
+    assert RecordEvent.history(AffiliationRecord.get(id=1)).count() == 3
+    assert RecordEvent.history(AffiliationRecord.get(id=2)).count() == 1
+
+
 def test_is_superuser():
     su = User(roles=Role.SUPERUSER)
     assert su.is_superuser
@@ -598,3 +825,63 @@ def test_base_model_to_dict():
 
     rec = TestTable.get(1)
     assert rec.test_field == "ABC123"
+
+
+def test_schema_validator():
+    """Test the validation of the uploaded item lists with the cached compiled schema."""
+    validator = schema_validator("work_schema.yaml")
+    assert validator is schema_validator("work_schema.yaml")
+
+    item = {"title": {"title": {"value": "TITLE"}, "subtitle": None}, "source": None, "type": "BOOK"}
+    items = [item, {"title": {"title": {"value": "TITLE #2"}}, "type": "BOOK"}]
+    assert validator.validate_items(items) == [
+        {"title": {"title": {"value": "TITLE"}}, "type": "BOOK"}, items[1]]
+    assert item["source"] is None  # the source data is not modified
+
+    with pytest.raises(SchemaError) as ex_info:
+        validator.validate_items(items + [{"title": "TITLE #3"}])
+    assert "/2" in str(ex_info.value)
+    assert "/0" not in str(ex_info.value)
+
+
+def test_load_work_records_in_chunks(test_models):
+    """Test the streaming loading of the work records with the related rows inserted in chunks."""
+    org = Organisation.create(name="TEST0")
+    items = [{
+        "title": {"title": {"value": f"TITLE #{i}"}},
+        "type": "BOOK_CHAPTER",
+        "citation": {"citation-type": "FORMATTED_UNSPECIFIED", "citation-value": f"TITLE #{i}"},
+        "invitees": [{
+            "identifier": f"{i:05d}",
+            "email": f"USER{i}@TEST.COM",
+            "first-name": "FN",
+            "last-name": f"LN{i}",
+            "put-code": None,
+        }],
+        "contributors": {"contributor": [{
+            "credit-name": {"value": f"CONTRIBUTOR #{i}"},
+            "contributor-attributes": {"contributor-role": "AUTHOR", "contributor-sequence": "FIRST"},
+        }]},
+        "external-ids": {"external-id": [{"external-id-type": "doi", "external-id-value": f"10.1000/{i}"}]},
+    } for i in range(7)]
+
+    with patch.dict("orcid_hub.models.app.config", LOAD_CHUNK_SIZE=3):
+        task = WorkRecord.load_from_json(StringIO(json.dumps(items)), filename="WORKS.json", org=org)
+        assert task.record_count == 7
+        assert Task.get(id=task.id).total_count == 7
+        records = list(task.work_records.order_by(WorkRecord.id))
+        assert [r.title for r in records] == [f"TITLE #{i}" for i in range(7)]
+        assert [r.work_invitees.get().email for r in records] == [f"user{i}@test.com" for i in range(7)]
+        assert [r.work_contributors.get().name for r in records] == [f"CONTRIBUTOR #{i}" for i in range(7)]
+        assert [r.external_ids.get().value for r in records] == [f"10.1000/{i}" for i in range(7)]
+
+        task = WorkRecord.load_from_json(yaml.safe_dump(items), filename="WORKS.yaml", org=org)
+        assert task.record_count == 7
+
+        task_count, record_count = Task.select().count(), WorkRecord.select().count()
+        items[4]["type"] = 42
+        with pytest.raises(SchemaError) as ex_info:
+            WorkRecord.load_from_json(json.dumps(items), filename="INVALID.json", org=org)
+        assert "/4" in str(ex_info.value)
+        assert Task.select().count() == task_count
+        assert WorkRecord.select().count() == record_count
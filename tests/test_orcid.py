@@ -3,15 +3,24 @@
 
 import json
 import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
 from unittest.mock import DEFAULT, MagicMock, Mock, call, patch
 
 import pytest
 import requests_oauthlib
+import urllib3
 from flask import session, url_for
 from flask_login import login_user
 
-from orcid_hub.models import Affiliation, OrcidApiCall, OrcidToken, Organisation, User, UserOrg  # noqa:E404
-from orcid_hub.orcid_client import ApiException, MemberAPI, api_client, configuration  # noqa:E404
+from orcid_hub import utils  # noqa:E404
+from orcid_hub.models import (Affiliation, OrcidApiCall, OrcidToken, Organisation, ProfileCache,  # noqa:E404
+                              TaskType, User, UserOrg)
+from orcid_hub.queuing import RateLimiter, RateLimitExceeded, retry_after  # noqa:E404
+from orcid_hub.orcid_client import (ApiCallLog, ApiException, CircuitBreakerOpen, MemberAPI,  # noqa:E404
+                                    OrcidApiClient, OrcidRESTClientObject, api_client, circuit_breaker,
+                                    configuration, http_pool, pack_text, unpack_text)
 
 fake_time = time.time()
 
@@ -28,19 +37,21 @@ def test_member_api(app, mocker):
         confirmed=True)
     UserOrg.create(user=user, org=org, affiliation=Affiliation.EDU)
 
-    MemberAPI(user=user)
-    assert configuration.access_token is None or configuration.access_token == ''
+    api = MemberAPI(user=user)
+    assert api.access_token == ''
 
-    MemberAPI(user=user, org=org)
-    assert configuration.access_token is None or configuration.access_token == ''
+    api = MemberAPI(user=user, org=org)
+    assert api.access_token == ''
 
-    MemberAPI(user=user, org=org, access_token="ACCESS000")
-    assert configuration.access_token == 'ACCESS000'
+    api = MemberAPI(user=user, org=org, access_token="ACCESS000")
+    assert api.access_token == 'ACCESS000'
+    assert configuration.access_token is None or configuration.access_token == ''
 
     OrcidToken.create(
         access_token="ACCESS123", user=user, org=org, scope="/read-limited,/activities/update", expires_in='121')
     api = MemberAPI(user=user, org=org)
-    assert configuration.access_token == "ACCESS123"
+    assert api.access_token == "ACCESS123"
+    assert configuration.access_token is None or configuration.access_token == ''
 
     with patch.object(
             api_client.ApiClient, "call_api", side_effect=ApiException(
@@ -54,9 +65,14 @@ def test_member_api(app, mocker):
     with patch.object(
             api_client.ApiClient,
             "call_api",
-            side_effect=ApiException(reason="FAILURE 999", status=999)) as call_api:
-        api.get_record()
-        app.logger.error.assert_called_with("ApiException Occured: (999)\nReason: FAILURE 999\n")
+            side_effect=ApiException(reason="NOT FOUND", status=404)) as call_api:
+        assert api.get_record() is None
+        app.logger.error.assert_called_with("ApiException Occured: (404)\nReason: NOT FOUND\n")
+
+    # ORCID is unavailable, so the caller should try again later:
+    for ex in [ApiException(reason="FAILURE 502", status=502), CircuitBreakerOpen("api.sandbox.orcid.org")]:
+        with patch.object(api_client.ApiClient, "call_api", side_effect=ex), pytest.raises(ApiException):
+            api.get_record()
 
     with patch.object(
             api_client.ApiClient, "call_api", side_effect=ApiException(
@@ -95,7 +111,7 @@ def test_member_api(app, mocker):
 
         request_mock.assert_called_once_with(
             _preload_content=False,
-            _request_timeout=None,
+            _request_timeout=(10.0, 60.0),
             body=None,
             headers={
                 "Accept": "application/json",
@@ -110,9 +126,9 @@ def test_member_api(app, mocker):
         assert api_call.response == '{"mock": "data"}'
         assert api_call.url == "https://api.sandbox.orcid.org/v2.0/1001-0001-0001-0001"
 
-        with patch.object(OrcidApiCall, "create", side_effect=Exception("FAILURE")) as create:
+        with patch.object(OrcidApiCall, "insert_many", side_effect=Exception("FAILURE")) as insert_many:
             api.get_record()
-            create.assert_called_once()
+            insert_many.assert_called_once()
 
     with patch.object(
             api_client.RESTClientObject.__base__,
@@ -126,6 +142,310 @@ def test_member_api(app, mocker):
         assert api_call.url == "https://api.sandbox.orcid.org/v2.0/1234-XXXX-XXXX-XXXX/person"
 
 
+def test_member_api_concurrent_credentials(app):
+    """Test that concurrent API calls on behalf of different users don't share the access token."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """ORCID API stub that responds with the requested ORCID iD and the used access token."""
+
+        def do_GET(self):  # noqa: N802
+            """Echo the ORCID iD and the bearer token."""
+            time.sleep(0.001)
+            data = json.dumps({
+                "orcid": self.path.split('/')[2],
+                "authorization": self.headers.get("Authorization"),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):  # noqa: D102
+            pass
+
+    class StubServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+
+    org = Organisation.create(name="THE CONCURRENT ORGANISATION", orcid_client_id="CLIENT-CONCURRENT")
+    users = [
+        User.create(email=f"concurrent{i}@test.test.net", orcid=f"1001-0001-0001-{i:04d}", organisation=org)
+        for i in range(50)
+    ]
+    errors = []
+
+    def call(user, round_no):
+        api = MemberAPI(org=org, user=user, access_token=f"TOKEN-{user.orcid}")
+        api.api_client.host = host
+        for _ in range(round_no):
+            resp = api.view_emails(user.orcid, _preload_content=False)
+            data = json.loads(resp.data)
+            if data != {"orcid": user.orcid, "authorization": f"Bearer TOKEN-{user.orcid}"}:
+                errors.append(data)
+
+    try:
+        with patch.object(ApiCallLog, "write"):  # DB is not shared with threads
+            threads = [Thread(target=call, args=(u, 5)) for u in users]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert errors == []
+    assert configuration.access_token is None or configuration.access_token == ''
+
+
+def test_api_call_log(app):
+    """Test the buffered ORCID API call logging."""
+    log = ApiCallLog()
+    written = []
+    with patch.object(ApiCallLog, "write", side_effect=written.extend) as write:
+        log.log(method="GET", url="https://api.test/0", status=200, response=b'{"data": 0}')
+        write.assert_called_once()
+        assert written[0]["response"] == '{"data": 0}'
+        written.clear()
+
+        app.config.update(ORCID_API_CALL_LOG_BUFFER_SIZE=3, ORCID_API_CALL_LOG_FLUSH_INTERVAL=3600)
+        try:
+            for i in range(1, 3):
+                assert log.log(method="GET", url=f"https://api.test/{i}", status=200)
+            assert written == []
+            # the full buffer gets written by the background thread:
+            log.log(method="POST", url="https://api.test/3", status=201)
+            for _ in range(100):
+                if written:
+                    break
+                time.sleep(0.01)
+            assert [e["url"] for e in written] == [f"https://api.test/{i}" for i in range(1, 4)]
+            assert log._thread.name == "api-call-log"
+
+            # only the failed calls get logged:
+            app.config.update(ORCID_API_CALL_LOG_SAMPLE_RATE=0.0, ORCID_API_CALL_LOG_MAX_BODY_SIZE=5)
+            assert not log.log(method="GET", url="https://api.test/4", status=200)
+            assert log.log(method="PUT", url="https://api.test/5", status=409, body="ABCDEFGH", response="ERROR!")
+            assert log.flush() == 1
+            assert written[-1]["body"] == "ABCDE... [3 more characters truncated]"
+            assert written[-1]["response"] == "ERROR... [1 more characters truncated]"
+
+            # the oldest entries get dropped when the DB cannot keep up:
+            written.clear()
+            with log._lock:
+                for i in range(40):
+                    log._buffer.append(dict(url=f"https://api.test/{i}"))
+            log.log(method="PUT", url="https://api.test/6", status=500)
+            assert log.dropped_count == 11
+            log.flush()
+            for _ in range(100):  # the buffer might be taken by the background thread
+                if len(written) == 30:
+                    break
+                time.sleep(0.01)
+            assert len(written) == 30
+            assert written[-1]["url"] == "https://api.test/6"
+        finally:
+            for name in ("FLUSH_INTERVAL", "SAMPLE_RATE", "MAX_BODY_SIZE"):
+                app.config.pop(f"ORCID_API_CALL_LOG_{name}", None)
+            app.config["ORCID_API_CALL_LOG_BUFFER_SIZE"] = 1
+
+    assert pack_text(None) is None
+    assert pack_text("ABC" * 10, 10) == "ABCABCABCA... [20 more characters truncated]"
+    packed = pack_text("ABC" * 1000, 100, compress=True)
+    assert packed.startswith("zlib:") and len(packed) < 100
+    assert unpack_text(packed) == "ABC" * 1000
+    assert unpack_text("ABC") == "ABC"
+
+
+def test_api_call_log_write(app):
+    """Test writing the API call log entries into the DB."""
+    log = ApiCallLog()
+    user = User.select().first()
+    OrcidApiCall.delete().execute()
+    log.write([
+        dict(user=user.id, method="GET", url=f"https://api.test/{i}", response_time_ms=i) for i in range(3)])
+    assert OrcidApiCall.select().where(OrcidApiCall.user == user).count() == 3
+    assert log.failed_count == 0
+
+    with patch.object(app.logger, "exception") as exception:
+        log.write([dict(user_id=user.id, method="GET", url="https://api.test/3")])
+        exception.assert_called_once()
+    assert log.failed_count == 1
+    assert OrcidApiCall.select().count() == 3
+
+
+def test_rate_limiter(app):
+    """Test the in-process token bucket rate limiting of the ORCID API calls."""
+    limiter = RateLimiter()
+    app.config.update(ORCID_API_GLOBAL_RATE=10, ORCID_API_GLOBAL_BURST=3, ORCID_API_CLIENT_RATE=1,
+                      ORCID_API_CLIENT_BURST=2)
+    try:
+        now = 1000.0
+        assert [limiter.take("CLIENT-1", now) for _ in range(3)] == [0, 0, 1.0]
+        # the global limit is hit:
+        assert [limiter.take("CLIENT-2", now) for _ in range(2)] == [0, pytest.approx(0.1)]
+        assert limiter.take("CLIENT-2", now + 0.1) == 0
+        assert limiter.take("CLIENT-1", now + 1) == 0
+
+        limiter.block("CLIENT-1", 120)
+        wait = limiter.take("CLIENT-1")
+        assert 119 < wait <= 120
+        with pytest.raises(RateLimitExceeded) as ex_info:
+            limiter.acquire("CLIENT-1", max_wait=1)
+        assert ex_info.value.retry_after > 119
+        assert limiter.acquire("CLIENT-3") >= 0
+
+        # ORCID responded with 429:
+        app.config.update(ORCID_API_CLIENT_RATE=1000, ORCID_API_CLIENT_BURST=1000)
+        api = MemberAPI(org=Organisation.get(name="TEST1"), access_token="ACCESS000")
+        assert api.api_client.client_id == "ABC123"
+        exception = ApiException(status=429)
+        exception.headers = {"Retry-After": "0.05"}
+        with patch("orcid_hub.orcid_client.rate_limiter", limiter), patch.object(
+                api_client.ApiClient, "call_api", side_effect=[exception, ({}, 200, {})]) as call_api:
+            api.view_emails("0000-0000-0000-0001")
+            assert call_api.call_count == 2
+            assert limiter._buckets["client:ABC123"][2] > 0
+
+        with patch("orcid_hub.orcid_client.rate_limiter", limiter), patch.object(
+                api_client.ApiClient, "call_api", side_effect=exception) as call_api, pytest.raises(ApiException):
+            api.view_emails("0000-0000-0000-0001")
+        assert call_api.call_count == 4
+    finally:
+        app.config.update(ORCID_API_GLOBAL_RATE=0, ORCID_API_CLIENT_RATE=0)
+
+    assert retry_after("3") == 3.0
+    assert retry_after("garbage", 5) == 5
+    assert retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_retries_and_circuit_breaker(app):
+    """Test the retries of the failed ORCID API calls and the circuit breaker."""
+    client = OrcidRESTClientObject()
+    url = "https://api.sandbox.orcid.org/v2.0/0000-0000-0000-0001"
+    ok = Mock(status=200, data=None)
+    with patch.object(OrcidRESTClientObject, "send", side_effect=[ApiException(status=502), ok]) as send, \
+            patch("orcid_hub.orcid_client.sleep") as sleep:
+        assert client.request("GET", url) == ok
+        assert send.call_count == 2
+        assert 0.25 <= sleep.call_args[0][0] <= 0.5
+
+    # POST gets retried only if the connection couldn't be established:
+    with patch.object(OrcidRESTClientObject, "send", side_effect=ApiException(status=502)) as send, \
+            pytest.raises(ApiException):
+        client.request("POST", url, body={})
+    assert send.call_count == 1
+    error = urllib3.exceptions.MaxRetryError(None, url, urllib3.exceptions.NewConnectionError(None, "FAILURE"))
+    with patch.object(OrcidRESTClientObject, "send", side_effect=[error, ok]) as send, \
+            patch("orcid_hub.orcid_client.sleep"):
+        assert client.request("POST", url, body={}) == ok
+    # 4xx errors are not retried:
+    with patch.object(OrcidRESTClientObject, "send", side_effect=ApiException(status=404)) as send, \
+            pytest.raises(ApiException):
+        client.request("GET", url)
+    assert send.call_count == 1
+
+    app.config.update(ORCID_API_BREAKER_THRESHOLD=3, ORCID_API_BREAKER_RESET_TIMEOUT=0.1)
+    try:
+        with patch.object(OrcidRESTClientObject, "send", side_effect=ApiException(status=503)) as send, \
+                patch("orcid_hub.orcid_client.sleep"):
+            with pytest.raises(CircuitBreakerOpen):
+                client.request("GET", url)
+            assert send.call_count == 3
+            assert circuit_breaker.is_open()
+            assert utils.RECORD_TYPES[TaskType.WORK].pipeline().select(100) == []
+            with pytest.raises(CircuitBreakerOpen):
+                client.request("GET", url)
+            assert send.call_count == 3
+
+        # a successful trial call closes the breaker:
+        time.sleep(0.15)
+        assert not circuit_breaker.is_open()
+        with patch.object(OrcidRESTClientObject, "send", return_value=ok) as send:
+            assert client.request("GET", url) == ok
+        assert not circuit_breaker.is_open()
+        assert not circuit_breaker._failures
+    finally:
+        app.config.pop("ORCID_API_BREAKER_THRESHOLD")
+        app.config.pop("ORCID_API_BREAKER_RESET_TIMEOUT")
+        circuit_breaker.success("api.sandbox.orcid.org")
+
+
+def test_raw_responses(app):
+    """Test the raw (without the model objects) response deserialization."""
+    response = Mock(data='{"put-code": 123, "title": {"title": {"value": "TITLE"}}, "type": "BOOK"}')
+    work = OrcidApiClient().deserialize(response, "Work")
+    assert work.put_code == 123
+    assert work.title.title.value == "TITLE"
+    assert OrcidApiClient(raw=True).deserialize(response, "Work") == {
+        "put-code": 123, "title": {"title": {"value": "TITLE"}}, "type": "BOOK"}
+    assert OrcidApiClient(raw=True).deserialize(Mock(data="NOT JSON"), "str") == "NOT JSON"
+
+    api = MemberAPI(org=Organisation.get(name="TEST1"), access_token="ACCESS000", raw=True)
+    assert api.api_client.raw
+    with patch.object(
+            api_client.RESTClientObject.__base__, "request",
+            return_value=Mock(status=200, data='{"last-modified-date": null, "group": []}')):
+        assert api.view_works("0000-0000-0000-0001") == {"last-modified-date": None, "group": []}
+
+
+def test_http_pool(app):
+    """Test the process-wide pooled HTTP layer and its counters."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """Keep-alive server setting a cookie."""
+
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # noqa: N802
+            """Respond with "OK"."""
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.send_header("Set-Cookie", "SESSION=SECRET")
+            self.end_headers()
+            self.wfile.write(b"OK")
+
+        def log_message(self, *args):  # noqa: D102
+            pass
+
+    class StubServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    http_pool.clear()
+    http_pool.stats.reset()
+    try:
+        for _ in range(5):
+            assert http_pool.get(url).text == "OK"
+        assert http_pool.stats.checkouts == 5
+        assert http_pool.stats.handshakes == 1
+        assert http_pool.stats.reused == 4
+        assert not http_pool.session.cookies
+
+        # all the API clients share the same connection pool:
+        assert OrcidRESTClientObject().pool_manager is OrcidApiClient().rest_client.pool_manager
+        for _ in range(3):
+            assert OrcidRESTClientObject().pool_manager.request("GET", url).data == b"OK"
+        assert http_pool.stats.as_dict() == dict(
+            checkouts=8, handshakes=2, reused=6, pool_waits=0, pool_wait_time=0, overflows=0)
+
+        # a forked process sets up its own pool:
+        session, pool_manager = http_pool.session, http_pool.pool_manager
+        with patch("orcid_hub.orcid_client.os.getpid", return_value=-1):
+            assert http_pool.session is not session
+            assert http_pool.pool_manager is not pool_manager
+    finally:
+        http_pool.clear()
+        server.shutdown()
+        server.server_close()
+
+
 def test_is_emp_or_edu_record_present(app, mocker):
     """Test 'is_emp_or_edu_record_present' method."""
     mocker.patch.multiple("orcid_hub.app.logger", error=DEFAULT, exception=DEFAULT, info=DEFAULT)
@@ -389,6 +709,24 @@ def test_profile(request_ctx):
         assert b"ABC123" in rv.data
 
 
+@patch.object(requests_oauthlib.OAuth2Session, "get",
+              lambda self, *args, **kwargs: make_fake_response('{}', status_code=401))
+def test_profile_revoked_token(request_ctx):
+    """Test that the revoked token gets detected even if the profile summary is cached."""
+    with request_ctx("/profile") as ctx:
+        org = Organisation.create(name="THE ORGANISATION", confirmed=True)
+        test_user = User.create(
+            email="test123@test.test.net", organisation=org, orcid="ABC123", confirmed=True)
+        OrcidToken.create(user=test_user, org=org, scope="/read-limited,/activities/update", access_token="ABC1234")
+        ProfileCache.set_summary(test_user.id, org.id, {"works": {"group": []}})
+        login_user(test_user, remember=True)
+
+        rv = ctx.app.full_dispatch_request()
+        assert rv.status_code == 302
+        assert rv.location == url_for("link")
+        assert not OrcidToken.select().where(OrcidToken.user_id == test_user.id).exists()
+
+
 def test_profile_wo_orcid(request_ctx):
     """Test a user profile that doesn't hava an ORCID."""
     with request_ctx("/profile") as ctx:
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 """Tests for util functions."""
 
+import json
 import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
 from itertools import groupby
 from unittest.mock import Mock, patch
 
@@ -12,9 +17,11 @@ from peewee import JOIN
 
 from orcid_hub import utils
 from orcid_hub.models import (
-    AffiliationRecord, ExternalId, File, FundingContributor, FundingInvitees, FundingRecord,
-    OrcidToken, Organisation, Role, Task, User, UserInvitation, UserOrg, WorkRecord, WorkInvitees,
-    WorkExternalId, WorkContributor, PeerReviewRecord, PeerReviewInvitee, PeerReviewExternalId)
+    AffiliationRecord, ExternalId, File, FundingContributor, FundingInvitees, FundingRecord, LoadStatus,
+    ModelException, OrcidToken, Organisation, PartialDate, RecordStatus, Role, Task, TaskType, User,
+    UserInvitation, UserOrg,
+    WorkRecord, WorkInvitees, WorkExternalId, WorkContributor, PeerReviewRecord, PeerReviewInvitee,
+    PeerReviewExternalId)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -27,6 +34,61 @@ def test_unique_everseen():
     assert list(utils.unique_everseen('ABBCcAD', str.lower)) == list("ABCD")
 
 
+def test_put_code_matcher():
+    """Test the indexed matching of the records and ORCID entry summaries."""
+
+    def work(put_code, title, work_type="JOURNAL_ARTICLE"):
+        return {"put-code": put_code, "title": {"title": {"value": title}}, "type": work_type}
+
+    def work_keys(r):
+        return None, [(utils.get_val(r, "title", "title", "value"), r.get("type"))]
+
+    matcher = utils.PutCodeMatcher(
+        [work(1, "ABC"), work(2, "ABC"), work(3, "XYZ"), work(4, "ABC", "BOOK")], work_keys, taken={2})
+    assert matcher.match(fallback_keys=[("ABC", "JOURNAL_ARTICLE")]) == (1, False)
+    assert matcher.match(fallback_keys=[("ABC", "JOURNAL_ARTICLE")]) == (None, False)
+    assert matcher.match(fallback_keys=[("ABC", "BOOK"), ("XYZ", "JOURNAL_ARTICLE")]) == (3, False)
+    assert matcher.taken == {1, 2, 3}
+
+    def employment(put_code, department=None, role=None, start_date=None, city="Auckland"):
+        return {
+            "put-code": put_code,
+            "department-name": department,
+            "role-title": role,
+            "start-date": start_date and PartialDate.create(start_date).as_orcid_dict(),
+            "end-date": None,
+            "organization": {"name": "ORG", "address": {"city": city, "region": None, "country": "NZ"}},
+        }
+
+    record = AffiliationRecord(
+        department="DEP", role="ROLE", start_date=PartialDate.create("2001-01"), organisation="ORG",
+        city="Auckland", country="NZ")
+    key, fallback_keys = utils.affiliation_record_keys(record)
+    employments = [employment(1, "DEP", "ROLE", "2001-01", city="Wellington"), employment(2, "DEP", "ROLE", "2001-01")]
+    matcher = utils.PutCodeMatcher(employments, utils.affiliation_summary_keys)
+    # the first matching entry wins:
+    assert matcher.match(key, fallback_keys) == (1, False)
+    matcher = utils.PutCodeMatcher(employments, utils.affiliation_summary_keys, taken={1})
+    assert matcher.match(key, fallback_keys) == (2, True)
+    assert matcher.exact(key) == 2
+    assert matcher.exact(key, 2) == 2
+    # an entry without any details matches any record:
+    matcher = utils.PutCodeMatcher([employment(3)] + employments, utils.affiliation_summary_keys)
+    assert matcher.match(key, fallback_keys) == (3, False)
+
+    # Large synthetic profile with 5 entries with the same title:
+    works = [work(i, f"TITLE #{i % 2000}") for i in range(10000)]
+    start = time.time()
+    matcher = utils.PutCodeMatcher(works, work_keys)
+    put_codes = [
+        matcher.match(fallback_keys=[(f"TITLE #{i % 2000}", "JOURNAL_ARTICLE")])[0] for i in range(10000)
+    ]
+    elapsed = time.time() - start
+    assert put_codes == list(range(10000))
+    assert matcher.match(fallback_keys=[("TITLE #1", "JOURNAL_ARTICLE")]) == (None, False)
+    assert elapsed < 2.0, f"matching 10000 records took {elapsed:.2f}s"
+
+
 def test_append_qs():
     """Test URL modication."""
     assert utils.append_qs(
@@ -95,6 +157,380 @@ def test_process_records(app):
     utils.process_records(0)
 
 
+def test_plan_affiliation_records(app):
+    """Test the classification of the affiliation records with a fixed query budget."""
+    org = Organisation.create(
+        name="THE PLANNING ORGANISATION",
+        tuakiri_name="THE PLANNING ORGANISATION",
+        orcid_client_id="APP-PLANNING",
+        confirmed=True)
+    inviter = User.create(email="admin@planning.edu", name="ADMIN", organisation=org, confirmed=True)
+    task = Task.create(org=org, filename="planning.csv", created_by=inviter)
+
+    for i in range(40):
+        email = f"researcher{i}@planning.edu"
+        if i % 2 == 0:
+            u = User.create(
+                email=email, orcid=f"0000-0000-0000-{i:04d}", organisation=org, confirmed=True)
+            if i % 4 == 0:
+                OrcidToken.create(
+                    user=u,
+                    org=org,
+                    scope="/read-limited,/activities/update",
+                    access_token=f"PLANNING-TOKEN-{i}")
+        for affiliation_type in ("staff", "student"):
+            AffiliationRecord.create(
+                task=task,
+                is_active=True,
+                email=email,
+                first_name=f"FIRST NAME #{i}",
+                last_name=f"LAST NAME #{i}",
+                affiliation_type=affiliation_type,
+                status="The record was reset at 2018-01-01T00:00:00" if i == 1 else None,
+                status_code=RecordStatus.RESET if i == 1 else None)
+
+    rows = list(utils.affiliation_records_to_process(max_rows=1000))
+    db = Task._meta.database
+    with patch.object(db, "execute_sql", wraps=db.execute_sql) as execute_sql:
+        plan = utils.plan_affiliation_records(rows)
+        assert execute_sql.call_count <= 4
+
+    assert len(plan.push) == 10
+    assert all(len(records) == 2 for _, _, _, records in plan.push)
+    assert all(u.orcid for _, u, _, _ in plan.push)
+    assert len(plan.invite) == 30
+    assert all(affiliations == {"staff", "student"} for _, _, affiliations, _ in plan.invite)
+    assert all(invitation[0] == inviter and invitation[1] == org for _, invitation, _, _ in plan.invite)
+    expiry = {invitation[2]: token_expiry for _, invitation, _, token_expiry in plan.invite}
+    assert expiry["researcher1@planning.edu"] == 1300000
+    assert expiry["researcher3@planning.edu"] == 2600000
+    assert not plan.skip
+
+    plan = utils.plan_affiliation_records(rows + rows[:5])
+    assert len(plan.skip) == 5
+
+    assert utils.plan_affiliation_records([]) == ([], [], [], )
+
+
+def test_push_executor(app):
+    """Test concurrent push of user batches with per-client and per-user limits."""
+    org0, org1 = Organisation.select().limit(2)
+    org0.orcid_client_id, org1.orcid_client_id = "CLIENT-0", "CLIENT-1"
+
+    with pytest.raises(ZeroDivisionError), utils.PushExecutor(max_workers=1) as executor:
+        assert executor._pool is None
+        calls = []
+        executor.submit(org0, 1, lambda: 1 / 0)
+        executor.submit(org0, 1, lambda: calls.append(1), record_count=3)
+    assert calls == [1]
+    assert executor.record_count == 3
+
+    lock = threading.Lock()
+    in_flight = {"CLIENT-0": 0, "CLIENT-1": 0}
+    peak = {"CLIENT-0": 0, "CLIENT-1": 0, "total": 0}
+    pushed = []
+
+    def push(org, user_id, seq):
+        with lock:
+            in_flight[org.orcid_client_id] += 1
+            peak[org.orcid_client_id] = max(peak[org.orcid_client_id], in_flight[org.orcid_client_id])
+            peak["total"] = max(peak["total"], sum(in_flight.values()))
+        time.sleep(0.01)
+        with lock:
+            pushed.append((user_id, seq))
+            in_flight[org.orcid_client_id] -= 1
+
+    with utils.PushExecutor(max_workers=5, max_per_client=3) as executor:
+        for seq in range(3):
+            for user_id in range(10):
+                org = org0 if user_id % 2 else org1
+                executor.submit(org, user_id, partial(push, org, user_id, seq), record_count=2)
+    assert executor.record_count == 60
+    assert len(pushed) == 30
+    assert peak["CLIENT-0"] <= 3 and peak["CLIENT-1"] <= 3
+    assert peak["total"] <= 5
+    for user_id in range(10):
+        assert [seq for uid, seq in pushed if uid == user_id] == [0, 1, 2]
+    assert executor.throughput > 0
+
+    # the other jobs get completed and the failure is re-raised at the end:
+    pushed.clear()
+    with pytest.raises(ZeroDivisionError), utils.PushExecutor(max_workers=2) as executor:
+        executor.submit(org0, 1, lambda: 1 / 0)
+        for user_id in range(2, 5):
+            executor.submit(org1, user_id, partial(push, org1, user_id, 0))
+    assert sorted(pushed) == [(2, 0), (3, 0), (4, 0)]
+    assert executor.record_count == 3
+    assert len(executor.errors) == 1
+
+
+def test_batch_pipeline(app):
+    """Test the batch record processing pipeline stages and statistics."""
+    org = Organisation.get(name="TEST0")
+    inviter = User.get(email="admin@test0.edu")
+    task = Task.create(org=org, filename="pipeline.json", created_by=inviter, task_type=TaskType.WORK)
+    for i in range(3):
+        wr = WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", citation_type="FORMATTED_UNSPECIFIED",
+                               citation_value="CITATION", is_active=True)
+        for j in range(2):
+            WorkInvitees.create(work_record=wr, email=f"pipeline{j}@test0.edu", first_name=f"NAME #{j}")
+
+    pipeline = utils.RECORD_TYPES[TaskType.WORK].pipeline()
+    rows = pipeline.select(100)
+    assert len(rows) == 6
+    plan = pipeline.group(rows)
+    assert plan.push == []
+    assert len(plan.invite) == 2
+    assert {i[1][2] for i in plan.invite} == {"pipeline0@test0.edu", "pipeline1@test0.edu"}
+    assert all(i[1][0] == inviter and i[1][1] == org and i[2] == 2600000 for i in plan.invite)
+
+    # only the reset invitees of the same task get the shorter token expiry:
+    other_task = Task.create(org=org, filename="other.json", created_by=inviter, task_type=TaskType.WORK)
+    wr = WorkRecord.create(task=other_task, title="OTHER", type="BOOK", citation_type="FORMATTED_UNSPECIFIED",
+                           citation_value="CITATION", is_active=True, processed_at=datetime.utcnow())
+    WorkInvitees.create(work_record=wr, email="pipeline0@test0.edu", status_code=RecordStatus.RESET,
+                        processed_at=datetime.utcnow())
+    assert all(i[2] == 2600000 for i in pipeline.group(rows).invite)
+    WorkInvitees.update(status_code=RecordStatus.RESET).where(
+        WorkInvitees.email == "pipeline0@test0.edu",
+        WorkInvitees.work_record << task.work_records.select(WorkRecord.id)).execute()
+    assert {i[1][2]: i[2] for i in pipeline.group(rows).invite} == {
+        "pipeline0@test0.edu": 1300000, "pipeline1@test0.edu": 2600000}
+    WorkInvitees.update(status_code=None).where(WorkInvitees.status_code == RecordStatus.RESET).execute()
+    # the selected rows stay claimed until they get released:
+    assert pipeline.select(100) == []
+    pipeline.release()
+
+    with patch.object(utils, "send_work_funding_peer_review_invitation") as send_invitation:
+        stats = pipeline.run(100)
+    assert send_invitation.call_count == 2
+    assert list(stats) == list(utils.BatchPipeline.stages)
+    assert stats["select"].count == 6
+    assert stats["invite"].count == 2
+    assert stats["push"].count == 0
+    assert stats["finalize"].count == 0
+    assert all(s.elapsed >= 0 for s in stats.values())
+    assert WorkInvitees.select().where(WorkInvitees.status_code == RecordStatus.SENT).count() == 6
+    assert Task.get(id=task.id).invited_count == 2
+
+
+def test_batch_pipeline_push_failure(app):
+    """Test that the records pushed successfully get finalized even if the push of another user fails."""
+    org = Organisation.get(name="TEST0")
+    inviter = User.get(email="admin@test0.edu")
+    task = Task.create(org=org, filename="failure.json", created_by=inviter, task_type=TaskType.WORK)
+    users = []
+    for i in range(2):
+        user = User.create(email=f"failure{i}@test0.edu", name=f"USER #{i}", orcid=f"0000-0000-0000-000{i}",
+                           confirmed=True, organisation=org)
+        OrcidToken.create(user=user, org=org, scope="/read-limited,/activities/update", access_token=f"TOKEN{i}")
+        wr = WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", citation_type="FORMATTED_UNSPECIFIED",
+                               citation_value="CITATION", is_active=True)
+        WorkInvitees.create(work_record=wr, email=user.email, orcid=user.orcid)
+        users.append(user)
+
+    def push(user, org_id, records, *args, **kwargs):
+        if user == users[0]:
+            raise Exception("ORCID FAILURE")
+        for r in records:
+            wi = r.work_record.work_invitees
+            wi.add_status_line("Work record was created.", RecordStatus.CREATED)
+            wi.put_code, wi.processed_at = 123, datetime.utcnow()
+            wi.save()
+
+    descriptor = utils.RECORD_TYPES[TaskType.WORK]
+    with patch.object(descriptor, "push", side_effect=push), pytest.raises(Exception, match="ORCID FAILURE"):
+        descriptor.pipeline().run(100)
+
+    records = list(task.work_records.order_by(WorkRecord.id))
+    assert records[0].processed_at is None
+    assert records[1].processed_at is not None and records[1].status_code == RecordStatus.PROCESSED
+    task = Task.get(id=task.id)
+    assert (task.processed_count, task.failed_count, task.pushed_count) == (1, 0, 1)
+    assert task.completed_at is None
+    # the failed records get processed by the next run:
+    assert [r.work_record.id for r in descriptor.pipeline().select(100)] == [records[0].id]
+
+
+def test_batch_finalize(app):
+    """Test the completion of the records and tasks with the grouped queries."""
+    org = Organisation.get(name="TEST0")
+    inviter = User.get(email="admin@test0.edu")
+    task = Task.create(org=org, filename="finalize.json", created_by=inviter, task_type=TaskType.WORK)
+    records = [
+        WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", citation_type="FORMATTED_UNSPECIFIED",
+                          citation_value="CITATION", is_active=True) for i in range(3)]
+    for r in records:
+        for j in range(2):
+            WorkInvitees.create(work_record=r, email=f"finalize{j}@test0.edu", first_name=f"NAME #{j}")
+    pipeline = utils.RECORD_TYPES[TaskType.WORK].pipeline()
+    rows = pipeline.select(100)
+    assert len(rows) == 6
+
+    # 1st record: all invitees processed; 2nd: failed; 3rd: one invitee is still pending:
+    now = datetime.utcnow()
+    WorkInvitees.update(processed_at=now).where(WorkInvitees.work_record << [r.id for r in records[:2]]).execute()
+    WorkInvitees.update(processed_at=now).where(WorkInvitees.work_record == records[2],
+                                                WorkInvitees.email == "finalize0@test0.edu").execute()
+    WorkRecord.update(status_code=RecordStatus.ERROR).where(WorkRecord.id == records[1].id).execute()
+    assert pipeline.finalize(rows) == []
+    assert [(r.processed_at is not None, r.status_code) for r in WorkRecord.select().order_by(WorkRecord.id)] == [
+        (True, RecordStatus.PROCESSED), (True, RecordStatus.ERROR), (False, None)]
+    task = Task.get(id=task.id)
+    assert task.processed_count == 2
+    assert task.failed_count == 1
+    assert task.completed_at is None
+
+    WorkInvitees.update(processed_at=now).execute()
+    completed_tasks = pipeline.finalize(rows)
+    assert [t.id for t in completed_tasks] == [task.id]
+    assert completed_tasks[0].created_by == inviter
+    assert completed_tasks[0].completion_stats == dict(row_count=3, error_count=1)
+    assert pipeline.notification_kwargs(completed_tasks[0])["error_count"] == 1
+    task = Task.get(id=task.id)
+    assert task.completed_at is not None
+    assert task.processed_count == 3
+
+
+def test_claim_records(app):
+    """Test that the records claimed by one worker are not processed by another one."""
+    org = Organisation.get(name="TEST0")
+    task = Task.create(org=org, filename="claim.csv", created_by=User.get(email="admin@test0.edu"))
+    AffiliationRecord.insert_many(
+        dict(task=task, email=f"claim{i}@test0.edu", first_name="FN", last_name="LN",
+             affiliation_type="staff", is_active=True) for i in range(10)).execute()
+
+    worker0 = utils.RECORD_TYPES[TaskType.AFFILIATION].pipeline()
+    worker1 = utils.RECORD_TYPES[TaskType.AFFILIATION].pipeline()
+    rows = worker0.select(6)
+    assert len(rows) == 6
+    claimed = {r.affiliation_record.id for r in rows}
+    rows = worker1.select(100)
+    assert len(rows) == 4
+    assert not claimed & {r.affiliation_record.id for r in rows}
+    assert AffiliationRecord.select().where(AffiliationRecord.lease_token.is_null(False)).count() == 10
+
+    worker0.release()
+    assert AffiliationRecord.select().where(AffiliationRecord.lease_token == worker1.lease_token).count() == 4
+    assert {r.affiliation_record.id for r in worker0.select(100)} == claimed
+
+    # expired leases can be claimed by other workers:
+    AffiliationRecord.update(leased_until=datetime.utcnow() - timedelta(seconds=1)).execute()
+    assert len(worker1.select(100)) == 10
+
+
+def test_concurrent_claims(app):
+    """Test that the pipelines claiming from the same backlog concurrently get disjoint full claims."""
+    org = Organisation.get(name="TEST0")
+    task = Task.create(org=org, filename="concurrent.csv", created_by=User.get(email="admin@test0.edu"))
+    AffiliationRecord.insert_many(
+        dict(task=task, email=f"concurrent{i}@test0.edu", first_name="FN", last_name="LN",
+             affiliation_type="staff", is_active=True) for i in range(10)).execute()
+
+    descriptor = utils.RECORD_TYPES[TaskType.AFFILIATION]
+    worker0, worker1 = descriptor.pipeline(), descriptor.pipeline()
+    allocate = descriptor.scheduler.allocate
+    claims = []
+
+    def allocate_concurrently(*args, **kwargs):
+        # the other worker claims its rows after the queue depths were taken:
+        if not claims:
+            claims.append(set())
+            claims[0].update(r.affiliation_record.id for r in worker1.select(4))
+        return allocate(*args, **kwargs)
+
+    with patch.object(descriptor.scheduler, "allocate", side_effect=allocate_concurrently):
+        claims.append({r.affiliation_record.id for r in worker0.select(4)})
+    claims.append({r.affiliation_record.id for r in worker1.select(100)})
+    assert [len(c) for c in claims] == [4, 4, 2]
+    assert set.union(*claims) == {r.id for r in task.affiliation_records}
+    assert AffiliationRecord.select().where(AffiliationRecord.lease_token == worker0.lease_token).count() == 4
+
+
+def test_drain_records(app):
+    """Test the idle back-off of the draining worker."""
+    with patch.object(utils, "sleep") as sleep, patch.object(
+            utils.BatchPipeline, "run",
+            side_effect=[{"select": utils.StageStats(n, 0)} for n in [3, 0, 0, 0, 0] + [0] * 15]):
+        assert utils.drain_records(10, min_sleep=1, max_sleep=4, max_runs=5) == 3
+    delays = [c[0][0] for c in sleep.call_args_list]
+    assert len(delays) == 4
+    assert 0.5 <= delays[0] <= 1
+    assert 1 <= delays[1] <= 2
+    assert 2 <= delays[2] <= 4
+    assert 2 <= delays[3] <= 4
+
+
+def test_fair_scheduler():
+    """Test the deficit round-robin sharing of the batch capacity among organisations and tasks."""
+    scheduler = utils.FairScheduler()
+    # a large upload of the organisation 1 and small ones of the organisations 2 and 3:
+    depths = {(1, 10): 50000, (2, 20): 3, (2, 21): 2, (3, 30): 1}
+    allocated = scheduler.allocate(depths, {}, 20)
+    assert sum(allocated.values()) == 20
+    assert allocated[(2, 20)] + allocated[(2, 21)] == 5
+    assert allocated[(2, 20)] >= 2 and allocated[(2, 21)] == 2
+    assert allocated[(3, 30)] == 1
+    assert allocated[(1, 10)] == 14
+
+    assert scheduler.allocate({}, {}, 20) == {}
+    assert scheduler.allocate(depths, {}, 0) == {}
+
+    # weighted share:
+    scheduler = utils.FairScheduler()
+    depths = {(1, 10): 1000, (2, 20): 1000}
+    allocated = scheduler.allocate(depths, {1: 3, 2: 1}, 20)
+    assert allocated[(1, 10)] == 15
+    assert allocated[(2, 20)] == 5
+
+    # the capacity smaller than the number of the organisations gets rotated:
+    scheduler = utils.FairScheduler()
+    depths = {(org_id, org_id * 10): 100 for org_id in range(1, 6)}
+    served = set()
+    for _ in range(5):
+        allocated = scheduler.allocate(depths, {}, 2)
+        assert sum(allocated.values()) == 2
+        served.update(org_id for org_id, _ in allocated)
+    assert served == {1, 2, 3, 4, 5}
+
+    # each run is executed by a new process, so the state is kept in Redis between the runs:
+    store = {}
+    redis = Mock(get=store.get, set=lambda key, value, ex=None: store.update({key: value}))
+    served = set()
+    for _ in range(5):
+        scheduler = utils.FairScheduler(key="TEST", redis_url="redis://test")
+        scheduler._redis = redis
+        allocated = scheduler.allocate(depths, {}, 2)
+        assert sum(allocated.values()) == 2
+        served.update(org_id for org_id, _ in allocated)
+    assert served == {1, 2, 3, 4, 5}
+    assert json.loads(store["orcidhub:scheduler:TEST"])["last_org_id"] == 5
+
+    # without Redis every new process starts with the first organisation:
+    for _ in range(2):
+        scheduler = utils.FairScheduler(key="TEST")
+        assert [org_id for org_id, _ in scheduler.allocate(depths, {}, 2)] == [1, 2]
+
+
+def test_fair_batch_selection(app):
+    """Test that the small uploads get processed along with a large one."""
+    org0, org1 = Organisation.get(name="TEST0"), Organisation.get(name="TEST1")
+    for org, count in [(org0, 40), (org1, 2)]:
+        task = Task.create(
+            org=org, filename=f"{org.name}.csv", created_by=User.get(email=f"admin@{org.name.lower()}.edu"))
+        AffiliationRecord.insert_many(
+            dict(task=task, email=f"fair{i}@{org.name.lower()}.edu", first_name="FN", last_name="LN",
+                 affiliation_type="staff", is_active=True) for i in range(count)).execute()
+
+    depths = utils.batch_queue_depth()
+    assert depths[org0.id]["AFFILIATION"] == 40
+    assert depths[org1.id]["AFFILIATION"] == 2
+
+    rows = utils.RECORD_TYPES[TaskType.AFFILIATION].pipeline().select(10)
+    assert len(rows) == 10
+    assert len([r for r in rows if r.org_id == org1.id]) == 2
+
+
 def send_mail_mock(*argvs, **kwargs):
     """Mock email invitation."""
     logger.info(f"***\nActually email invitation was mocked, so no email sent!!!!!")
@@ -616,6 +1052,90 @@ def test_create_or_update_work(email_patch, patch, test_db, request_ctx):
     assert "12344" == work_invitees.orcid
 
 
+@patch("orcid_hub.utils.send_email", side_effect=send_mail_mock)
+@patch("orcid_hub.orcid_client.MemberAPI.get_record", side_effect=get_record_mock)
+def test_create_works_in_bulk(get_record, send_email, app, request_ctx):
+    """Test the creation of the new works with the bulk endpoint."""
+    org = Organisation.create(
+        name="THE BULK ORGANISATION",
+        tuakiri_name="THE BULK ORGANISATION",
+        confirmed=True,
+        orcid_client_id="APP-BULK0000000000",
+        orcid_secret="Client Secret")
+    u = User.create(
+        email="bulk@test.test.net",
+        name="TEST USER",
+        roles=Role.RESEARCHER,
+        orcid="0000-0000-0000-0BLK",
+        confirmed=True,
+        organisation=org)
+    UserOrg.create(user=u, org=org)
+    OrcidToken.create(user=u, org=org, scope="/read-limited,/activities/update", access_token="BULK-TOKEN")
+    t = Task.create(org=org, filename="bulk.json", created_by=u, updated_by=u, task_type=TaskType.WORK)
+    for no in range(3):
+        wr = WorkRecord.create(
+            task=t,
+            title=f"BULK WORK #{no}",
+            type="BOOK_CHAPTER",
+            citation_type="MLA",
+            citation_value=f"BULK WORK #{no}",
+            is_active=True)
+        WorkInvitees.create(work_record=wr, email=u.email, orcid=u.orcid, visibility="PUBLIC")
+
+    responses = [
+        {"bulk": [
+            {"work": {"put-code": 1000, "title": {"title": {"value": "BULK WORK #0"}}}},
+            {"error": {"response-code": 409, "developer-message": "DUPLICATE", "user-message": "DUPLICATE WORK"}},
+        ]},
+        {"bulk": [{"work": {"put-code": 1002, "title": {"title": {"value": "BULK WORK #2"}}}}]},
+    ]
+    app.config["ORCID_API_BULK_SIZE"] = 2
+    try:
+        with patch.object(
+                utils.orcid_client.OrcidApiClient, "call_api",
+                side_effect=[Mock(data=json.dumps(r)) for r in responses]) as call_api:
+            utils.process_work_records()
+    finally:
+        app.config["ORCID_API_BULK_SIZE"] = 100
+
+    assert call_api.call_count == 2
+    args, kwargs = call_api.call_args_list[0]
+    assert args == ("/v2.1/{orcid}/works", "POST")
+    assert kwargs["path_params"] == {"orcid": u.orcid}
+    assert [w["work"]["title"]["title"]["value"] for w in kwargs["body"]["bulk"]] == ["BULK WORK #0", "BULK WORK #1"]
+    assert len(call_api.call_args_list[1][1]["body"]["bulk"]) == 1
+
+    invitees = WorkInvitees.select().join(WorkRecord).where(WorkRecord.task == t).order_by(WorkRecord.title)
+    assert [wi.put_code for wi in invitees] == [1000, None, 1002]
+    assert [wi.orcid for wi in invitees] == [u.orcid] * 3
+    assert all(wi.processed_at for wi in invitees)
+    assert "created" in invitees[0].status
+    assert "409: DUPLICATE WORK" in invitees[1].status
+
+    # the error body of a failed bulk call isn't necessarily JSON:
+    t = Task.create(org=org, filename="bulk-error.json", created_by=u, updated_by=u, task_type=TaskType.WORK)
+    for no in range(2):
+        wr = WorkRecord.create(
+            task=t,
+            title=f"BULK ERROR #{no}",
+            type="BOOK_CHAPTER",
+            citation_type="MLA",
+            citation_value=f"BULK ERROR #{no}",
+            is_active=True)
+        WorkInvitees.create(work_record=wr, email=u.email, orcid=u.orcid, visibility="PUBLIC")
+    ex = utils.orcid_client.ApiException(status=500, reason="Internal Server Error")
+    ex.body = "<html><body>Internal Server Error</body></html>"
+    app.config["ORCID_API_BULK_SIZE"] = 2
+    try:
+        with patch.object(utils.orcid_client.OrcidApiClient, "call_api", side_effect=ex):
+            utils.process_work_records()
+    finally:
+        app.config["ORCID_API_BULK_SIZE"] = 100
+    invitees = WorkInvitees.select().join(WorkRecord).where(WorkRecord.task == t)
+    assert all(wi.status_code == RecordStatus.ERROR and wi.processed_at for wi in invitees)
+    assert all("Internal Server Error" in wi.status for wi in invitees)
+
+
 @patch("orcid_hub.utils.send_email", side_effect=send_mail_mock)
 @patch("orcid_api.MemberAPIV20Api.create_peer_review", side_effect=create_or_update_fund_mock)
 @patch("orcid_hub.orcid_client.MemberAPI.get_record", side_effect=get_record_mock)
@@ -786,6 +1306,39 @@ def test_create_or_update_affiliation(patch, test_db, request_ctx):
     assert "Employment record was updated" in affiliation_record.status
 
 
+def test_affiliations_while_orcid_is_unavailable(app):
+    """Test that the affiliation records are left for later and no invitations are resent during an outage."""
+    org = Organisation.get(name="TEST0")
+    org.orcid_client_id = "APP-OUTAGE"
+    org.save()
+    user = User.create(email="outage@test0.edu", name="TEST USER", orcid="0000-0000-0000-0OUT", confirmed=True,
+                       organisation=org)
+    UserOrg.create(user=user, org=org)
+    OrcidToken.create(user=user, org=org, scope="/read-limited,/activities/update", access_token="OUTAGE")
+    task = Task.create(org=org, filename="outage.csv", created_by=User.get(email="admin@test0.edu"))
+    AffiliationRecord.create(task=task, email=user.email, first_name="FN", last_name="LN",
+                             affiliation_type="staff", is_active=True)
+
+    def records():
+        return [r for r in utils.affiliation_records_to_process(None) if r.id == task.id]
+
+    with patch.object(utils, "send_email") as send_email:
+        with patch.object(utils.orcid_client.MemberAPI, "get_record",
+                          side_effect=utils.orcid_client.CircuitBreakerOpen("api.sandbox.orcid.org")), \
+                pytest.raises(utils.orcid_client.CircuitBreakerOpen):
+            utils.create_or_update_affiliations(user, org.id, records(), org=org)
+
+        with patch.object(utils.orcid_client.MemberAPI, "get_activities", return_value=None), \
+                patch.object(utils.orcid_client.circuit_breaker, "is_open", return_value=True):
+            utils.create_or_update_affiliations(user, org.id, records(), org=org)
+
+        send_email.assert_not_called()
+    assert not UserInvitation.select().where(UserInvitation.email == user.email).exists()
+    record = task.affiliation_records.get()
+    assert record.processed_at is None and record.status_code is None
+    assert len(records()) == 1
+
+
 def test_send_email(app):
     """Test emailing."""
     with app.app_context():
@@ -909,3 +1462,62 @@ def test_is_valid_url():
     assert utils.is_valid_url("http://www.orcidhub.org.nz")
     assert not utils.is_valid_url("www.orcidhub.org.nz/some_path")
     assert not utils.is_valid_url(12345)
+
+
+def test_load_upload(app, tmpdir):
+    """Test the loading of the queued uploads and the reporting of the progress."""
+    org = Organisation.select().first()
+    header = "First name\tLast name\temail address\tOrganisation\tCampus/Department\tCity\tCourse or Job title\t" \
+        "Start date\tEnd date\tStudent/Staff\tCountry\n"
+    rows = [f"FN{i}\tMÜLLER\tuser{i}@test.com\tTEST0\tDEPARTMENT\tWellington\tROLE\t2016-09\t\tStaff\tNZ\n"
+            for i in range(5)]
+    job = Mock(meta={})
+    with patch.dict(app.config, UPLOAD_FOLDER=str(tmpdir), LOAD_CHUNK_SIZE=2), patch.object(
+            utils.load_upload, "queue", side_effect=ConnectionError("Redis is not available")), patch(
+                "orcid_hub.utils.get_current_job", return_value=job):
+        task = Task.create(org=org, filename="UPLOAD.tsv", load_status=LoadStatus.QUEUED)
+        utils.queue_upload(task, (header + ''.join(rows)).encode("latin-1"))
+        task = Task.get(id=task.id)
+        assert task.load_status == LoadStatus.LOADED
+        assert (task.parsed_count, task.total_count, task.rejected_count) == (5, 5, 0)
+        assert task.affiliation_records.first().last_name == "MÜLLER"
+        assert job.meta == dict(parsed_count=5, total_count=5, rejected_count=0)
+        assert job.save_meta.call_count == 3
+        assert not tmpdir.listdir()
+
+        task = Task.create(org=org, filename="UPLOAD.json", load_status=LoadStatus.QUEUED)
+        utils.queue_upload(task, json.dumps(dict(records=[
+            {"first-name": "FN", "last-name": "LN", "email": f"user{i}@test.com", "affiliation-type": "staff",
+             "start-date": "2016-09", "city": "Wellington", "country": "NZ"} for i in range(3)])).encode())
+        task = Task.get(id=task.id)
+        assert task.load_status == LoadStatus.LOADED
+        assert (task.parsed_count, task.total_count, task.rejected_count) == (3, 3, 0)
+        assert [str(r.start_date) for r in task.affiliation_records] == ["2016-09"] * 3
+        assert not tmpdir.listdir()
+
+        rows[3] = rows[3].replace("user3@test.com", "INVALID EMAIL")
+        task = Task.create(org=org, filename="INVALID.tsv", load_status=LoadStatus.QUEUED)
+        with pytest.raises(ModelException):
+            utils.queue_upload(task, (header + ''.join(rows)).encode("utf-8"))
+        # the task of the upload that failed to load right away gets deleted:
+        assert not Task.select().where(Task.id == task.id).exists()
+        assert not tmpdir.listdir()
+
+        # the failure of the queued loading gets reported with the task:
+        task = Task.create(org=org, filename="INVALID.tsv", load_status=LoadStatus.QUEUED)
+        path = tmpdir.join("INVALID.tsv")
+        path.write_binary((header + ''.join(rows)).encode("utf-8"))
+        with pytest.raises(ModelException):
+            utils.load_upload(task.id, str(path))
+        task = Task.get(id=task.id)
+        assert task.load_status == LoadStatus.FAILED
+        assert task.load_error.startswith("1 invalid row(s)")
+        assert (task.parsed_count, task.total_count, task.rejected_count) == (5, 0, 1)
+        assert task.affiliation_records.count() == 0
+        assert not tmpdir.listdir()
+
+    task = Task.create(org=org, filename="QUEUED.json", task_type=TaskType.WORK, load_status=LoadStatus.QUEUED)
+    with patch("orcid_hub.utils.fetch_job", return_value=Mock(meta=dict(parsed_count=42, total_count=40))):
+        progress = utils.get_load_progress(task)
+    assert progress["load_status"] == "QUEUED"
+    assert (progress["parsed_count"], progress["total_count"], progress["rejected_count"]) == (42, 40, 0)
@@ -23,8 +23,8 @@ from orcid_hub.config import ORCID_BASE_URL
 from orcid_hub.forms import FileUploadForm
 from orcid_hub.models import UserOrgAffiliation  # noqa: E128
 from orcid_hub.models import (Affiliation, AffiliationRecord, Client, File, FundingRecord,
-                              OrcidToken, Organisation, OrgInfo, Role, Task, Token, Url, User,
-                              UserInvitation, UserOrg, PeerReviewRecord, WorkRecord)
+                              OrcidToken, Organisation, OrgInfo, ProfileCache, RecordStatus, Role, Task, Token, Url,
+                              User, UserInvitation, UserOrg, PeerReviewRecord, WorkRecord)
 
 fake_time = time.time()
 logger = logging.getLogger(__name__)
@@ -264,27 +264,56 @@ def test_show_record_section(request_ctx):
         user.save()
 
     OrcidToken.create(user=user, org=user.organisation, access_token="ABC123")
+    org = user.organisation
+    org.orcid_client_id = "APP-12345"
+    org.save()
 
-    with patch.object(
-            orcid_client.MemberAPIV20Api,
-            "view_employments",
-            MagicMock(return_value=make_fake_response('{"test": "TEST1234567890"}'))
-    ) as view_employments, request_ctx(f"/section/{user.id}/EMP/list") as ctx:
-        login_user(admin)
-        resp = ctx.app.full_dispatch_request()
-        assert admin.email.encode() in resp.data
-        assert admin.name.encode() in resp.data
-        view_employments.assert_called_once_with("XXXX-XXXX-XXXX-0001")
-    with patch.object(
-            orcid_client.MemberAPIV20Api,
-            "view_educations",
-            MagicMock(return_value=make_fake_response('{"test": "TEST1234567890"}'))
-    ) as view_educations, request_ctx(f"/section/{user.id}/EDU/list") as ctx:
+    summary = {
+        "put-code": 12345,
+        "department-name": "DEPARTMENT-ABC",
+        "role-title": "ROLE-XYZ",
+        "source": {
+            "source-client-id": {"path": "APP-12345"},
+            "source-name": {"value": "SOURCE NAME"},
+        },
+        "organization": {"name": "ORGANISATION NAME", "address": {"city": "CITY", "country": "NZ"}},
+    }
+    record = {
+        "activities-summary": {
+            "employments": {"employment-summary": [summary]},
+            "educations": {"education-summary": []},
+        }
+    }
+    with patch.object(orcid_client.MemberAPI, "get_record", return_value=record) as get_record:
+        with request_ctx(f"/section/{user.id}/EMP/list") as ctx:
+            login_user(admin)
+            resp = ctx.app.full_dispatch_request()
+            assert admin.email.encode() in resp.data
+            assert admin.name.encode() in resp.data
+            assert b"DEPARTMENT-ABC" in resp.data
+        get_record.assert_called_once()
+        with request_ctx(f"/section/{user.id}/EDU/list") as ctx:
+            login_user(admin)
+            resp = ctx.app.full_dispatch_request()
+            assert admin.email.encode() in resp.data
+            assert admin.name.encode() in resp.data
+            assert b"DEPARTMENT-ABC" not in resp.data
+        # The cached summary was used
+        get_record.assert_called_once()
+        assert ProfileCache.stats()["hits"] == 1
+
+        ProfileCache.invalidate(user.id)
+        with request_ctx(f"/section/{user.id}/EDU/list") as ctx:
+            login_user(admin)
+            ctx.app.full_dispatch_request()
+        assert get_record.call_count == 2
+
+    with patch.object(orcid_client.MemberAPI, "get_record", return_value=None), request_ctx(
+            f"/section/{user.id}/EMP/list") as ctx:
+        ProfileCache.invalidate(user.id)
         login_user(admin)
         resp = ctx.app.full_dispatch_request()
-        assert admin.email.encode() in resp.data
-        assert admin.name.encode() in resp.data
-        view_educations.assert_called_once_with("XXXX-XXXX-XXXX-0001")
+        assert resp.status_code == 302
 
 
 def test_status(client):
@@ -1311,12 +1340,26 @@ def test_edit_record(request_ctx):
     with patch.object(
             orcid_client.MemberAPIV20Api,
             "view_employment",
-            MagicMock(return_value=make_fake_response('{"test": "TEST1234567890"}'))
-    ) as view_employment, request_ctx(f"/section/{user.id}/EMP/1212/edit") as ctx:
+            MagicMock(return_value={
+                "department-name": "DEPARTMENT 1212",
+                "role-title": "ROLE",
+                "start-date": {"year": {"value": "2001"}, "month": None, "day": None},
+                "organization": {
+                    "name": "ORGANISATION 1212",
+                    "address": {"city": "CITY", "region": None, "country": "NZ"},
+                    "disambiguated-organization": {
+                        "disambiguated-organization-identifier": "ID-1212",
+                        "disambiguation-source": "RINGGOLD",
+                    },
+                },
+            })) as view_employment, request_ctx(f"/section/{user.id}/EMP/1212/edit") as ctx:
         login_user(admin)
         resp = ctx.app.full_dispatch_request()
         assert admin.email.encode() in resp.data
         assert admin.name.encode() in resp.data
+        assert b"DEPARTMENT 1212" in resp.data
+        assert b"ORGANISATION 1212" in resp.data
+        assert b"ID-1212" in resp.data
         view_employment.assert_called_once_with("XXXX-XXXX-XXXX-0001", 1212)
     with patch.object(
             orcid_client.MemberAPIV20Api,
@@ -1515,7 +1558,7 @@ def test_viewmembers_delete(request_ctx):
             data={
                 "id": str(researcher1.id),
                 "url": "/admin/viewmembers/",
-            }) as ctx, patch("orcid_hub.views.requests.post") as mockpost:  # noqa: F405
+            }) as ctx, patch("orcid_hub.orcid_client.http_pool.post") as mockpost:  # noqa: F405
         org = researcher1.organisation
         mockpost.return_value = MagicMock(status_code=400)
         login_user(admin1)
@@ -1596,7 +1639,9 @@ def test_reset_all(request_ctx):
         state="Test",
         country="Test",
         disambiguated_id="Test",
-        disambiguation_source="Test")
+        disambiguation_source="Test",
+        processed_at=datetime.datetime.utcnow(),
+        status_code=RecordStatus.ERROR)
 
     UserInvitation.create(
         invitee=user,
@@ -1632,7 +1677,8 @@ def test_reset_all(request_ctx):
         disambiguated_org_identifier="Test_dis",
         disambiguation_source="Test_source",
         is_active=True,
-        visibility="Test_visibity")
+        visibility="Test_visibity",
+        processed_at=datetime.datetime.utcnow())
 
     task3 = Task.create(
         id=3,
@@ -1667,6 +1713,9 @@ def test_reset_all(request_ctx):
         citation_type="Test_citation_type",
         citation_value="Test_visibity")
 
+    assert task1.reconcile_counts()["failed_count"] == (0, 1)
+    assert task2.reconcile_counts()["processed_count"] == (0, 1)
+
     with request_ctx("/reset_all", method="POST") as ctxx:
         login_user(user, remember=True)
         request.args = ImmutableMultiDict([('url', 'http://localhost/affiliation_record_reset_for_batch')])
@@ -1676,6 +1725,8 @@ def test_reset_all(request_ctx):
         ar = AffiliationRecord.get(id=1)
         assert "The record was reset" in ar.status
         assert t.completed_at is None
+        assert (t.processed_count, t.failed_count, t.invited_count) == (0, 0, 0)
+        assert t.reconcile_counts() == {}
         assert rv.status_code == 302
         assert rv.location.startswith("http://localhost/affiliation_record_reset_for_batch")
     with request_ctx("/reset_all", method="POST") as ctxx:
@@ -1687,6 +1738,8 @@ def test_reset_all(request_ctx):
         fr = FundingRecord.get(id=1)
         assert "The record was reset" in fr.status
         assert t2.completed_at is None
+        assert t2.processed_count == 0
+        assert t2.reconcile_counts() == {}
         assert rv.status_code == 302
         assert rv.location.startswith("http://localhost/funding_record_reset_for_batch")
     with request_ctx("/reset_all", method="POST") as ctxx:
@@ -1744,6 +1797,14 @@ def test_issue_470198698(request_ctx):
     orcid_column = soup.find(class_="table-responsive").find_all(class_="col-orcid")
     assert orcid_column[-1].text.strip() == "XXXX-XXXX-XXXX-0009"
 
+    AffiliationRecord.update(status_code=RecordStatus.ERROR).where(
+        AffiliationRecord.task_id == task.id, AffiliationRecord.orcid.is_null()).execute()
+    with request_ctx(f"/admin/affiliationrecord/?task_id={task.id}&flt0_0={RecordStatus.ERROR.value}") as ctx:
+        login_user(admin)
+        resp = ctx.app.full_dispatch_request()
+    soup = BeautifulSoup(resp.data, "html.parser")
+    assert len(soup.find(class_="table-responsive").find_all("td", class_="col-orcid")) == 5
+
     with request_ctx("/admin/affiliationrecord/") as ctx:
         login_user(admin)
         resp = ctx.app.full_dispatch_request()
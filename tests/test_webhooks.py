@@ -3,13 +3,14 @@
 
 import logging
 import json
+from datetime import datetime, timedelta
 from types import SimpleNamespace as SimpleObject
 
 from flask_login import login_user
 from unittest.mock import MagicMock, patch
 
-from orcid_hub import utils
-from orcid_hub.models import Client, OrcidToken, Organisation, User, Token
+from orcid_hub import orcid_client, utils
+from orcid_hub.models import AffiliationFingerprint, Client, OrcidToken, Organisation, ProfileCache, User, Token
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,7 +19,7 @@ logger.addHandler(logging.StreamHandler())
 
 def test_get_client_credentials_token(request_ctx):
     """Test retrieval of the webhook tokens."""
-    with request_ctx("/"), patch("orcid_hub.utils.requests.post") as mockpost:
+    with request_ctx("/"), patch("orcid_hub.orcid_client.http_pool.post") as mockpost:
         admin = User.get(email="admin@test0.edu")
         org = admin.organisation
         login_user(admin)
@@ -73,8 +74,8 @@ def test_webhook_registration(app_req_ctx):
             f"/api/v1.0/{orcid_id}/webhook/http%3A%2F%2FCALL-BACK",
             method="PUT", headers=dict(
                 authorization=f"Bearer {token.access_token}")) as ctx, patch(
-                            "orcid_hub.utils.requests.post") as mockpost, patch(
-                            "orcid_hub.utils.requests.put") as mockput:
+                            "orcid_hub.orcid_client.http_pool.post") as mockpost, patch(
+                            "orcid_hub.orcid_client.http_pool.put") as mockput:
         # Access toke request resp:
         mockresp = MagicMock(status_code=201)
         mockresp.json.return_value = {
@@ -129,7 +130,7 @@ def test_webhook_registration(app_req_ctx):
             f"/api/v1.0/{orcid_id}/webhook/http%3A%2F%2FCALL-BACK",
             method="DELETE", headers=dict(
                 authorization=f"Bearer {token.access_token}")) as ctx, patch(
-                            "orcid_hub.utils.requests.delete") as mockdelete:
+                            "orcid_hub.orcid_client.http_pool.delete") as mockdelete:
         # Webhook deletion response:
         mockresp = MagicMock(status_code=204, data=b'')
         # mockresp.raw.stream = lambda *args, **kwargs: iter([b"""{"data": "TEST"}"""])
@@ -163,13 +164,14 @@ def test_webhook_registration(app_req_ctx):
 
 def test_org_webhook(app_req_ctx, monkeypatch):
     """Test Organisation webhooks."""
+    http_pool = orcid_client.http_pool
     monkeypatch.setattr(
-        utils.requests, "post",
+        http_pool, "post",
         lambda *args, **kwargs: SimpleObject(
             status_code=201,
             json=lambda: dict(access_token="ABC123", refresh_token="REFRESS_ME", expires_in=123456789)))
-    monkeypatch.setattr(utils.requests, "put", lambda *args, **kwargs: SimpleObject(status_code=201))
-    monkeypatch.setattr(utils.requests, "delete", lambda *args, **kwargs: SimpleObject(status_code=204))
+    monkeypatch.setattr(http_pool, "put", lambda *args, **kwargs: SimpleObject(status_code=201))
+    monkeypatch.setattr(http_pool, "delete", lambda *args, **kwargs: SimpleObject(status_code=204))
 
     org = app_req_ctx.data["org"]
     admin = org.tech_contact
@@ -190,6 +192,20 @@ def test_org_webhook(app_req_ctx, monkeypatch):
             method="POST") as ctx, patch.object(utils, "send_email") as send_email:
         send_email.assert_not_called()
 
+    ProfileCache.set_summary(user.id, org.id, {"employments": {"employment-summary": []}})
+    assert ProfileCache.get_summary(user.id, org.id, 3600) is not None
+    # the notification of the just pushed record doesn't invalidate its fingerprint:
+    AffiliationFingerprint.create(org=org, content_hash='1' * 32, put_code=1, orcid=user.orcid)
+    AffiliationFingerprint.create(
+        org=org, content_hash='2' * 32, put_code=2, orcid=user.orcid,
+        pushed_at=datetime.utcnow() - timedelta(hours=1))
+    with app_req_ctx(f"/services/{user.id}/updated", method="POST") as ctx:
+        resp = ctx.app.full_dispatch_request()
+        assert resp.status_code == 204
+    assert ProfileCache.get_summary(user.id, org.id, 3600) is None
+    assert [f.put_code for f in AffiliationFingerprint.select().where(
+        AffiliationFingerprint.orcid == user.orcid)] == [1]
+
     with app_req_ctx(
             "/settings/webhook", method="POST",
             data=dict(